@@ -0,0 +1,97 @@
+"""
+account_cache.py
+Per-user cache of decrypted account summaries with version-based invalidation.
+
+Every user has a version counter that the Database write paths bump after
+they commit a change to that user's accounts. A cached summary remembers
+the version it was read under and is only served while that version is
+still current, so a write never shows stale balances in this process, even
+when a read raced with it. TTL bounds how long changes made by other
+processes sharing the database file can go unseen; LRU eviction bounds the
+number of users kept.
+
+Tune with ACCOUNT_CACHE_SIZE (users kept, 0 disables the cache) and
+ACCOUNT_CACHE_TTL (seconds).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+MAX_USERS = 1024
+TTL_SECONDS = 5.0
+
+class AccountSummaryCache:
+    """
+    LRU of (database, user) -> decrypted (account number, type, balance) rows.
+
+    Attributes:
+        max_users (int): Users kept before the least recently used are dropped (0 disables caching)
+        ttl (float): Seconds an entry is served before the rows are read again
+    """
+
+    def __init__(self, max_users: int = MAX_USERS, ttl: float = TTL_SECONDS):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def version(self, key) -> int:
+        """Current version of a user's accounts; read it before querying so a racing write wins."""
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def get(self, key) -> tuple | None:
+        """Cached rows for ``key`` if they are current and fresh, else None."""
+        if not self.max_users:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is None or entry[0] != self._versions.get(key, 0)
+                    or time.monotonic() - entry[2] > self.ttl):
+                metrics.cache_miss("accounts")
+                return None
+            self._entries.move_to_end(key)
+        metrics.cache_hit("accounts")
+        return entry[1]
+
+    def put(self, key, version: int, rows: tuple) -> None:
+        """Store rows read under ``version``; ignored if a write bumped it meanwhile."""
+        if not self.max_users:
+            return
+        with self._lock:
+            if version != self._versions.get(key, 0):
+                return
+            self._entries[key] = (version, rows, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_users:
+                # Versions stay (one int per user) so an in-flight read of an evicted user can't match a reset counter
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys) -> None:
+        """Bump the version of each user whose accounts changed."""
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry (e.g. after restoring the database file)."""
+        with self._lock:
+            for key in self._entries:
+                self._versions[key] = self._versions.get(key, 0) + 1
+            self._entries.clear()
+
+def from_env() -> AccountSummaryCache:
+    return AccountSummaryCache(int(os.getenv("ACCOUNT_CACHE_SIZE", str(MAX_USERS))),
+                               float(os.getenv("ACCOUNT_CACHE_TTL", str(TTL_SECONDS))))
+
+# Shared by every Database in the process so a write through one instance invalidates reads through another
+ACCOUNT_CACHE = from_env()
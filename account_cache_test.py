@@ -0,0 +1,121 @@
+"""
+account_cache_test.py
+Tests for the per-user account summary cache and its invalidation by Database writes.
+"""
+
+import os
+import tempfile
+import unittest
+from account_cache import AccountSummaryCache
+from database_handler import Database
+from generate_data import generate
+
+class TestAccountSummaryCache(unittest.TestCase):
+    """Test cases for versioning, TTL and size bounds."""
+
+    def test_version_bump_rejects_racing_read(self):
+        """
+        Test that rows read before a write committed are not cached after it.
+        """
+        cache = AccountSummaryCache(max_users=4, ttl=60)
+        version = cache.version("u1")
+        cache.invalidate("u1")
+        cache.put("u1", version, (("a1", "Checking", 10.0),))
+        self.assertIsNone(cache.get("u1"))
+
+        cache.put("u1", cache.version("u1"), (("a1", "Checking", 5.0),))
+        self.assertEqual(cache.get("u1"), (("a1", "Checking", 5.0),))
+        cache.invalidate("u1")
+        self.assertIsNone(cache.get("u1"))
+
+    def test_ttl_and_size_bounds(self):
+        """
+        Test that entries expire after the TTL and the least recently used user is evicted.
+        """
+        cache = AccountSummaryCache(max_users=2, ttl=60)
+        for user in ("u1", "u2"):
+            cache.put(user, cache.version(user), ())
+        cache.get("u1")
+        cache.put("u3", cache.version("u3"), ())
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("u2"))
+        self.assertIsNotNone(cache.get("u1"))
+
+        cache.ttl = 0
+        self.assertIsNone(cache.get("u1"))
+
+        disabled = AccountSummaryCache(max_users=0)
+        disabled.put("u1", 0, ())
+        self.assertIsNone(disabled.get("u1"))
+
+class TestDatabaseAccountCache(unittest.TestCase):
+    """Test cases for serving and invalidating account summaries through Database."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls.tmpdir.name, "cache.db")
+        generate(cls.db_path, users=2, accounts_per_user=2, admins=0, bcrypt_rounds=4, sign_audit=False, workers=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.cache = AccountSummaryCache(max_users=8, ttl=60)
+        self.db = Database(self.db_path, account_cache=self.cache)
+        rows = self.db.get_connection().execute("SELECT usrID, accID FROM Account ORDER BY usrID, accID").fetchall()
+        self.user, self.account = rows[0]
+        self.other_user, self.other_account = next(row for row in rows if row[0] != self.user)
+
+    def tearDown(self):
+        self.db.close_all_connections()
+
+    def balances(self, usr_id):
+        return {account.accountNumber: account.balance for account in self.db.get_user_accounts(usr_id)}
+
+    def test_repeat_reads_skip_the_query(self):
+        """
+        Test that a second read is served from the cache and returns fresh objects.
+        """
+        first = self.db.get_user_accounts(self.user)
+        first[0].balance = -1
+        self.db.get_connection().execute("UPDATE Account SET accValue = 'garbage' WHERE usrID = ?", (self.user,))
+        second = self.db.get_user_accounts(self.user)
+        self.assertEqual(len(second), 2)
+        self.assertNotEqual(second[0].balance, -1)
+        self.db.get_connection().rollback()
+
+    def test_writes_invalidate_their_owners(self):
+        """
+        Test that deposits, withdrawals, transfers, account creation and deletion invalidate the right users.
+        """
+        before = self.balances(self.user)
+        other_before = self.balances(self.other_user)
+
+        self.assertEqual(self.db.deposit_to_account(self.account, 10), [])
+        self.assertAlmostEqual(self.balances(self.user)[self.account], before[self.account] + 10)
+        self.assertEqual(self.db.withdraw_from_account(self.account, 4), [])
+        self.assertAlmostEqual(self.balances(self.user)[self.account], before[self.account] + 6)
+
+        self.assertEqual(self.db.transfer_funds_by_account_number(self.account, self.other_account, 6), [])
+        self.assertAlmostEqual(self.balances(self.user)[self.account], before[self.account])
+        self.assertAlmostEqual(self.balances(self.other_user)[self.other_account], other_before[self.other_account] + 6)
+
+        self.db.create_account("CACHE123", self.user, "Savings", 1.0)
+        self.assertIn("CACHE123", self.balances(self.user))
+        self.assertTrue(self.db.secure_delete_account("CACHE123"))
+        self.assertNotIn("CACHE123", self.balances(self.user))
+
+    def test_int_and_str_user_ids_share_an_entry(self):
+        """
+        Test that a write through the INTEGER usrID invalidates reads made with the ID as a string.
+        """
+        self.assertIsInstance(self.user, int)
+        before = self.balances(str(self.user))[self.account]
+        self.assertEqual(self.db.deposit_to_account(self.account, 10), [])
+        self.assertAlmostEqual(self.balances(str(self.user))[self.account], before + 10)
+        self.assertAlmostEqual(self.balances(self.user)[self.account], before + 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+"""
+admission_control.py
+WSGI middleware that limits concurrent requests per route class and sheds the rest.
+
+Requests are sorted into classes by method and path (password hashing,
+signed money movements, heavy admin pages, log streams, everything else).
+Each class has a concurrency limit and a short bounded queue: a request that
+finds all slots busy waits at most ``queue_timeout`` seconds behind at most
+``max_queue`` others, and is otherwise answered at once with 503 and
+Retry-After. Cheap reads are unlimited by default so a burst of logins or
+transfers cannot starve them.
+
+Limits can be overridden with ADMISSION_LIMITS, e.g. "auth=4:8,write=16"
+(limit[:max_queue] per class; limit 0 means unlimited).
+"""
+
+import logging
+import threading
+import time
+
+from werkzeug.wsgi import ClosingIterator
+
+import metrics
+
+class RouteClass:
+    """
+    Concurrency limit and bounded wait queue for one class of routes.
+
+    Attributes:
+        name (str): Class name used in metrics
+        limit (int | None): Requests handled at once (None = unlimited)
+        max_queue (int): Requests allowed to wait for a slot
+        queue_timeout (float): Longest wait for a slot in seconds
+    """
+
+    def __init__(self, name: str, limit: int | None, max_queue: int = 0, queue_timeout: float = 1.0):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self._slots = threading.BoundedSemaphore(limit) if limit else None
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if there is room; False means shed."""
+        if self._slots is None or self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                return False
+            self.waiting += 1
+        metrics.inc("admission_queue_depth", route_class=self.name)
+        started = time.perf_counter()
+        try:
+            return self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+            metrics.inc("admission_queue_depth", -1, route_class=self.name)
+            metrics.observe("admission_queue_wait_seconds", time.perf_counter() - started, route_class=self.name)
+
+    def release(self) -> None:
+        if self._slots is not None:
+            self._slots.release()
+
+# (method, path, class) rules, first match wins. None as method matches any method;
+# a path ending in "/" matches as a prefix, otherwise the path itself and anything below it
+DEFAULT_RULES = (
+    (None, "/static/", None),
+    (None, "/metrics", None),
+    (None, "/admin/logs/stream", "stream"),
+    (None, "/logs", "admin_heavy"),
+    (None, "/admin/logs", "admin_heavy"),
+    (None, "/admin/backup", "admin_heavy"),
+    (None, "/admin/restore", "admin_heavy"),
+    (None, "/system/memory", "admin_heavy"),
+    ("POST", "/login", "auth"),
+    ("POST", "/verify-2fa", "auth"),
+    ("POST", "/register", "auth"),
+    ("POST", "/registerTeller", "auth"),
+    ("POST", "/registerAdmin", "auth"),
+    ("POST", "/password-reset", "auth"),
+    ("POST", "/security/totp", "auth"),
+    ("POST", "/transfer", "write"),
+    ("POST", "/deposit", "write"),
+    ("POST", "/withdraw", "write"),
+    ("POST", "/new-account", "write"),
+    ("POST", "/admin/", "write"),
+    ("POST", "/api/v1/postings/", "write"),
+)
+
+def default_classes() -> dict[str, RouteClass]:
+    return {
+        # bcrypt on login, sign-up and reset
+        'auth': RouteClass("auth", limit=8, max_queue=16, queue_timeout=2.0),
+        # encrypted, signed and audited balance changes
+        'write': RouteClass("write", limit=8, max_queue=16, queue_timeout=2.0),
+        # log dumps, backups and memory diffs
+        'admin_heavy': RouteClass("admin_heavy", limit=2, max_queue=2, queue_timeout=1.0),
+        # long-lived log follow streams hold their slot until the client disconnects
+        'stream': RouteClass("stream", limit=4, max_queue=0),
+        'read': RouteClass("read", limit=None),
+    }
+
+def parse_limits(spec: str, classes: dict[str, RouteClass]) -> dict[str, RouteClass]:
+    """Apply "auth=4:8,write=16" overrides to ``classes``."""
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, values = part.partition("=")
+        name = name.strip()
+        if name not in classes:
+            raise ValueError(f"Unknown route class: {name}")
+        limit, _, queue = values.partition(":")
+        current = classes[name]
+        classes[name] = RouteClass(name, int(limit) or None,
+                                   int(queue) if queue else current.max_queue, current.queue_timeout)
+    return classes
+
+class AdmissionControl:
+    """
+    Wraps a WSGI app and admits each request through its route class.
+
+    A response with a Content-Length was fully built by the time the app
+    returned, so its slot is freed right away. Streamed responses (no
+    Content-Length) keep their slot until the server closes the body.
+
+    Attributes:
+        classes (dict): RouteClass by name
+        rules (tuple): (method, path, class name) rules; no match means "read"
+        retry_after (int): Seconds sent in the Retry-After header of a 503
+    """
+
+    def __init__(self, app, classes: dict[str, RouteClass] | None = None, rules=DEFAULT_RULES, retry_after: int = 1):
+        self.app = app
+        self.classes = classes or default_classes()
+        self.rules = rules
+        self.retry_after = retry_after
+
+    def classify(self, method: str, path: str) -> str | None:
+        """Route class name for a request, or None for exempt paths."""
+        for rule_method, rule_path, name in self.rules:
+            if rule_method is not None and rule_method != method:
+                continue
+            if rule_path.endswith("/"):
+                if path.startswith(rule_path):
+                    return name
+            elif path == rule_path or path.startswith(rule_path + "/"):
+                return name
+        return "read"
+
+    def __call__(self, environ, start_response):
+        name = self.classify(environ.get("REQUEST_METHOD", "GET"), environ.get("PATH_INFO", "/"))
+        route_class = self.classes.get(name) if name else None
+        if route_class is None:
+            return self.app(environ, start_response)
+
+        if not route_class.acquire():
+            metrics.inc("admission_shed_total", route_class=name)
+            logging.warning("Shed %s %s (%s class at capacity)",
+                            environ.get("REQUEST_METHOD"), environ.get("PATH_INFO"), name)
+            body = b"Server busy, please try again shortly.\n"
+            start_response("503 Service Unavailable", [
+                ("Content-Type", "text/plain; charset=utf-8"),
+                ("Content-Length", str(len(body))),
+                ("Retry-After", str(self.retry_after)),
+            ])
+            return [body]
+
+        metrics.inc("admission_in_flight", route_class=name)
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                metrics.inc("admission_in_flight", -1, route_class=name)
+                route_class.release()
+
+        sized = False
+
+        def admitted_start_response(status, headers, exc_info=None):
+            nonlocal sized
+            sized = any(header.lower() == "content-length" for header, _ in headers)
+            return start_response(status, headers, exc_info)
+
+        try:
+            app_iter = self.app(environ, admitted_start_response)
+        except BaseException:
+            release()
+            raise
+        if sized:
+            # The body is already built; nothing expensive is left to do
+            release()
+            return app_iter
+        return ClosingIterator(app_iter, [release])
+
+    def snapshot(self) -> dict:
+        """Limit, queue length and shed count per class (for the status page)."""
+        return {
+            name: {
+                'limit': route_class.limit or "unlimited",
+                'queued': route_class.waiting,
+                'shed': int(metrics.REGISTRY.value("admission_shed_total", route_class=name)),
+            }
+            for name, route_class in self.classes.items()
+        }
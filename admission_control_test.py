@@ -0,0 +1,95 @@
+"""
+admission_control_test.py
+Tests for per-route-class admission control and load shedding.
+"""
+
+import threading
+import time
+import unittest
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from admission_control import AdmissionControl, RouteClass, default_classes, parse_limits
+
+class TestAdmissionControl(unittest.TestCase):
+    """Test cases for classification, shedding and slot release."""
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.entered = threading.Semaphore(0)
+
+        def slow_app(environ, start_response):
+            self.entered.release()
+            self.release.wait(5)
+            return Response("done")(environ, start_response)
+
+        classes = {'write': RouteClass("write", limit=1, max_queue=1, queue_timeout=0.2),
+                   'read': RouteClass("read", limit=None)}
+        self.middleware = AdmissionControl(slow_app, classes)
+        self.client = Client(self.middleware)
+
+    def test_classification(self):
+        """
+        Test that expensive routes get their own classes and /logout is not mistaken for /logs.
+        """
+        middleware = AdmissionControl(None)
+        self.assertEqual(middleware.classify("POST", "/login"), "auth")
+        self.assertEqual(middleware.classify("GET", "/login"), "read")
+        self.assertEqual(middleware.classify("POST", "/registerTeller"), "auth")
+        self.assertEqual(middleware.classify("POST", "/transfer"), "write")
+        self.assertEqual(middleware.classify("GET", "/logs"), "admin_heavy")
+        self.assertEqual(middleware.classify("GET", "/logout"), "read")
+        self.assertEqual(middleware.classify("GET", "/admin/logs/stream"), "stream")
+        self.assertIsNone(middleware.classify("GET", "/static/style.css"))
+        classes = parse_limits("auth=2:3,read=0", default_classes())
+        self.assertEqual((classes['auth'].limit, classes['auth'].max_queue), (2, 3))
+        with self.assertRaises(ValueError):
+            parse_limits("bogus=1", default_classes())
+
+    def test_sheds_when_class_is_full(self):
+        """
+        Test that a full class with a full queue answers 503 at once, while other classes still run.
+        """
+        results = []
+        holder = threading.Thread(target=lambda: results.append(self.client.post("/transfer").status_code))
+        holder.start()
+        self.entered.acquire(timeout=5)
+
+        # One request may queue; it times out after queue_timeout
+        queued = threading.Thread(target=lambda: results.append(self.client.post("/deposit").status_code))
+        queued.start()
+        time.sleep(0.05)
+
+        started = time.perf_counter()
+        response = self.client.post("/withdraw")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertLess(time.perf_counter() - started, 0.1)
+
+        queued.join(5)
+        self.assertEqual(results, [503])
+
+        self.release.set()
+        holder.join(5)
+        self.assertEqual(results, [503, 200])
+        self.assertEqual(self.middleware.snapshot()['write']['queued'], 0)
+        self.assertEqual(self.client.post("/transfer").status_code, 200)
+
+    def test_streamed_response_holds_slot_until_closed(self):
+        """
+        Test that the slot is released when the response body is closed, not when the app returns.
+        """
+        def stream_app(environ, start_response):
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return iter([b"a", b"b"])
+
+        middleware = AdmissionControl(stream_app, {'stream': RouteClass("stream", limit=1)})
+        environ = {'REQUEST_METHOD': "GET", 'PATH_INFO': "/admin/logs/stream"}
+        body = middleware(environ, lambda *args: None)
+        self.assertEqual(middleware(dict(environ), lambda *args: None), [b"Server busy, please try again shortly.\n"])
+        body.close()
+        second = middleware(dict(environ), lambda *args: None)
+        self.assertEqual(list(second), [b"a", b"b"])
+        second.close()
+
+if __name__ == '__main__':
+    unittest.main()
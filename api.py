@@ -0,0 +1,139 @@
+"""
+api.py
+Versioned JSON API for accounts and postings (deposits, withdrawals, transfers).
+
+Mounted at /api/v1 by flask_main. It uses the same session login and
+requires_role checks as the HTML pages, but answers with compact JSON and
+status codes instead of templates, flash messages and redirects. Customers
+only see and move money out of their own accounts; tellers and admins pass
+``?user=<usrID>`` to list another user's accounts.
+
+GET responses carry an ETag of their body. A client that sends it back in
+If-None-Match gets 304 Not Modified with no body while the data is unchanged.
+"""
+
+import logging
+import math
+from flask import Blueprint, jsonify, request, session
+
+import user_management
+from rbac import requires_role
+from transfer_handler import Transfer
+from deposit_handler import Deposit
+from withdrawal_handler import Withdrawal
+
+api_v1 = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+
+CUSTOMER = 3
+
+def _database():
+    return user_management.db_manager
+
+def _account_json(account) -> dict:
+    # Balances as fixed two-decimal strings so clients never see float rounding
+    return {'number': account.accountNumber, 'type': account.type, 'balance': f"{account.balance:.2f}"}
+
+def _conditional(payload: dict):
+    """JSON response that is revalidated with its ETag on every use."""
+    response = jsonify(payload)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.add_etag()
+    return response.make_conditional(request)
+
+def _error(message: str, status: int):
+    return jsonify(error=message), status
+
+def _visible_account(account_number: str):
+    """The account if the caller may see it, else None (missing and forbidden look the same)."""
+    owner = _database().get_account_owner(account_number)
+    if owner is None or (session.get('role_id') == CUSTOMER and str(owner) != str(session.get('user_id'))):
+        return None
+    return next((account for account in _database().get_user_accounts(owner)
+                 if account.accountNumber == account_number), None)
+
+def _posting_body(*fields: str) -> tuple[dict | None, str | None]:
+    """Required fields and a float amount from the JSON body, or an error message."""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return None, "expected a JSON object"
+    missing = [field for field in fields + ('amount',) if body.get(field) in (None, "")]
+    if missing:
+        return None, f"missing fields: {', '.join(missing)}"
+    try:
+        body['amount'] = float(body['amount'])
+    except (TypeError, ValueError):
+        return None, "amount must be a number"
+    # JSON allows Infinity/NaN and "inf" parses; neither is a currency amount
+    if not math.isfinite(body['amount']):
+        return None, "amount must be a finite number"
+    for field in fields:
+        body[field] = str(body[field])
+    return body, None
+
+def _posted(kind: str, errors: list[str], account_number: str):
+    if errors:
+        logging.warning("API %s failed: %s", kind, errors)
+        return jsonify(errors=errors), 422
+    account = _visible_account(account_number)
+    return jsonify(posted=kind, account=_account_json(account) if account else None), 201
+
+@api_v1.route("/accounts")
+@requires_role([1, 2, 3])
+def list_accounts():
+    """Accounts of the signed-in customer, or of ``?user=`` for staff."""
+    if session.get('role_id') == CUSTOMER:
+        usr_id = session.get('user_id')
+    else:
+        usr_id = request.args.get('user')
+        if not usr_id:
+            return _error("user parameter required", 400)
+    accounts = _database().get_user_accounts(usr_id)
+    return _conditional({'accounts': [_account_json(account) for account in accounts]})
+
+@api_v1.route("/accounts/<account_number>")
+@requires_role([1, 2, 3])
+def account_detail(account_number):
+    """One account by number."""
+    account = _visible_account(account_number)
+    if account is None:
+        return _error("account not found", 404)
+    return _conditional(_account_json(account))
+
+@api_v1.route("/postings/transfers", methods=["POST"])
+@requires_role([1, 2, 3])
+def post_transfer():
+    """Move ``amount`` from account ``from`` to account ``to``."""
+    body, problem = _posting_body('from', 'to')
+    if problem:
+        return _error(problem, 400)
+    if _visible_account(body['from']) is None:
+        return _error("account not found", 404)
+    errors = Transfer(body['from'], body['to'], body['amount'], _database()).try_transfer()
+    if not errors:
+        logging.info("API transfer: %s from %s to %s", body['amount'], body['from'], body['to'])
+    return _posted("transfer", errors, body['from'])
+
+@api_v1.route("/postings/deposits", methods=["POST"])
+@requires_role([1, 2])
+def post_deposit():
+    """Add ``amount`` to ``account``."""
+    body, problem = _posting_body('account')
+    if problem:
+        return _error(problem, 400)
+    errors = Deposit(body['account'], body['amount'], _database()).try_deposit()
+    if not errors:
+        logging.info("API deposit: %s to %s", body['amount'], body['account'])
+    return _posted("deposit", errors, body['account'])
+
+@api_v1.route("/postings/withdrawals", methods=["POST"])
+@requires_role([1, 2])
+def post_withdrawal():
+    """Take ``amount`` out of ``account``."""
+    body, problem = _posting_body('account')
+    if problem:
+        return _error(problem, 400)
+    errors = Withdrawal(body['account'], body['amount'], _database()).try_withdrawal()
+    if not errors:
+        logging.info("API withdrawal: %s from %s", body['amount'], body['account'])
+    return _posted("withdrawal", errors, body['account'])
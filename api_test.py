@@ -0,0 +1,122 @@
+"""
+api_test.py
+Tests for the versioned JSON API: RBAC, conditional GETs and postings.
+"""
+
+import os
+import tempfile
+import unittest
+from generate_data import generate
+from load_harness import InProcessApp
+
+class TestApi(unittest.TestCase):
+    """Test cases for the /api/v1 blueprint."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(cls.tmpdir.name, "api.db")
+        generate(db_path, users=2, accounts_per_user=2, admins=0, bcrypt_rounds=4, sign_audit=False, workers=1)
+        cls.target = InProcessApp(db_path)
+        rows = cls.target.database.get_connection().execute(
+            "SELECT usrID, accID FROM Account ORDER BY usrID, accID").fetchall()
+        cls.user, cls.account = rows[0]
+        cls.other_user, cls.other_account = next(row for row in rows if row[0] != cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.target.close()
+        cls.tmpdir.cleanup()
+
+    def client(self, role_id=None, user_id=None):
+        client = self.target.app.test_client()
+        if role_id is not None:
+            with client.session_transaction() as sess:
+                sess['user_id'] = user_id or self.user
+                sess['role_id'] = role_id
+                sess['username'] = "api-test"
+        return client
+
+    def test_rbac_returns_json_errors(self):
+        """
+        Test that anonymous and under-privileged callers get 401/403 JSON rather than redirects.
+        """
+        response = self.client().get("/api/v1/accounts")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.get_json(), {'error': "authentication required"})
+
+        customer = self.client(role_id=3)
+        response = customer.post("/api/v1/postings/deposits", json={'account': self.account, 'amount': 5})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(customer.get(f"/api/v1/accounts/{self.other_account}").status_code, 404)
+
+    def test_account_list_and_conditional_get(self):
+        """
+        Test that listings are compact JSON with an ETag and unchanged data answers 304.
+        """
+        customer = self.client(role_id=3)
+        response = customer.get("/api/v1/accounts")
+        self.assertEqual(response.status_code, 200)
+        numbers = {account['number'] for account in response.get_json()['accounts']}
+        self.assertIn(self.account, numbers)
+        self.assertNotIn(self.other_account, numbers)
+        self.assertNotIn(b"\n ", response.data)
+        etag = response.headers['ETag']
+
+        response = customer.get("/api/v1/accounts", headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+        self.assertEqual(self.client(role_id=2).get("/api/v1/accounts").status_code, 400)
+        staff = self.client(role_id=2).get(f"/api/v1/accounts?user={self.other_user}")
+        self.assertIn(self.other_account, {account['number'] for account in staff.get_json()['accounts']})
+
+    def test_postings_change_balances_and_etags(self):
+        """
+        Test that deposits, withdrawals and transfers post, report errors as 422 and change the ETag.
+        """
+        teller = self.client(role_id=2)
+        before = teller.get(f"/api/v1/accounts/{self.account}")
+        balance = float(before.get_json()['balance'])
+
+        response = teller.post("/api/v1/postings/deposits", json={'account': self.account, 'amount': "10.00"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['account']['balance'], f"{balance + 10:.2f}")
+
+        response = teller.post("/api/v1/postings/withdrawals", json={'account': self.account, 'amount': 1e9})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(teller.post("/api/v1/postings/withdrawals", json={'account': self.account}).status_code, 400)
+
+        customer = self.client(role_id=3)
+        response = customer.post("/api/v1/postings/transfers",
+                                 json={'from': self.account, 'to': self.other_account, 'amount': 4})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['account']['balance'], f"{balance + 6:.2f}")
+        response = customer.post("/api/v1/postings/transfers",
+                                 json={'from': self.other_account, 'to': self.account, 'amount': 1})
+        self.assertEqual(response.status_code, 404)
+
+        response = teller.get(f"/api/v1/accounts/{self.account}", headers={'If-None-Match': before.headers['ETag']})
+        self.assertEqual(response.status_code, 200)
+
+    def test_non_finite_and_non_numeric_amounts_are_rejected(self):
+        """
+        Test that Infinity, NaN and non-numeric amounts answer 400 and move no money.
+        """
+        teller = self.client(role_id=2)
+        balance = teller.get(f"/api/v1/accounts/{self.account}").get_json()['balance']
+        bodies = ('{"account": "%s", "amount": Infinity}', '{"account": "%s", "amount": NaN}',
+                  '{"account": "%s", "amount": "inf"}', '{"account": "%s", "amount": "ten"}',
+                  '{"account": "%s", "amount": [1]}')
+        for body in bodies:
+            for kind in ("deposits", "withdrawals"):
+                response = teller.post(f"/api/v1/postings/{kind}", data=body % self.account,
+                                       content_type="application/json")
+                self.assertEqual(response.status_code, 400, body)
+        response = teller.post("/api/v1/postings/transfers", content_type="application/json",
+                               data='{"from": "%s", "to": "%s", "amount": -Infinity}' % (self.account, self.other_account))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(teller.get(f"/api/v1/accounts/{self.account}").get_json()['balance'], balance)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+"""
+benchmarks.py
+In-process microbenchmarks for the Database, crypto and audit hot paths.
+
+Database benchmarks run against synthetic databases built with generate_data
+at each requested size (number of users, two accounts each, one audit row per
+user). The Database under test has the account cache disabled so reads hit
+SQLite; get_user_accounts[cached] times the cache hit path separately. Results are written as JSON; the compare command checks a run against
+a stored baseline and exits non-zero when a median got slower than the
+allowed threshold.
+
+Usage:
+    python benchmarks.py run --sizes 1000,10000 --output bench.json
+    python benchmarks.py compare baseline.json bench.json --threshold 0.15
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import bcrypt
+
+from account_cache import AccountSummaryCache
+from audit_log_utils import mask_and_decrypt_all
+from database_handler import Database
+from encryption_utils import decrypt_string_with_file_key, encrypt_string_with_file_key
+from generate_data import account_id_for, generate, username_for, user_id_for
+from signature_utils import sign_message
+
+DEFAULT_SIZES = (1000, 10000)
+BCRYPT_COSTS = (4, 8, 10, 12)
+MIN_TIME = 0.5
+MIN_ROUNDS = 3
+MAX_ROUNDS = 10000
+ACCOUNTS_PER_USER = 2
+
+def measure(func, min_time: float = MIN_TIME, min_rounds: int = MIN_ROUNDS,
+            max_rounds: int = MAX_ROUNDS) -> dict:
+    """
+    Call ``func`` repeatedly and summarize the per-call durations.
+
+    Args:
+        func: Zero-argument callable to time
+        min_time: Keep calling until this many seconds have passed
+        min_rounds: Minimum number of calls regardless of time
+        max_rounds: Upper bound on the number of calls
+
+    Returns:
+        dict: rounds, mean/median/p95/min in milliseconds and ops_per_sec
+    """
+    func()  # warm-up: imports, key files, sqlite page cache
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < max_rounds and (len(timings) < min_rounds or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    mean = statistics.fmean(timings)
+    return {
+        'rounds': len(timings),
+        'mean_ms': mean * 1000,
+        'median_ms': statistics.median(timings) * 1000,
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        'min_ms': timings[0] * 1000,
+        'ops_per_sec': 1 / mean if mean else 0.0,
+    }
+
+def crypto_benchmarks(bcrypt_costs=BCRYPT_COSTS) -> dict:
+    """Benchmarks that do not depend on database size."""
+    token = encrypt_string_with_file_key("1234.56")
+    message = "DEPOSIT|Account|old|new|2025-01-01T00:00:00"
+    cases = {
+        'fernet_encrypt': lambda: encrypt_string_with_file_key("1234.56"),
+        'fernet_decrypt': lambda: decrypt_string_with_file_key(token),
+        'sign_message': lambda: sign_message(message),
+    }
+    for cost in bcrypt_costs:
+        hashed = bcrypt.hashpw(b"Password123!", bcrypt.gensalt(cost))
+        cases[f'bcrypt_hash[cost={cost}]'] = lambda cost=cost: bcrypt.hashpw(b"Password123!", bcrypt.gensalt(cost))
+        cases[f'bcrypt_check[cost={cost}]'] = lambda hashed=hashed: bcrypt.checkpw(b"Password123!", hashed)
+    return cases
+
+def database_benchmarks(db: Database, size: int, rng: random.Random, cached_db: Database | None = None) -> dict:
+    """Benchmarks against a generated database with ``size`` users."""
+    cached_db = cached_db or db
+    cached_user = user_id_for(0)
+
+    def random_user():
+        return rng.randrange(size)
+
+    def account():
+        return account_id_for(random_user(), 0, ACCOUNTS_PER_USER)
+
+    return {
+        'get_user_accounts[cold]': lambda: db.get_user_accounts(user_id_for(random_user())),
+        # measure()'s warm-up call fills the cache; the timed calls are all hits
+        'get_user_accounts[cached]': lambda: cached_db.get_user_accounts(cached_user),
+        'get_user_encrypted_search': lambda: db.get_user_encrypted_search(username_for(random_user())),
+        'deposit_to_account': lambda: db.deposit_to_account(account(), 1.0),
+        'transfer_funds_by_account_number': lambda: db.transfer_funds_by_account_number(account(), account(), 0.01),
+        'mask_and_decrypt_all': lambda: mask_and_decrypt_all(db.get_audit_logs()),
+    }
+
+def run(sizes=DEFAULT_SIZES, bcrypt_costs=BCRYPT_COSTS, min_time: float = MIN_TIME,
+        only: str | None = None, seed: int = 0, log=print) -> dict:
+    """
+    Run the suite and return the JSON-serializable results.
+
+    Args:
+        sizes: Database sizes (number of users) for the Database benchmarks
+        bcrypt_costs: bcrypt cost factors to benchmark
+        min_time: Seconds spent on each benchmark
+        only: Substring filter on benchmark names
+        seed: Seed for the generated data and the random account choice
+        log: Progress callback
+    """
+    results = {}
+
+    def record(name, func):
+        if only and only not in name:
+            return
+        results[name] = measure(func, min_time=min_time)
+        log(f"{name:55} {results[name]['median_ms']:10.3f} ms  {results[name]['ops_per_sec']:10.1f} ops/s")
+
+    for name, func in crypto_benchmarks(bcrypt_costs).items():
+        record(name, func)
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, f"bench_{size}.db")
+            generate(db_path, users=size, accounts_per_user=ACCOUNTS_PER_USER, audit_rows=size,
+                     bcrypt_rounds=4, sign_audit=False, seed=seed, workers=1)
+            db = Database(db_path, account_cache=AccountSummaryCache(0))
+            cached_db = Database(db_path, account_cache=AccountSummaryCache())
+            try:
+                rng = random.Random(seed)
+                for name, func in database_benchmarks(db, size, rng, cached_db).items():
+                    record(f"{name}[users={size}]", func)
+            finally:
+                db.close_all_connections()
+                cached_db.close_all_connections()
+
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec="seconds"),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'sizes': list(sizes),
+            'min_time': min_time,
+        },
+        'results': results,
+    }
+
+def compare(baseline: dict, current: dict, threshold: float = 0.15, metric: str = 'median_ms') -> list[dict]:
+    """
+    Compare two runs benchmark by benchmark.
+
+    Args:
+        baseline: Results loaded from the stored baseline
+        current: Results of the new run
+        threshold: Relative slowdown (0.15 = 15%) that counts as a regression
+        metric: Which timing to compare
+
+    Returns:
+        list[dict]: One row per benchmark present in both runs, with the
+        relative change and a status of "regression", "improvement" or "ok"
+    """
+    rows = []
+    for name, new in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None or not old[metric]:
+            continue
+        change = new[metric] / old[metric] - 1
+        if change > threshold:
+            status = "regression"
+        elif change < -threshold:
+            status = "improvement"
+        else:
+            status = "ok"
+        rows.append({'name': name, 'baseline': old[metric], 'current': new[metric],
+                     'change': change, 'status': status})
+    return rows
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Banking system microbenchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                            help="Comma-separated database sizes (users)")
+    run_parser.add_argument("--bcrypt-costs", default=",".join(map(str, BCRYPT_COSTS)),
+                            help="Comma-separated bcrypt cost factors")
+    run_parser.add_argument("--min-time", type=float, default=MIN_TIME, help="Seconds per benchmark")
+    run_parser.add_argument("--only", help="Only run benchmarks whose name contains this text")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="Write results to this JSON file")
+
+    compare_parser = commands.add_parser("compare", help="Compare a run against a baseline")
+    compare_parser.add_argument("baseline", help="Baseline results JSON")
+    compare_parser.add_argument("current", help="New results JSON")
+    compare_parser.add_argument("--threshold", type=float, default=0.15,
+                                help="Relative slowdown that counts as a regression")
+    compare_parser.add_argument("--metric", default="median_ms", choices=("median_ms", "mean_ms", "p95_ms", "min_ms"))
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run(
+            sizes=[int(s) for s in args.sizes.split(",") if s],
+            bcrypt_costs=[int(c) for c in args.bcrypt_costs.split(",") if c],
+            min_time=args.min_time, only=args.only, seed=args.seed,
+        )
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            print(f"Results written to {args.output}")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.threshold, args.metric)
+    for row in rows:
+        print(f"{row['name']:55} {row['baseline']:10.3f} -> {row['current']:10.3f} ms "
+              f"{row['change']:+7.1%}  {row['status']}")
+    regressions = [row for row in rows if row['status'] == "regression"]
+    print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
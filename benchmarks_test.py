@@ -0,0 +1,54 @@
+"""
+benchmarks_test.py
+Tests for the microbenchmark runner and the regression comparison.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from benchmarks import compare, main, measure, run
+
+class TestBenchmarks(unittest.TestCase):
+    """Test cases for measuring and comparing benchmark runs."""
+
+    def test_measure_honours_round_limits(self):
+        """
+        Test that measure() respects min/max rounds and reports ordered statistics.
+        """
+        calls = []
+        result = measure(lambda: calls.append(1), min_time=10, min_rounds=3, max_rounds=25)
+        self.assertEqual(result['rounds'], 25)
+        self.assertEqual(len(calls), 26)  # plus the warm-up call
+        self.assertLessEqual(result['min_ms'], result['median_ms'])
+        self.assertLessEqual(result['median_ms'], result['p95_ms'])
+
+    def test_compare_flags_regressions(self):
+        """
+        Test that slowdowns beyond the threshold fail the compare command.
+        """
+        baseline = {'results': {'a': {'median_ms': 10.0}, 'b': {'median_ms': 10.0}, 'c': {'median_ms': 10.0}}}
+        current = {'results': {'a': {'median_ms': 12.0}, 'b': {'median_ms': 10.5}, 'c': {'median_ms': 5.0},
+                               'new': {'median_ms': 1.0}}}
+        statuses = {row['name']: row['status'] for row in compare(baseline, current, threshold=0.15)}
+        self.assertEqual(statuses, {'a': "regression", 'b': "ok", 'c': "improvement"})
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = []
+            for name, data in (("base.json", baseline), ("cur.json", current)):
+                paths.append(os.path.join(tmpdir, name))
+                with open(paths[-1], "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+            self.assertEqual(main(["compare", *paths, "--threshold", "0.25"]), 0)
+            self.assertEqual(main(["compare", *paths, "--threshold", "0.15"]), 1)
+
+    def test_account_reads_are_timed_cold_and_cached(self):
+        """
+        Test that get_user_accounts is reported separately for SQLite reads and cache hits.
+        """
+        result = run(sizes=(20,), bcrypt_costs=(), min_time=0, only="get_user_accounts", log=lambda line: None)
+        self.assertEqual(set(result['results']),
+                         {"get_user_accounts[cold][users=20]", "get_user_accounts[cached][users=20]"})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,69 +11,224 @@ import shutil
 import os
 import secrets
 import logging
+import time
+from contextlib import contextmanager
+import metrics
+import tracing
+from account_cache import ACCOUNT_CACHE, AccountSummaryCache
 from Account import Account
 from audit_log import AuditLog
 from encryption_utils import decrypt_string_with_file_key, encrypt_string_with_file_key
 from signature_utils import sign_message
+from sql_monitor import InstrumentedConnection, QueryMonitor, get_default_monitor
 from datetime import datetime
 from cryptography.fernet import Fernet, InvalidToken
 
+logger = logging.getLogger(__name__)
+
+# Indexes behind the per-request lookups (login by hash, accounts by owner).
+# Created by migrate_schema() together with ADDED_COLUMNS.
+HOT_PATH_INDEXES = (
+    ("idx_user_usrNameHash", "User", "usrNameHash"),
+    ("idx_user_emailHash", "User", "emailHash"),
+    ("idx_account_usrID", "Account", "usrID"),
+)
+
+# Columns added after the original schema; appended so positional row reads are unchanged.
+# Applied by migrate_schema(), which the app runs once at startup.
+ADDED_COLUMNS = (
+    ("User", "totpSecret", "TEXT"),      # encrypted base32 TOTP secret, NULL when not enrolled
+    ("User", "totpLastStep", "INTEGER"), # last accepted TOTP time step (replay protection)
+)
+
+def migrate_schema(conn: sqlite3.Connection, indexes: bool = True) -> list[str]:
+    """
+    Add any ADDED_COLUMNS and HOT_PATH_INDEXES missing from an existing database.
+
+    Tables that do not exist yet are skipped.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database to migrate
+        indexes (bool): Also create the hot-path indexes (bulk loaders build them after inserting)
+
+    Returns:
+        list[str]: "Table.column" for each column and the name of each index added (empty if already current)
+    """
+    added = []
+    with conn:
+        for table, column, column_type in ADDED_COLUMNS:
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if existing and column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                added.append(f"{table}.{column}")
+        if indexes:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            for name, table, column in HOT_PATH_INDEXES:
+                if table in tables and name not in existing:
+                    conn.execute(f"CREATE INDEX {name} ON {table} ({column})")
+                    added.append(name)
+    return added
+
 class Database:
     """
     Handles database operations with thread-local connection pooling.
     """
 
-    def __init__(self, name="BankingData.db", backup_name="BankingDataBackup.db"):
+    def __init__(self, name="BankingData.db", backup_name="BankingDataBackup.db",
+                 query_monitor: QueryMonitor | None = None, account_cache: AccountSummaryCache | None = None):
         self.name = name
         self.backup_name = backup_name
         self.local = threading.local()
+        # Statement timing is opt-in: pass a monitor or set SLOW_QUERY_MS
+        self.query_monitor = query_monitor if query_monitor is not None else get_default_monitor()
+        # Decrypted account summaries, shared per process and keyed by (database file, user)
+        self.account_cache = account_cache if account_cache is not None else ACCOUNT_CACHE
 
     def get_connection(self):
         """Get or create a thread-local connection"""
         if not hasattr(self.local, 'conn') or self.local.conn is None:
-            self.local.conn = sqlite3.connect(
-                self.name,
-                check_same_thread=False,
-                timeout=10
-            )
-            self.local.conn.execute("PRAGMA journal_mode=WAL")
+            if self.query_monitor is not None:
+                conn = sqlite3.connect(
+                    self.name,
+                    check_same_thread=False,
+                    timeout=10,
+                    factory=InstrumentedConnection
+                )
+                conn.monitor = self.query_monitor
+            else:
+                conn = sqlite3.connect(
+                    self.name,
+                    check_same_thread=False,
+                    timeout=10
+                )
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
         return self.local.conn
+
+    def migrate_schema(self) -> list[str]:
+        """Add columns and indexes introduced after the original schema; safe to run repeatedly."""
+        added = migrate_schema(self.get_connection())
+        for item in added:
+            logger.info("Migrated %s: added %s", self.name, item)
+        return added
     
     def get_cursor(self):
         return self.get_connection().cursor()
 
-    def create_account(self, acc_id: str, usr_id: str, acc_name: str, acc_balance: float) -> bool:
+    @contextmanager
+    def transaction(self, operation: str):
+        """
+        Run a write transaction on the thread's connection and record its metrics.
+
+        BEGIN IMMEDIATE takes the write lock up front, so the time spent waiting
+        for it is measured separately from the transaction itself. The block
+        commits on normal exit and rolls back on any exception.
+
+        Inside an open transaction the block runs as a SAVEPOINT instead: it is
+        released on normal exit and rolled back to on an exception, leaving the
+        outer transaction to commit or roll back. Nested blocks record no
+        sqlite_* metrics, since they neither wait for the lock nor commit.
+
+        Args:
+            operation (str): Label used for the sqlite_* metrics
+
+        Yields:
+            sqlite3.Connection: The connection inside the open transaction
+        """
         conn = self.get_connection()
+        if conn.in_transaction:
+            with self._savepoint(conn):
+                yield conn
+            return
+        started = time.perf_counter()
         try:
-            encrypted_acc_balance = encrypt_string_with_file_key(str(acc_balance))
+            with tracing.span("sqlite.lock_wait"):
+                conn.execute("BEGIN IMMEDIATE")
+        finally:
+            locked = time.perf_counter()
+            metrics.observe("sqlite_lock_wait_seconds", locked - started, op=operation)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            metrics.inc("sqlite_transaction_errors_total", op=operation)
+            raise
+        finally:
+            metrics.observe("sqlite_transaction_seconds", time.perf_counter() - locked, op=operation)
+
+    @contextmanager
+    def _savepoint(self, conn: sqlite3.Connection):
+        depth = getattr(self.local, 'savepoint_depth', 0) + 1
+        self.local.savepoint_depth = depth
+        name = f"nested_{depth}"
+        conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+            raise
+        else:
+            conn.execute(f"RELEASE {name}")
+        finally:
+            self.local.savepoint_depth = depth - 1
+
+    def invalidate_accounts(self, *usr_ids: str) -> None:
+        """Bump the cached account summary version of each user (call after the write commits)."""
+        self.account_cache.invalidate(*(self._account_key(usr_id) for usr_id in usr_ids if usr_id is not None))
+
+    def _account_key(self, usr_id) -> tuple[str, str]:
+        # usrID is an INTEGER column but routes pass it as a string; both must hit the same entry
+        return self.name, str(usr_id)
+
+    @tracing.traced("db.create_account")
+    def create_account(self, acc_id: str, usr_id: str, acc_name: str, acc_balance: float) -> bool:
+        encrypted_acc_balance = encrypt_string_with_file_key(str(acc_balance))
 
-            encrypted_acc_type = encrypt_string_with_file_key(acc_name)
+        encrypted_acc_type = encrypt_string_with_file_key(acc_name)
 
+        with self.transaction("create_account") as conn:
             conn.execute(
                 "INSERT INTO Account (accID, accType, usrID, accValue) VALUES (?, ?, ?, ?)",
                 (acc_id, encrypted_acc_type, usr_id, encrypted_acc_balance)
             )
-            conn.commit()
-            return True
-        except sqlite3.Error as e:
-            conn.rollback()
-            raise e
+        self.invalidate_accounts(usr_id)
+        return True
 
+    @tracing.traced("db.create_user")
     def create_user(self, usr_id: str, usr_name: str, email: str, password: str, role_id: int, username_hash: str, email_hash: str) -> bool:
-        conn = self.get_connection()
-        try:
-
+        with self.transaction("create_user") as conn:
             conn.execute(
                 "INSERT INTO User (usrID, usrName, email, password, RoleID, usrNameHash, emailHash) VALUES (?, ?, ?, ?, ?, ?, ?)",
                 (usr_id, usr_name, email, password, role_id, username_hash, email_hash)
             )
-            conn.commit()
-            return True
-        except sqlite3.Error as e:
-            conn.rollback()
-            raise e
+        return True
 
+    @tracing.traced("db.get_user_accounts")
     def get_user_accounts(self, usr_id: str) -> list[Account]:
+        """
+        Decrypted accounts of a user, served from the account cache when it is current.
+
+        Args:
+            usr_id (str): The owner's user ID
+
+        Returns:
+            list[Account]: New Account objects, safe for the caller to modify
+        """
+        key = self._account_key(usr_id)
+        rows = self.account_cache.get(key)
+        if rows is None:
+            # Read the version first: a write committing during the query bumps it and the result isn't cached
+            version = self.account_cache.version(key)
+            rows = tuple((account.accountNumber, account.type, account.balance)
+                         for account in self._read_user_accounts(usr_id))
+            self.account_cache.put(key, version, rows)
+        return [Account(accountNumber=number, accountType=acc_type, balance=balance)
+                for number, acc_type, balance in rows]
+
+    def _read_user_accounts(self, usr_id: str) -> list[Account]:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM Account WHERE usrID=?", (usr_id,))
@@ -108,11 +263,17 @@ class Database:
                 ))
 
             except Exception as e:
-                print(f"[ERROR] Decryption Failed for account {row[0]}: {e}")
+                logger.error("Decryption failed for account %s: %s", row[0], e)
+
+        logger.debug("get_user_accounts returning %d accounts for user %s", len(accounts), usr_id)
+        return accounts
 
-        print("[DEBUG] get_user_accounts returning:", accounts)
-        return accounts  
+    def get_account_owner(self, acc_id: str) -> str | None:
+        """User ID owning an account, or None if the account doesn't exist (primary key lookup, no decryption)."""
+        row = self.get_connection().execute("SELECT usrID FROM Account WHERE accID=?", (acc_id,)).fetchone()
+        return row[0] if row else None
 
+    @tracing.traced("db.get_users")
     def get_users(self, usr_id: str) -> list[dict]:
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -139,31 +300,34 @@ class Database:
             "password": row[3]
         } if row else None
 
+    @tracing.traced("db.account_id_in_use")
     def account_id_in_use(self, random_id: str) -> bool:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT 1 FROM Account WHERE accID=?", (random_id,))
         return bool(cursor.fetchone())
 
+    @tracing.traced("db.email_in_use")
     def email_in_use(self, email_address: str) -> bool:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT 1 FROM User WHERE email=?", (email_address,))
         return bool(cursor.fetchone())
 
+    @tracing.traced("db.user_id_in_use")
     def user_id_in_use(self, random_id: str) -> bool:
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT 1 FROM User WHERE usrID=?", (random_id,))
         return bool(cursor.fetchone())
 
+    @tracing.traced("db.withdraw_from_account")
     def withdraw_from_account(self, account_id: str, amount: float) -> list[str]:
-        conn = self.get_connection()
         errors = []
         try:
-            with conn:
+            with self.transaction("withdraw") as conn:
                 cursor = conn.cursor()
-                cursor.execute("SELECT accValue FROM Account WHERE accID=?", (account_id,))
+                cursor.execute("SELECT accValue, usrID FROM Account WHERE accID=?", (account_id,))
                 result = cursor.fetchone()
                 
                 if not result:
@@ -199,20 +363,21 @@ class Database:
                     (operation, table_name, old_value, new_value, timestamp, signature)
                 )
 
+            self.invalidate_accounts(result[1])
             return []
         except sqlite3.Error as e:
             errors.append(f"Database error: {str(e)}")
             return errors
 
+    @tracing.traced("db.deposit_to_account")
     def deposit_to_account(self, account_id: str, amount: float) -> list[str]:
         if amount <= 0:
             return ["Error: Invalid deposit amount"]
         
-        conn = self.get_connection()
         try:
-            with conn:
+            with self.transaction("deposit") as conn:
                 cursor = conn.cursor()
-                cursor.execute("SELECT accValue FROM Account WHERE accID=?", (account_id,))
+                cursor.execute("SELECT accValue, usrID FROM Account WHERE accID=?", (account_id,))
                 
                 result = cursor.fetchone()
 
@@ -248,17 +413,18 @@ class Database:
                     "VALUES (?, ?, ?, ?, ?, ?)",
                     (operation, table_name, old_value, new_value, timestamp, signature)
                 )
+            self.invalidate_accounts(result[1])
             return []
         except sqlite3.Error as e:
             return [f"Database error: {str(e)}"]
 
+    @tracing.traced("db.transfer_funds_by_account_number")
     def transfer_funds_by_account_number(self, from_account_id: str, to_account_id: str, amount: float) -> list[str]:
-        conn = self.get_connection()
         try:
-            with conn:
+            with self.transaction("transfer") as conn:
                 cursor = conn.cursor()
                 # Check source account
-                cursor.execute("SELECT accValue FROM Account WHERE accID=?", (from_account_id,))
+                cursor.execute("SELECT accValue, usrID FROM Account WHERE accID=?", (from_account_id,))
                 from_result = cursor.fetchone()
                 if not from_result:
                     return ["Error: Source Account Not Found"]
@@ -267,7 +433,7 @@ class Database:
                 if from_balance < amount:
                     return ["Error: Insufficient Funds, Brokie."]
                 
-                cursor.execute("SELECT accValue FROM Account WHERE accID=?", (to_account_id,))
+                cursor.execute("SELECT accValue, usrID FROM Account WHERE accID=?", (to_account_id,))
 
                 to_result = cursor.fetchone()
 
@@ -300,27 +466,26 @@ class Database:
                 deposit_signature = sign_message(deposit_message).hex()
 
                 cursor.execute(
-                "INSERT INTO auditLog (Operation, TableName, oldValue, newValue, ChangedAt, signature) "
-                "VALUES (?, ?, ?, ?, ?, ?)",
-                ("TRANSFER-WITHDRAWAL", "Account", withdraw_old_value, withdraw_new_value, timestamp, withdraw_signature)
-            )
+                    "INSERT INTO auditLog (Operation, TableName, oldValue, newValue, ChangedAt, signature) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    ("TRANSFER-WITHDRAWAL", "Account", withdraw_old_value, withdraw_new_value, timestamp, withdraw_signature)
+                )
 
-            cursor.execute(
-                "INSERT INTO auditLog (Operation, TableName, oldValue, newValue, ChangedAt, signature) "
-                "VALUES (?, ?, ?, ?, ?, ?)",
-                ("TRANSFER-DEPOSIT", "Account", deposit_old_value, deposit_new_value, timestamp, deposit_signature)
-            )
+                cursor.execute(
+                    "INSERT INTO auditLog (Operation, TableName, oldValue, newValue, ChangedAt, signature) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    ("TRANSFER-DEPOSIT", "Account", deposit_old_value, deposit_new_value, timestamp, deposit_signature)
+                )
 
-            conn.commit()
-                
+            self.invalidate_accounts(from_result[1], to_result[1])
             return []
         except sqlite3.Error as e:
             return [f"Database error: {str(e)}"]
 
+    @tracing.traced("db.password_reset")
     def password_reset(self, user_name: str, email: str, password: str) -> bool:
-        conn = self.get_connection()
         try:
-            with conn:
+            with self.transaction("password_reset") as conn:
                 conn.execute(
                     "UPDATE User SET password=? WHERE usrName=? AND email=?",
                     (password, user_name, email)
@@ -329,6 +494,66 @@ class Database:
         except sqlite3.Error:
             return False
 
+    def update_password_hash(self, usr_id: str, old_hash: str, new_hash: str) -> bool:
+        """
+        Replace a user's password hash if it is still ``old_hash``.
+
+        Used to upgrade hashes to the current bcrypt cost; the check keeps a
+        password reset that happened in the meantime from being overwritten.
+        """
+        try:
+            with self.transaction("password_rehash") as conn:
+                cursor = conn.execute(
+                    "UPDATE User SET password=? WHERE usrID=? AND password=?",
+                    (new_hash, usr_id, old_hash)
+                )
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            logging.error("Password rehash for %s failed: %s", usr_id, e)
+            return False
+
+    def get_totp(self, usr_id: str) -> tuple[str | None, int | None]:
+        """Encrypted TOTP secret and last accepted time step for a user ((None, None) if not enrolled)."""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("SELECT totpSecret, totpLastStep FROM User WHERE usrID=?", (usr_id,)).fetchone()
+        except sqlite3.OperationalError as e:
+            # Not migrated yet: nobody can be enrolled
+            logger.debug("TOTP columns unavailable in %s (run migrate_schema): %s", self.name, e)
+            return None, None
+        return (row[0], row[1]) if row else (None, None)
+
+    def set_totp_secret(self, usr_id: str, encrypted_secret: str | None, step: int | None = None) -> bool:
+        """Enroll (or with None, remove) a user's TOTP secret."""
+        try:
+            with self.transaction("totp_enroll") as conn:
+                cursor = conn.execute(
+                    "UPDATE User SET totpSecret=?, totpLastStep=? WHERE usrID=?",
+                    (encrypted_secret, step, usr_id)
+                )
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            logging.error("TOTP enrollment update for %s failed: %s", usr_id, e)
+            return False
+
+    def claim_totp_step(self, usr_id: str, step: int) -> bool:
+        """
+        Record ``step`` as used if it is newer than the last accepted one.
+
+        The compare-and-set makes a code usable once even when two processes
+        verify it at the same moment.
+        """
+        try:
+            with self.transaction("totp_claim") as conn:
+                cursor = conn.execute(
+                    "UPDATE User SET totpLastStep=? WHERE usrID=? AND (totpLastStep IS NULL OR totpLastStep < ?)",
+                    (step, usr_id, step)
+                )
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            logging.error("TOTP step update for %s failed: %s", usr_id, e)
+            return False
+
     def get_user_by_username(self, username: str) -> dict | None:
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -350,6 +575,7 @@ class Database:
                 continue
         return None
     
+    @tracing.traced("db.get_user_encrypted_search")
     def get_user_encrypted_search(self, username: str) -> dict | None:
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -391,6 +617,7 @@ class Database:
 
         return None
     
+    @tracing.traced("db.get_user_encrypted_email_search")
     def get_user_encrypted_email_search(self, email: str) -> dict | None:
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -430,6 +657,7 @@ class Database:
         except sqlite3.Error:
             return False
 
+    @tracing.traced("db.get_audit_logs")
     def get_audit_logs(self) -> list:
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -507,6 +735,7 @@ class Database:
             cursor.execute("DELETE FROM User WHERE usrID=?", (usr_id,))
 
             conn.commit()
+            self.invalidate_accounts(usr_id)
 
             self.get_connection().execute("VACUUM")
 
@@ -535,7 +764,7 @@ class Database:
             cursor = conn.cursor()
 
             # Fetch original account information
-            cursor.execute("SELECT accType, accValue FROM Account WHERE accID=?", (acc_id,))
+            cursor.execute("SELECT accType, accValue, usrID FROM Account WHERE accID=?", (acc_id,))
             original = cursor.fetchone()
 
             if not original:
@@ -570,6 +799,7 @@ class Database:
             # Delete the account record
             cursor.execute("DELETE FROM Account WHERE accID=?", (acc_id,))
             conn.commit()
+            self.invalidate_accounts(original[2])
 
             self.get_connection().execute("VACUUM")
 
@@ -634,6 +864,9 @@ class Database:
             self.close_all_connections()
             with open(self.name, 'wb') as db_file:
                 db_file.write(decrypted_data)
+            self.account_cache.clear()
+            # Backups taken before a migration lack the newer columns
+            self.migrate_schema()
 
             logging.info(f"Database successfully restored from {self.backup_name}")
             return True
@@ -0,0 +1,365 @@
+"""
+email_outbox.py
+Persistent email outbox with a background SMTP delivery worker.
+
+Requests call EmailOutbox.enqueue(), which inserts one row into a SQLite
+table and returns at once. A DeliveryWorker thread claims due rows in
+batches and sends them over one reused SMTP connection. Failed messages are
+retried with exponential backoff; after MAX_ATTEMPTS they are marked failed.
+Repeated connection failures open a circuit breaker so a dead mail server is
+probed every few seconds instead of being hammered.
+
+Recipients and message bodies (which hold 2FA codes) are stored encrypted
+with the file key and blanked once a message is sent or has failed. The
+worker also deletes finished rows after RETENTION_SECONDS, checking every
+PURGE_INTERVAL seconds.
+"""
+
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from email.message import EmailMessage
+
+import metrics
+from encryption_utils import decrypt_string_with_file_key, encrypt_string_with_file_key, mask_email
+
+OUTBOX_DB = os.getenv("EMAIL_OUTBOX_DB", "EmailOutbox.db")
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 8
+BASE_DELAY = 2.0
+MAX_DELAY = 300.0
+CLAIM_SECONDS = 120.0
+POLL_INTERVAL = 5.0
+# An idle SMTP connection older than this is checked with NOOP before reuse
+IDLE_CHECK_SECONDS = 30.0
+# Sent and failed rows are kept this long for counts() and lastError, then deleted
+RETENTION_SECONDS = 86400.0
+PURGE_INTERVAL = 3600.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS emailOutbox (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    nextAttempt REAL NOT NULL,
+    createdAt REAL NOT NULL,
+    sentAt REAL,
+    lastError TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_emailOutbox_due ON emailOutbox (status, nextAttempt);
+"""
+
+class EmailOutbox:
+    """
+    SQLite-backed queue of outgoing emails.
+
+    Attributes:
+        db_path (str): Outbox database file
+        wakeup (threading.Event): Set on enqueue so the worker does not wait a full poll interval
+    """
+
+    def __init__(self, db_path: str = OUTBOX_DB):
+        self.db_path = db_path
+        self.wakeup = threading.Event()
+        self.local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    def enqueue(self, recipient: str, subject: str, body: str) -> int:
+        """Queue one message for delivery and return its ID."""
+        now = time.time()
+        cursor = self.connection().execute(
+            "INSERT INTO emailOutbox (recipient, subject, body, nextAttempt, createdAt) VALUES (?, ?, ?, ?, ?)",
+            (encrypt_string_with_file_key(recipient), subject, encrypt_string_with_file_key(body), now, now)
+        )
+        metrics.inc("email_outbox_total", result="queued")
+        self.wakeup.set()
+        return cursor.lastrowid
+
+    def claim(self, limit: int = BATCH_SIZE) -> list[dict]:
+        """
+        Take up to ``limit`` due messages.
+
+        Claimed rows get a lease (nextAttempt moves CLAIM_SECONDS ahead), so a
+        worker in another process skips them and a crashed worker's rows are
+        retried once the lease runs out.
+        """
+        now = time.time()
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT ID, recipient, subject, body, attempts FROM emailOutbox "
+                "WHERE status = 'pending' AND nextAttempt <= ? ORDER BY nextAttempt LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            conn.executemany("UPDATE emailOutbox SET nextAttempt = ? WHERE ID = ?",
+                             [(now + CLAIM_SECONDS, row[0]) for row in rows])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [{
+            'id': row[0],
+            'recipient': decrypt_string_with_file_key(row[1]),
+            'subject': row[2],
+            'body': decrypt_string_with_file_key(row[3]),
+            'attempts': row[4],
+        } for row in rows]
+
+    def mark_sent(self, message_id: int) -> None:
+        self.connection().execute(
+            "UPDATE emailOutbox SET status = 'sent', sentAt = ?, recipient = '', body = '', lastError = NULL WHERE ID = ?",
+            (time.time(), message_id)
+        )
+        metrics.inc("email_outbox_total", result="sent")
+
+    def mark_retry(self, message: dict, error: str, max_attempts: int = MAX_ATTEMPTS) -> None:
+        """Reschedule with exponential backoff and jitter, or give up after max_attempts."""
+        attempts = message['attempts'] + 1
+        if attempts >= max_attempts:
+            self.connection().execute(
+                "UPDATE emailOutbox SET status = 'failed', sentAt = ?, attempts = ?, recipient = '', body = '', "
+                "lastError = ? WHERE ID = ?",
+                (time.time(), attempts, error, message['id'])
+            )
+            metrics.inc("email_outbox_total", result="failed")
+            logging.error("Giving up on email %s to %s after %d attempts: %s",
+                          message['id'], mask_email(message['recipient']), attempts, error)
+            return
+        delay = min(MAX_DELAY, BASE_DELAY * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+        self.connection().execute(
+            "UPDATE emailOutbox SET attempts = ?, nextAttempt = ?, lastError = ? WHERE ID = ?",
+            (attempts, time.time() + delay, error, message['id'])
+        )
+        metrics.inc("email_outbox_total", result="retry")
+
+    def release(self, messages: list[dict]) -> None:
+        """Hand claimed messages back without counting an attempt (e.g. circuit opened mid-batch)."""
+        self.connection().executemany("UPDATE emailOutbox SET nextAttempt = ? WHERE ID = ?",
+                                      [(time.time(), message['id']) for message in messages])
+
+    def counts(self) -> dict:
+        """Number of messages per status."""
+        return dict(self.connection().execute("SELECT status, COUNT(*) FROM emailOutbox GROUP BY status").fetchall())
+
+    def purge_finished(self, older_than: float = RETENTION_SECONDS) -> int:
+        """Delete sent and failed messages finished more than ``older_than`` seconds ago."""
+        cursor = self.connection().execute(
+            "DELETE FROM emailOutbox WHERE status IN ('sent', 'failed') AND sentAt < ?",
+            (time.time() - older_than,)
+        )
+        if cursor.rowcount:
+            metrics.inc("email_outbox_purged_total", cursor.rowcount)
+        return cursor.rowcount
+
+class CircuitBreaker:
+    """
+    Closed -> open after ``threshold`` consecutive failures; open -> half-open
+    after ``reset_timeout`` seconds, when one probe is allowed through.
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def retry_in(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logging.info("Email circuit closed")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.state != "open":
+                logging.warning("Email circuit opened after %d failures", self.failures)
+                metrics.inc("email_circuit_opened_total")
+            self.opened_at = time.monotonic()
+
+class SmtpSender:
+    """
+    Keeps one SMTP connection open across messages and batches.
+
+    Attributes:
+        host (str): SMTP server
+        port (int): SMTP port
+        username (str | None): Login user (skipped when None)
+        password (callable): Returns the login password when connecting
+        starttls (bool): Upgrade the connection with STARTTLS
+        sender (str): From address
+    """
+
+    def __init__(self, host: str, port: int, sender: str, username: str | None = None,
+                 password=lambda: "", starttls: bool = True, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._smtp = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password())
+        except BaseException:
+            smtp.close()
+            raise
+        metrics.inc("email_smtp_connections_total")
+        return smtp
+
+    def connection(self) -> smtplib.SMTP:
+        if self._smtp is not None and time.monotonic() - self._last_used > IDLE_CHECK_SECONDS:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def send(self, recipient: str, subject: str, body: str) -> None:
+        """Send one message; connection errors close the connection and propagate."""
+        msg = EmailMessage()
+        msg.set_content(body)
+        msg['Subject'] = subject
+        msg['From'] = self.sender
+        msg['To'] = recipient
+        try:
+            with metrics.timer("email_send_seconds"):
+                self.connection().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError):
+            self.close()
+            raise
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+def is_permanent(error: Exception) -> bool:
+    """5xx replies about the message or recipient will not succeed on retry."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600 \
+        and not isinstance(error, smtplib.SMTPAuthenticationError)
+
+class DeliveryWorker(threading.Thread):
+    """
+    Background thread that drains an EmailOutbox through an SmtpSender.
+
+    Attributes:
+        outbox (EmailOutbox): Queue being drained
+        sender (SmtpSender): SMTP connection used for every batch
+        breaker (CircuitBreaker): Stops delivery attempts while the server is down
+    """
+
+    def __init__(self, outbox: EmailOutbox, sender: SmtpSender, breaker: CircuitBreaker | None = None,
+                 batch_size: int = BATCH_SIZE, max_attempts: int = MAX_ATTEMPTS, poll_interval: float = POLL_INTERVAL,
+                 purge_interval: float = PURGE_INTERVAL, retention: float = RETENTION_SECONDS):
+        super().__init__(name="email-delivery", daemon=True)
+        self.outbox = outbox
+        self.sender = sender
+        self.breaker = breaker or CircuitBreaker()
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self.retention = retention
+        self._next_purge = 0.0
+        self._stopping = threading.Event()
+
+    def deliver_batch(self) -> int:
+        """Send one batch of due messages; returns how many were claimed."""
+        if not self.breaker.allow():
+            return 0
+        batch = self.outbox.claim(self.batch_size)
+        for index, message in enumerate(batch):
+            if not self.breaker.allow():
+                self.outbox.release(batch[index:])
+                break
+            try:
+                self.sender.send(message['recipient'], message['subject'], message['body'])
+            except Exception as e:
+                if is_permanent(e):
+                    # The server answered; only this message is bad
+                    self.breaker.record_success()
+                    self.outbox.mark_retry(message, str(e), max_attempts=1)
+                else:
+                    self.breaker.record_failure()
+                    self.outbox.mark_retry(message, f"{type(e).__name__}: {e}", self.max_attempts)
+                continue
+            self.breaker.record_success()
+            self.outbox.mark_sent(message['id'])
+        return len(batch)
+
+    def purge_if_due(self) -> int:
+        """Delete old finished messages at most once per purge_interval."""
+        now = time.monotonic()
+        if now < self._next_purge:
+            return 0
+        self._next_purge = now + self.purge_interval
+        return self.outbox.purge_finished(self.retention)
+
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            self.outbox.wakeup.clear()
+            try:
+                self.purge_if_due()
+                claimed = self.deliver_batch()
+            except Exception as e:
+                logging.error("Email delivery loop error: %s", e)
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue  # more may be due right away
+            timeout = self.breaker.retry_in() or self.poll_interval
+            self.outbox.wakeup.wait(timeout)
+        self.sender.close()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stopping.set()
+        self.outbox.wakeup.set()
+        self.join(timeout)
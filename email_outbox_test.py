@@ -0,0 +1,166 @@
+"""
+email_outbox_test.py
+Tests for the email outbox and delivery worker against a local stand-in SMTP server.
+"""
+
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+from email_outbox import CircuitBreaker, DeliveryWorker, EmailOutbox, SmtpSender
+
+class StandInSmtpServer(socketserver.ThreadingTCPServer):
+    """Just enough SMTP to accept messages; RCPT for addresses in ``reject`` gets a 550."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, reject=()):
+        super().__init__(("127.0.0.1", 0), StandInSmtpHandler)
+        self.reject = set(reject)
+        self.messages = []
+        self.connections = 0
+
+class StandInSmtpHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line: str) -> None:
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 stand-in ESMTP")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            command = line.split(" ", 1)[0].upper()
+            if command in ("EHLO", "HELO"):
+                self.reply("250 stand-in")
+            elif command == "RCPT":
+                address = line.split(":", 1)[1].strip("<> ")
+                if address in self.server.reject:
+                    self.reply("550 no such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 end with .")
+                body = []
+                while (data := self.rfile.readline().decode()) not in (".\r\n", ""):
+                    body.append(data)
+                self.server.messages.append((recipients, "".join(body)))
+                recipients = []
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:  # MAIL, RSET, NOOP
+                self.reply("250 OK")
+
+class TestEmailOutbox(unittest.TestCase):
+    """Test cases for batching, connection reuse, retries and the circuit breaker."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.outbox = EmailOutbox(os.path.join(self.tmpdir.name, "outbox.db"))
+        self.server = StandInSmtpServer(reject={"nobody@example.com"})
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.sender = SmtpSender("127.0.0.1", self.server.server_address[1], "bank@example.com", starttls=False)
+
+    def tearDown(self):
+        self.sender.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.outbox.connection().close()
+        self.tmpdir.cleanup()
+
+    def test_batch_reuses_one_connection(self):
+        """
+        Test that a batch is sent over one SMTP connection and a bad recipient fails alone.
+        """
+        for i in range(3):
+            self.outbox.enqueue(f"user{i}@example.com", "Code", f"Your verification code: 00000{i}")
+        self.outbox.enqueue("nobody@example.com", "Code", "Your verification code: 999999")
+
+        worker = DeliveryWorker(self.outbox, self.sender)
+        self.assertEqual(worker.deliver_batch(), 4)
+        self.assertEqual(self.outbox.counts(), {'sent': 3, 'failed': 1})
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(self.server.connections, 1)
+        self.assertIn("000002", self.server.messages[2][1])
+
+    def test_stored_body_is_encrypted(self):
+        """
+        Test that the 2FA code and the recipient are not stored in plain text.
+        """
+        self.outbox.enqueue("user@example.com", "Code", "Your verification code: 424242")
+        recipient, body = self.outbox.connection().execute("SELECT recipient, body FROM emailOutbox").fetchone()
+        self.assertNotIn("424242", body)
+        self.assertNotIn("user@example.com", recipient)
+        message = self.outbox.claim()[0]
+        self.assertIn("424242", message['body'])
+        self.assertEqual(message['recipient'], "user@example.com")
+
+    def test_finished_rows_are_blanked_and_purged(self):
+        """
+        Test that sent and failed rows lose their address and body and are purged after the retention period.
+        """
+        self.outbox.enqueue("user@example.com", "Code", "Your verification code: 111111")
+        self.outbox.enqueue("nobody@example.com", "Code", "Your verification code: 222222")
+        worker = DeliveryWorker(self.outbox, self.sender, retention=60)
+        worker.deliver_batch()
+        rows = self.outbox.connection().execute("SELECT status, recipient, body FROM emailOutbox").fetchall()
+        self.assertEqual(sorted(rows), [('failed', '', ''), ('sent', '', '')])
+
+        self.assertEqual(worker.purge_if_due(), 0)
+        self.outbox.connection().execute("UPDATE emailOutbox SET sentAt = sentAt - 120")
+        self.outbox.enqueue("later@example.com", "Code", "body")
+        # Not due again until purge_interval has passed
+        self.assertEqual(worker.purge_if_due(), 0)
+        worker._next_purge = 0.0
+        self.assertEqual(worker.purge_if_due(), 2)
+        self.assertEqual(self.outbox.counts(), {'pending': 1})
+
+    def test_unreachable_server_backs_off_and_opens_circuit(self):
+        """
+        Test that connection failures reschedule messages and open the circuit breaker.
+        """
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            closed_port = s.getsockname()[1]
+        sender = SmtpSender("127.0.0.1", closed_port, "bank@example.com", starttls=False, timeout=1)
+        worker = DeliveryWorker(self.outbox, sender, CircuitBreaker(threshold=2, reset_timeout=60))
+        for i in range(3):
+            self.outbox.enqueue(f"user{i}@example.com", "Code", "body")
+
+        self.assertEqual(worker.deliver_batch(), 3)
+        self.assertEqual(worker.breaker.state, "open")
+        rows = self.outbox.connection().execute(
+            "SELECT attempts, nextAttempt FROM emailOutbox ORDER BY ID").fetchall()
+        # Two attempts failed; the third message was handed back untouched when the circuit opened
+        self.assertEqual([row[0] for row in rows], [1, 1, 0])
+        self.assertTrue(all(row[1] > time.time() for row in rows[:2]))
+        self.assertEqual(worker.deliver_batch(), 0)
+
+    def test_background_worker_delivers(self):
+        """
+        Test that the worker thread wakes up on enqueue and delivers.
+        """
+        worker = DeliveryWorker(self.outbox, self.sender, poll_interval=30)
+        worker.start()
+        try:
+            self.outbox.enqueue("user@example.com", "Code", "Your verification code: 123456")
+            deadline = time.time() + 10
+            while not self.server.messages and time.time() < deadline:
+                time.sleep(0.02)
+        finally:
+            worker.stop(timeout=5)
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertEqual(self.server.messages[0][0], ["user@example.com"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,8 @@ from cryptography.fernet import Fernet
 from key_manager import load_or_create_key, rotate_key, get_cipher
 from cryptography.fernet import Fernet
 from cryptography.fernet import InvalidToken
+import metrics
+import tracing
 
 KEY_FILE = "encryption_key.key"
 
@@ -14,6 +16,8 @@ def encrypt_bytes_with_file_key(data: bytes) -> bytes:
     cipher = Fernet(key)
     return cipher.encrypt(data)
 
+@tracing.traced("encrypt")
+@metrics.timed("crypto_operation_seconds", op="encrypt")
 def encrypt_string_with_file_key(data: str) -> str:
     """Encrypts a string using the file-based key."""
     cipher = get_cipher()
@@ -44,6 +48,8 @@ def mask_username(username: str) -> str:
         return "*" * len(username)
     return username[0] + "*" * (len(username) - 2) + username[-1:]
 
+@tracing.traced("decrypt")
+@metrics.timed("crypto_operation_seconds", op="decrypt")
 def decrypt_string_with_file_key(encrypted: str) -> str:
     """Decrypts a string using the file-based key."""
     cipher = get_cipher()
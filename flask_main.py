@@ -4,12 +4,27 @@ This script initializes and runs the Flask banking application.
 """
 
 import os
+import hmac
+import math
 import time
 import random
 import logging
-from functools import wraps
-from flask import Flask, render_template, request, redirect, flash, session
+import tracemalloc
+from flask import Flask, Response, g, jsonify, render_template, request, redirect, flash, session
 from flask_session import Session
+from werkzeug.middleware.proxy_fix import ProxyFix
+import log_manager
+import metrics
+import totp
+import tracing
+from profiler import ProfileStore
+from traffic_capture import CaptureMiddleware, ENVIRON_KEY as CAPTURE_KEY
+from password_hashing import HasherBusy
+from login_throttle import make_login_throttle
+from admission_control import AdmissionControl, default_classes, parse_limits
+from sqlite_session import SqliteSessionInterface
+from rbac import requires_role
+from api import api_v1
 from user_management import UserManager
 from database_handler import Database
 from session_manager import SessionManager
@@ -20,6 +35,7 @@ from memory_manager import MemoryManager
 from input_validator import InputValidator
 from encryption_utils import decrypt_string_with_file_key, mask_email, mask_username, mask_account_number
 from audit_log_utils import mask_and_decrypt_all
+from logs.log_search import LogQuery, follow_log
 
 # Initialize Flask Application
 app = Flask(__name__)
@@ -28,21 +44,59 @@ app = Flask(__name__)
 env = os.getenv('FLASK_ENV', '').lower()
 app.config.update(
     SECRET_KEY=os.getenv("SECRET_KEY", "default-secret-key"),
-    SESSION_TYPE="filesystem",
+    # "sqlite" (default) keeps sessions in SESSION_SQLITE_PATH; "filesystem" uses Flask-Session files
+    SESSION_TYPE=os.getenv('SESSION_TYPE', 'sqlite'),
+    SESSION_SQLITE_PATH=os.getenv('SESSION_SQLITE_PATH', 'Sessions.db'),
+    # Decoded sessions cached per process (0 = off); entries are re-read after 2 seconds
+    SESSION_LRU_SIZE=int(os.getenv('SESSION_LRU_SIZE', '0')),
     TESTING=(env == 'testing'),
     WTF_CSRF_ENABLED=(env != 'testing'),
-    DEBUG=(env == 'development')
+    DEBUG=(env == 'development'),
+    # Per-request span tracing (Server-Timing header, optional JSONL file)
+    TRACE_REQUESTS=os.getenv('TRACE_REQUESTS', '').lower() in ('1', 'true', 'yes'),
+    TRACE_FILE=os.getenv('TRACE_FILE'),
+    # Sanitized request capture for traffic_replay.py
+    TRAFFIC_CAPTURE=os.getenv('TRAFFIC_CAPTURE'),
+    # Write usernames/emails/account numbers unmasked so logins replay; synthetic data only
+    TRAFFIC_CAPTURE_IDENTIFIERS=os.getenv('TRAFFIC_CAPTURE_IDENTIFIERS', '').lower() in ('1', 'true', 'yes'),
+    # Load shedding per route class (see admission_control.py)
+    ADMISSION_CONTROL=os.getenv('ADMISSION_CONTROL', '1').lower() not in ('0', 'false', 'no'),
+    ADMISSION_LIMITS=os.getenv('ADMISSION_LIMITS', ''),
+    # Bearer token for Prometheus scrapers; without it /metrics is admin-only
+    METRICS_TOKEN=os.getenv('METRICS_TOKEN'),
+    # Reverse proxies in front of the app: 0 = clients connect directly, N = trust the last N
+    # X-Forwarded-For hops. Unset means the client address is unknown, so logins are throttled
+    # by username only (otherwise everyone behind one proxy would share one IP limit).
+    TRUSTED_PROXIES=int(os.environ['TRUSTED_PROXIES']) if os.getenv('TRUSTED_PROXIES') else None
 )
 
 # Initialize Extensions
-Session(app)
+if app.config['TRUSTED_PROXIES']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
+if app.config['SESSION_TYPE'] == 'sqlite':
+    app.session_interface = SqliteSessionInterface(app.config['SESSION_SQLITE_PATH'],
+                                                   lru_size=app.config['SESSION_LRU_SIZE'])
+else:
+    Session(app)
+# Per-route-class concurrency limits; capture (below) wraps it so shed requests are recorded too
+admission = None
+if app.config['ADMISSION_CONTROL']:
+    admission = app.wsgi_app = AdmissionControl(
+        app.wsgi_app, parse_limits(app.config['ADMISSION_LIMITS'], default_classes()))
+if app.config['TRAFFIC_CAPTURE']:
+    app.wsgi_app = CaptureMiddleware(app.wsgi_app, app.config['TRAFFIC_CAPTURE'],
+                                     cookie_name=app.config.get('SESSION_COOKIE_NAME', 'session'),
+                                     keep_identifiers=app.config['TRAFFIC_CAPTURE_IDENTIFIERS'])
 
 # Application Components
 session_manager = SessionManager()
 user_manager = UserManager()
 db_manager = Database('BankingData.db')
-memory_manager = MemoryManager()
-failed_login_attempts = {}
+memory_manager = MemoryManager(sample_interval=float(os.getenv('MEMORY_SAMPLE_INTERVAL', '5')))
+# Failed logins per username and client IP; LOGIN_THROTTLE=sqlite:path shares it between processes
+login_throttle = make_login_throttle(os.getenv('LOGIN_THROTTLE', 'memory'))
+profile_store = ProfileStore()
+trace_writer = tracing.TraceWriter(app.config['TRACE_FILE']) if app.config['TRACE_FILE'] else None
 
 # RBAC Configuration
 ROLES = {
@@ -51,40 +105,121 @@ ROLES = {
     3: 'customer'
 }
 
-def requires_role(allowed_roles):
-    """Role-Based Access Control Decorator"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            if 'user_id' not in session:
-                flash('Authentication required', 'error')
-                return redirect('/login')
-                
-            user_role = session.get('role_id')
-            if user_role not in allowed_roles:
-                flash('Insufficient privileges', 'error')
-                logging.warning(f"Unauthorized access attempt by {session.get('username')} to {request.path}")
-                return redirect('/home')
-                
-            return func(*args, **kwargs)
-        return wrapper
-    return decorator
+# Versioned JSON API (see api.py)
+app.register_blueprint(api_v1)
+
+@app.before_request
+def start_request_metrics():
+    """Count the request as in flight and start its latency timer"""
+    g.request_started = time.perf_counter()
+    metrics.inc("http_requests_in_flight")
+
+@app.after_request
+def record_response_status(response):
+    """Remember the status code for the latency histogram"""
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc=None):
+    """Observe request latency by route; runs even when the view raised"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    metrics.inc("http_requests_in_flight", -1)
+    metrics.observe(
+        "http_request_duration_seconds",
+        time.perf_counter() - started,
+        method=request.method,
+        route=request.url_rule.rule if request.url_rule else "<unmatched>",
+        status=g.pop('response_status', 500),
+    )
+
+@app.before_request
+def start_request_trace():
+    """Open a span trace for the request when tracing is enabled"""
+    if app.config['TRACE_REQUESTS']:
+        route = request.url_rule.rule if request.url_rule else request.path
+        g.trace_token = tracing.start_trace(f"{request.method} {route}")
+
+@app.after_request
+def finish_request_trace(response):
+    """Report the per-phase breakdown in the Server-Timing header"""
+    token = g.pop('trace_token', None)
+    if token is not None:
+        trace = tracing.end_trace(token)
+        response.headers['Server-Timing'] = trace.server_timing()
+        if trace_writer is not None:
+            trace_writer.write(trace)
+    return response
+
+@app.teardown_request
+def discard_request_trace(exc=None):
+    """Close a trace left open because the view raised"""
+    token = g.pop('trace_token', None)
+    if token is not None:
+        tracing.end_trace(token)
+
+@app.after_request
+def annotate_captured_request(response):
+    """Add the route rule and session role to the traffic capture record"""
+    record = request.environ.get(CAPTURE_KEY)
+    if record is not None:
+        record['u'] = request.url_rule.rule if request.url_rule else None
+        record['r'] = session.get('role_id')
+    return response
+
+@app.before_request
+def start_request_profile():
+    """Profile this request when an admin asks for it with X-Profile or ?profile=1"""
+    if session.get('role_id') != 1:
+        return
+    if request.headers.get('X-Profile') or request.args.get('profile'):
+        g.profile = profile_store.start()
+        g.profile_started = time.perf_counter()
+
+@app.after_request
+def finish_request_profile(response):
+    """Save the capture and name it in the response"""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        route = request.url_rule.rule if request.url_rule else request.path
+        name = profile_store.stop(profile, request.method, route, g.profile_started)
+        response.headers['X-Profile-Capture'] = name
+    return response
+
+@app.teardown_request
+def discard_request_profile(exc=None):
+    """Still save the capture when the view raised"""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        route = request.url_rule.rule if request.url_rule else request.path
+        profile_store.stop(profile, request.method, route, g.profile_started)
+
+# Template rendering is timed as a "render" span around Template.render
+app.jinja_env.template_class = tracing.traced_template_class(app.jinja_env.template_class)
 
 @app.before_request
 def init_memory_tracking():
     """Initialize memory tracking for each request"""
     memory_manager.register_object(f"request_{request.method}_{request.path}", request)
-    memory_manager.baseline = memory_manager._get_memory_usage()
 
 @app.after_request
 def check_memory_leaks(response):
-    """Check for memory leaks after each request"""
+    """Check for memory leaks after each request using the latest background sample"""
+    memory_manager.record_request(request.url_rule.rule if request.url_rule else request.path)
     if memory_manager.check_for_leaks():
         logging.error("Potential memory leak detected after %s %s", 
                      request.method, request.path)
-    memory_manager.cleanup()
     return response
 
+@app.errorhandler(HasherBusy)
+def password_hashing_busy(error):
+    """Shed logins/sign-ups quickly when the bcrypt queue is full"""
+    logging.warning("Password hashing queue full, rejected %s %s", request.method, request.path)
+    return Response("Server busy, please try again shortly.\n", status=503,
+                    headers={'Retry-After': '1'}, mimetype='text/plain')
+
 @app.route('/')
 def default():
     """Root redirect based on authentication"""
@@ -100,13 +235,25 @@ def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
+
+        # Refuse throttled usernames/IPs before any database or bcrypt work
+        wait = login_throttle.check(username, throttle_ip())
+        if wait:
+            metrics.inc("login_throttled_total")
+            logging.warning("Login throttled for %s from %s", username, request.remote_addr)
+            flash(f'Too many failed attempts. Try again in {max(1, round(wait / 60))} minute(s).', 'error')
+            return render_template('login.html'), 429, {'Retry-After': str(math.ceil(wait))}
+
         result = user_manager.login(username, password)
 
         if result and result.get('requires_2fa'):
             session['2fa_email'] = result['email']
+            session['2fa_method'] = result.get('method', 'email')
+            # The failure count is only cleared once the second factor passes too
+            session['2fa_username'] = username
             return redirect('/verify-2fa')
         if result:
-            failed_login_attempts.pop(username, None)
+            login_throttle.reset(username)
             return redirect('/home')
         else:
             handle_failed_login(username)
@@ -131,6 +278,8 @@ def verify_2fa():
             session['username'] = decrypt_string_with_file_key(user['usrName'])
             session['role_id'] = user['RoleID']
             session.pop('2fa_email', None)
+            session.pop('2fa_method', None)
+            login_throttle.reset(session.pop('2fa_username', ''))
 
             if user['RoleID'] == 1:
                 return redirect('/admin')
@@ -140,7 +289,7 @@ def verify_2fa():
                 return redirect('/home')
 
         flash('Invalid verification code', 'error')
-    return render_template('verify_2fa.html')
+    return render_template('verify_2fa.html', method=session.get('2fa_method', 'email'))
 
 @app.route('/logout')
 def logout():
@@ -496,6 +645,37 @@ def view_logs():
     masked_logs = mask_and_decrypt_all(logs)
     return render_template('logs.html', logs=masked_logs, username=session.get('username'))
 
+@app.route('/admin/logs/live')
+@requires_role([1])
+def admin_log_live():
+    """Live view of the application log, fed by the stream endpoint"""
+    return render_template('admin_log_live.html',
+                           username=session.get('username'),
+                           keyword=request.args.get('keyword', ''),
+                           level=request.args.get('level', ''))
+
+@app.route('/admin/logs/stream')
+@requires_role([1])
+def admin_log_stream():
+    """Server-Sent Events feed of new application log lines matching the filters"""
+    query = LogQuery(request.args.get('keyword'), request.args.get('level'))
+    logging.info("Admin %s started following the application log", session.get('username'))
+
+    def events():
+        yield ": following\n\n"
+        idle = 0
+        for line in follow_log(log_manager.LOG_FILE, query, yield_idle=True):
+            if line is None:
+                idle += 1
+                if idle % 30 == 0:
+                    yield ": keepalive\n\n"  # Lets the server notice closed connections
+                continue
+            idle = 0
+            yield f"data: {line}\n\n"
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/admin/delete-user', methods=['GET', 'POST'])
 @requires_role([1])
 def admin_delete_user():
@@ -581,18 +761,98 @@ def password_reset():
     
     return render_template('passwordReset.html')
 
+@app.route('/security/totp', methods=['GET', 'POST'])
+@requires_role([1, 2, 3])
+def totp_settings():
+    """Enroll in or remove authenticator-app (TOTP) two-factor authentication"""
+    user_id = session['user_id']
+
+    if request.method == 'POST':
+        code = request.form.get('code', '')
+        if request.form.get('action') == 'disable':
+            if user_manager.disable_totp(user_id, code):
+                flash('Authenticator app removed; codes will be emailed again.', 'success')
+            else:
+                flash('Invalid authenticator code', 'error')
+        else:
+            secret = session.get('totp_pending')
+            if secret and user_manager.confirm_totp_enrollment(user_id, secret, code):
+                session.pop('totp_pending', None)
+                flash('Authenticator app enabled.', 'success')
+            else:
+                flash('Invalid authenticator code', 'error')
+        return redirect('/security/totp')
+
+    if user_manager.totp_enabled(user_id):
+        return render_template('totp_setup.html', enabled=True)
+
+    # Keep the same pending secret across reloads until it is confirmed
+    secret = session.setdefault('totp_pending', user_manager.begin_totp_enrollment())
+    account = session.get('username', user_id)
+    return render_template('totp_setup.html', enabled=False, secret=secret,
+                           uri=totp.provisioning_uri(secret, account))
+
 @app.route('/system/status')
 @requires_role([1])
 def system_status():
     """Memory and resource status dashboard"""
     status = {
-        'memory_usage': memory_manager._get_memory_usage(),
+        'memory_usage': memory_manager.current_usage(),
+        'memory_baseline': memory_manager.baseline,
+        'memory_by_route': memory_manager.top_routes(),
         'active_objects': len(memory_manager.object_registry),
-        'connections': memory_manager.object_registry.get('database_connections', 0),
-        'failed_logins': sum(failed_login_attempts.values())
+        'objects_by_category': memory_manager.registry_counts(),
+        'registry_evictions': memory_manager.evicted,
+        'connections': memory_manager.get_object('database_connections') or 0,
+        'failed_logins': int(metrics.REGISTRY.value("login_failures_total")),
+        'logging': log_manager.get_logging_stats()
     }
+    if admission is not None:
+        status['admission'] = admission.snapshot()
+    monitor = db_manager.query_monitor
+    if monitor is not None:
+        status['sql_statements'] = monitor.statements
+        status['slow_queries'] = [
+            f"{q['duration_ms']:.1f}ms {q['caller']}: {q['sql']} | plan: {'; '.join(q['plan']) or 'n/a'}"
+            for q in monitor.slow_queries()
+        ]
     return render_template('system_status.html', status=status)
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition for admins and scrapers presenting METRICS_TOKEN"""
+    # The client address is not trusted: behind a reverse proxy every request looks local
+    token = app.config['METRICS_TOKEN']
+    offered = request.headers.get('Authorization', '')
+    scraper = bool(token) and hmac.compare_digest(offered.encode(), f"Bearer {token}".encode())
+    if not scraper and session.get('role_id') != 1:
+        return Response("Forbidden\n", status=403, mimetype='text/plain')
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/system/profiles')
+@requires_role([1])
+def system_profiles():
+    """Recent request profiles and their most expensive functions"""
+    return render_template('system_profiles.html', profiles=profile_store.recent())
+
+@app.route('/system/memory/diff')
+@requires_role([1])
+def system_memory_diff():
+    """Allocation growth since the previous call (the first call starts tracemalloc)"""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    return jsonify({
+        'tracing': tracemalloc.is_tracing(),
+        'top_allocations': memory_manager.snapshot_diff(limit=limit)
+    })
+
+@app.route('/system/memory/stop-tracing')
+@requires_role([1])
+def system_memory_stop_tracing():
+    """Stop tracemalloc once the investigation is done"""
+    memory_manager.stop_tracing()
+    flash("Allocation tracing stopped", 'success')
+    return redirect('/system/status')
+
 @app.route('/system/cleanup')
 @requires_role([1])
 def system_cleanup():
@@ -601,17 +861,22 @@ def system_cleanup():
     flash("Memory cleanup performed", 'success')
     return redirect('/system/status')
 
+def throttle_ip() -> str | None:
+    """Client IP for the login throttle, or None (username only) when TRUSTED_PROXIES is unset."""
+    return request.remote_addr if app.config['TRUSTED_PROXIES'] is not None else None
+
 def handle_failed_login(username):
     """Track failed login attempts with memory management"""
-    failed_login_attempts[username] = failed_login_attempts.get(username, 0) + 1
+    attempts = login_throttle.record_failure(username, throttle_ip())
+    metrics.inc("login_failures_total")
     flash('Invalid credentials', 'error')
     
-    if failed_login_attempts[username] >= 3:
+    if attempts >= 3:
         logging.error("Security alert: Multiple failed logins for %s", username)
         memory_manager.register_object(f"locked_account_{username}", {
-            'attempts': failed_login_attempts[username],
+            'attempts': attempts,
             'timestamp': time.time()
-        })
+        }, category="locked_account")
 
 def validate_accounts(accounts):
     """Account validation with input checking"""
@@ -656,7 +921,16 @@ def handle_withdrawal_errors(errors, account_id, amount):
         logging.info("Successful withdrawal: %s from %s", amount, account_id)
         flash('Withdrawal successful!', 'success')
 
+@app.cli.command("migrate-db")
+def migrate_db_command():
+    """Add columns and indexes newer features need (e.g. TOTP, hot-path lookups) to an existing database."""
+    added = user_manager.get_database().migrate_schema()
+    print(f"Added {', '.join(added)}" if added else "Schema is up to date")
+
 if __name__ == '__main__':
+    log_manager.enable_encrypt_on_exit()
+    # Explicit startup migration; other servers run `flask --app flask_main migrate-db` before starting
+    user_manager.get_database().migrate_schema()
     use_ssl = os.getenv('USE_SSL', 'false').lower() == 'true'
     debug_mode = env == 'development'
 
@@ -0,0 +1,265 @@
+"""
+generate_data.py
+Builds synthetic banking databases for scale and performance testing.
+
+Rows are produced in batches by worker processes (each loads the Fernet key and
+the signing key once) and written with executemany inside one transaction per
+batch. Every generated user has the same password so load tests can log in;
+the bcrypt hash is computed once and reused.
+
+Usage:
+    python generate_data.py ScaleData.db --users 200000 --accounts-per-user 5 --audit-rows 100000
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import bcrypt
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+from database_handler import migrate_schema
+from key_manager import get_cipher
+from signature_utils import load_private_key
+
+DEFAULT_PASSWORD = "Password123!"
+BATCH_SIZE = 5000
+ACCOUNT_TYPES = ("Checking", "Savings", "Investing")
+FIRST_ID = 1_000_000_000  # keeps user IDs and account numbers at 10 digits
+
+# Matches the production schema in BankingData.db
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS "Role" (
+    "RoleID" INTEGER NOT NULL,
+    "RoleName" TEXT,
+    PRIMARY KEY("RoleID")
+);
+CREATE TABLE IF NOT EXISTS "User" (
+    "usrID" INTEGER,
+    "usrName" TEXT,
+    "email" TEXT,
+    "password" TEXT, RoleID, usrNameHash TEXT, emailHash TEXT,
+    PRIMARY KEY("usrID")
+);
+CREATE TABLE IF NOT EXISTS "Account" (
+    "accID" TEXT NOT NULL,
+    "accValue" TEXT,
+    "accType" TEXT,
+    "usrID" INTEGER NOT NULL,
+    PRIMARY KEY("accID")
+);
+CREATE TABLE IF NOT EXISTS "auditLog" (
+    "ID" INTEGER NOT NULL,
+    "Operation" TEXT,
+    "TableName" TEXT,
+    "oldValue" TEXT,
+    "newValue" TEXT,
+    "ChangedAt" DATETIME DEFAULT CURRENT_TIMESTAMP, signature TEXT,
+    PRIMARY KEY("ID" AUTOINCREMENT)
+);
+INSERT OR IGNORE INTO Role (RoleID, RoleName) VALUES (1, 'admin'), (2, 'teller'), (3, 'customer');
+"""
+
+# Per-process state set up by _init_worker
+_cipher = None
+_private_key = None
+
+def _init_worker() -> None:
+    global _cipher, _private_key
+    _cipher = get_cipher()
+    _private_key = load_private_key()
+
+def _encrypt(value: str) -> str:
+    return _cipher.encrypt(value.encode()).decode()
+
+def _sign(message: str) -> str:
+    return _private_key.sign(
+        message.encode(),
+        padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
+        hashes.SHA256()
+    ).hex()
+
+def username_for(index: int) -> str:
+    """Username of the index-th generated user."""
+    return f"user{index:07d}"
+
+def user_id_for(index: int) -> str:
+    return str(FIRST_ID + index)
+
+def account_id_for(user_index: int, account_index: int, accounts_per_user: int) -> str:
+    return str(FIRST_ID + user_index * accounts_per_user + account_index)
+
+def _user_rows(job: tuple) -> list[tuple]:
+    start, count, password_hash, admins = job
+    rows = []
+    for index in range(start, start + count):
+        username = username_for(index)
+        email = f"{username}@example.com"
+        rows.append((
+            user_id_for(index), _encrypt(username), _encrypt(email), password_hash,
+            1 if index < admins else 3,
+            hashlib.sha256(username.encode()).hexdigest(),
+            hashlib.sha256(email.encode()).hexdigest(),
+        ))
+    return rows
+
+def _account_rows(job: tuple) -> list[tuple]:
+    start, count, accounts_per_user, seed = job
+    rng = random.Random(seed * 1_000_003 + start)
+    rows = []
+    for index in range(start, start + count):
+        for account_index in range(accounts_per_user):
+            balance = round(rng.uniform(0, 25000), 2)
+            rows.append((
+                account_id_for(index, account_index, accounts_per_user),
+                _encrypt(str(balance)),
+                _encrypt(ACCOUNT_TYPES[account_index % len(ACCOUNT_TYPES)]),
+                user_id_for(index),
+            ))
+    return rows
+
+def _audit_rows(job: tuple) -> list[tuple]:
+    start, count, seed, sign = job
+    rng = random.Random(seed * 2_000_003 + start)
+    epoch = datetime(2025, 1, 1)
+    rows = []
+    for _ in range(count):
+        operation = rng.choice(("DEPOSIT", "WITHDRAW"))
+        old_balance = round(rng.uniform(0, 25000), 2)
+        amount = round(rng.uniform(1, 500), 2)
+        new_balance = old_balance + amount if operation == "DEPOSIT" else old_balance - amount
+        timestamp = (epoch + timedelta(seconds=rng.randrange(365 * 86400))).isoformat()
+        old_value = _encrypt(f"Balance: {old_balance}")
+        new_value = _encrypt(f"Balance: {new_balance}")
+        signature = _sign(f"{operation}|Account|{old_value}|{new_value}|{timestamp}") if sign else None
+        rows.append((operation, "Account", old_value, new_value, timestamp, signature))
+    return rows
+
+def _jobs(total: int, batch_size: int, *extra):
+    for start in range(0, total, batch_size):
+        yield (start, min(batch_size, total - start)) + extra
+
+def _bounded_map(executor: ProcessPoolExecutor, build, jobs, window: int):
+    """Like executor.map, in order, but with at most ``window`` batches submitted or unconsumed at once."""
+    pending = deque()
+    for job in jobs:
+        pending.append(executor.submit(build, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def generate(db_path: str, users: int, accounts_per_user: int = 2, audit_rows: int = 0,
+             admins: int = 1, password: str = DEFAULT_PASSWORD, bcrypt_rounds: int = 12,
+             sign_audit: bool = True, seed: int = 0, workers: int | None = None,
+             batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Create a database with synthetic users, accounts and audit rows.
+
+    IDs and usernames are derived from each user's index, so the file must not
+    already hold generated users (main() refuses an existing file without --force).
+
+    Args:
+        db_path: SQLite file to write
+        users: Number of users; user i is username_for(i)
+        accounts_per_user: Accounts created for every user
+        audit_rows: Number of signed auditLog rows
+        admins: The first ``admins`` users get RoleID 1, the rest RoleID 3
+        password: Password shared by all generated users
+        bcrypt_rounds: bcrypt cost for the shared password hash
+        sign_audit: Sign audit rows like the app does (RSA dominates the run time)
+        seed: Seed for balances and audit contents
+        workers: Worker processes (defaults to the CPU count)
+        batch_size: Users (or audit rows) per executemany batch
+
+    Returns:
+        dict: Row counts and elapsed seconds per table
+    """
+    workers = workers or os.cpu_count() or 1
+    password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt(bcrypt_rounds)).decode()
+    user_batch = max(1, batch_size // max(1, accounts_per_user))
+
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    migrate_schema(conn, indexes=False)
+    # Bulk load: no fsync per batch, indexes built once at the end
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA journal_mode=MEMORY")
+
+    plan = (
+        ("users", _user_rows, _jobs(users, batch_size, password_hash, admins),
+         "INSERT INTO User (usrID, usrName, email, password, RoleID, usrNameHash, emailHash) VALUES (?, ?, ?, ?, ?, ?, ?)"),
+        ("accounts", _account_rows, _jobs(users, user_batch, accounts_per_user, seed),
+         "INSERT INTO Account (accID, accValue, accType, usrID) VALUES (?, ?, ?, ?)"),
+        ("audit_rows", _audit_rows, _jobs(audit_rows, batch_size, seed, sign_audit),
+         "INSERT INTO auditLog (Operation, TableName, oldValue, newValue, ChangedAt, signature) VALUES (?, ?, ?, ?, ?, ?)"),
+    )
+
+    summary = {}
+    executor = ProcessPoolExecutor(workers, initializer=_init_worker) if workers > 1 else None
+    if executor is None:
+        _init_worker()
+    try:
+        for table, build, jobs, sql in plan:
+            started = time.perf_counter()
+            # Two batches per worker keeps every worker busy without holding the whole table in memory
+            batches = _bounded_map(executor, build, jobs, 2 * workers) if executor else map(build, jobs)
+            written = 0
+            for rows in batches:
+                with conn:
+                    conn.executemany(sql, rows)
+                written += len(rows)
+            summary[table] = written
+            summary[f"{table}_seconds"] = round(time.perf_counter() - started, 2)
+            logging.info("Generated %d %s in %.1fs", written, table, summary[f"{table}_seconds"])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    started = time.perf_counter()
+    migrate_schema(conn)
+    summary["index_seconds"] = round(time.perf_counter() - started, 2)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+    return summary
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic banking database")
+    parser.add_argument("db_path", help="SQLite database file to create")
+    parser.add_argument("--users", type=int, default=1000, help="Number of users")
+    parser.add_argument("--accounts-per-user", type=int, default=2, help="Accounts per user")
+    parser.add_argument("--audit-rows", type=int, default=0, help="Number of audit log rows")
+    parser.add_argument("--admins", type=int, default=1, help="Number of users created as admins")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="Password for every generated user")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="bcrypt cost of the shared password hash")
+    parser.add_argument("--no-sign", action="store_true", help="Leave audit rows unsigned (much faster)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for balances and audit rows")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per executemany batch")
+    parser.add_argument("--force", action="store_true", help="Replace the database if it exists")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.db_path):
+        if not args.force:
+            parser.error(f"{args.db_path} exists; pass --force to replace it")
+        os.remove(args.db_path)
+
+    started = time.perf_counter()
+    summary = generate(
+        args.db_path, args.users, args.accounts_per_user, args.audit_rows,
+        admins=args.admins, password=args.password, bcrypt_rounds=args.bcrypt_rounds,
+        sign_audit=not args.no_sign, seed=args.seed, workers=args.workers, batch_size=args.batch_size,
+    )
+    print(f"Generated {summary['users']} users, {summary['accounts']} accounts and "
+          f"{summary['audit_rows']} audit rows in {time.perf_counter() - started:.1f}s -> {args.db_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+generate_data_test.py
+Tests for the synthetic data generator.
+"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from database_handler import Database
+from encryption_utils import decrypt_string_with_file_key
+from generate_data import DEFAULT_PASSWORD, _bounded_map, generate, username_for, user_id_for
+from signature_utils import verify_signature
+
+class TestGenerateData(unittest.TestCase):
+    """Test cases for generated users, accounts and audit rows."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.db_name = os.path.join(cls.tmpdir.name, "generated.db")
+        cls.summary = generate(cls.db_name, users=12, accounts_per_user=3, audit_rows=4,
+                               bcrypt_rounds=4, workers=1, batch_size=5)
+        cls.db = Database(cls.db_name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.close_all_connections()
+        cls.tmpdir.cleanup()
+
+    def test_row_counts(self):
+        """
+        Test that every table gets the requested number of rows.
+        """
+        self.assertEqual((self.summary['users'], self.summary['accounts'], self.summary['audit_rows']), (12, 36, 4))
+
+    def test_users_work_with_the_app(self):
+        """
+        Test that generated users can be found by hash, log in and list their accounts.
+        """
+        user = self.db.get_user_encrypted_search(username_for(7))
+        self.assertEqual(str(user['usrID']), user_id_for(7))
+        self.assertTrue(bcrypt.checkpw(DEFAULT_PASSWORD.encode(), user['password'].encode()))
+        accounts = self.db.get_user_accounts(user_id_for(7))
+        self.assertEqual(sorted(a.type for a in accounts), ["Checking", "Investing", "Savings"])
+        self.assertEqual(self.db.deposit_to_account(accounts[0].accountNumber, 10.0), [])
+
+    def test_audit_rows_are_signed(self):
+        """
+        Test that audit values decrypt and signatures verify like the app's own rows.
+        """
+        with sqlite3.connect(self.db_name) as conn:
+            row = conn.execute(
+                "SELECT Operation, TableName, oldValue, newValue, ChangedAt, signature FROM auditLog ORDER BY ID LIMIT 1"
+            ).fetchone()
+        self.assertTrue(decrypt_string_with_file_key(row[2]).startswith("Balance: "))
+        self.assertTrue(verify_signature("|".join(row[:5]), bytes.fromhex(row[5])))
+
+    def test_bounded_map_limits_batches_in_flight(self):
+        """
+        Test that results come back in order with no more than the window of batches submitted ahead.
+        """
+        submitted = []
+
+        def jobs():
+            for job in range(10):
+                submitted.append(job)
+                yield job
+
+        with ThreadPoolExecutor(2) as executor:
+            results = []
+            for result in _bounded_map(executor, lambda job: job * 2, jobs(), window=3):
+                self.assertLessEqual(len(submitted) - len(results), 3)
+                results.append(result)
+        self.assertEqual(results, [job * 2 for job in range(10)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,377 @@
+"""
+load_harness.py
+Offline HTTP load harness that drives flask_main.app through the test client.
+
+Each worker thread logs in a customer and a staff user (the 2FA email is
+captured in memory instead of being sent), then runs a weighted mix of
+login, /home, transfer, deposit and withdraw requests. Latency percentiles
+and throughput are reported per route. At the end the harness checks that
+money was conserved: the sum of all balances must equal the starting sum
+plus successful deposits minus successful withdrawals.
+
+Usage:
+    python load_harness.py --users 500 --threads 8 --duration 30 --mix login=1,home=5,transfer=2,deposit=2,withdraw=2
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+DEFAULT_MIX = "login=1,home=5,transfer=2,deposit=2,withdraw=2"
+ACCOUNTS_PER_USER = 2
+
+class Recorder:
+    """Thread-safe collection of per-route latencies and money movements."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.deposited = 0.0
+        self.withdrawn = 0.0
+
+    def record(self, route: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+    def moved(self, deposited: float = 0.0, withdrawn: float = 0.0) -> None:
+        with self._lock:
+            self.deposited += deposited
+            self.withdrawn += withdrawn
+
+    def report(self, elapsed: float) -> dict:
+        """Per-route count, errors, throughput and latency percentiles (ms)."""
+        routes = {}
+        for route, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            routes[route] = {
+                'requests': len(samples),
+                'errors': self.errors[route],
+                'throughput_rps': len(samples) / elapsed if elapsed else 0.0,
+                'p50_ms': percentile(samples, 50) * 1000,
+                'p95_ms': percentile(samples, 95) * 1000,
+                'p99_ms': percentile(samples, 99) * 1000,
+                'max_ms': samples[-1] * 1000,
+            }
+        return routes
+
+def percentile(sorted_samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_samples))))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+def parse_mix(spec: str) -> dict[str, int]:
+    """Parse "login=1,home=5" into {'login': 1, 'home': 5}."""
+    mix = {}
+    for part in spec.split(","):
+        if part.strip():
+            name, _, weight = part.partition("=")
+            mix[name.strip()] = int(weight or 1)
+    unknown = set(mix) - set(Worker.OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+def total_balance(db_path: str) -> float:
+    """Sum of every account balance (decrypted)."""
+    from encryption_utils import decrypt_string_with_file_key
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT accValue FROM Account").fetchall()
+    return round(sum(float(decrypt_string_with_file_key(value)) for (value,) in rows), 2)
+
+class Worker(threading.Thread):
+    """One virtual user pair: a customer session and a staff (admin) session."""
+
+    OPERATIONS = ("login", "home", "transfer", "deposit", "withdraw")
+
+    def __init__(self, harness, index: int, customer: int, staff: int, seed: int):
+        super().__init__(name=f"load-{index}", daemon=True)
+        self.harness = harness
+        self.customer = customer
+        self.staff = staff
+        self.rng = random.Random(seed * 7919 + index)
+        self.customer_client = harness.app.test_client()
+        self.staff_client = harness.app.test_client()
+        self.error = None
+
+    def timed(self, route: str, call, ok_check=None):
+        started = time.perf_counter()
+        response = call()
+        elapsed = time.perf_counter() - started
+        ok = response.status_code < 400 and (ok_check is None or ok_check(response))
+        self.harness.recorder.record(route, elapsed, ok)
+        return response, ok
+
+    def login(self, client, user_index: int) -> bool:
+        from generate_data import username_for
+        username = username_for(user_index)
+        email = f"{username}@example.com"
+        # Codes are keyed by email, so two sessions of one user must not log in at once
+        with self.harness.login_lock(email):
+            _, ok = self.timed("POST /login", lambda: client.post(
+                "/login", data={'username': username, 'password': self.harness.password}),
+                lambda r: r.status_code == 302 and "/verify-2fa" in r.headers.get("Location", ""))
+            if not ok:
+                return False
+            code = self.harness.outbox.pop(email, None)
+            _, ok = self.timed("POST /verify-2fa", lambda: client.post("/verify-2fa", data={'code': code}),
+                               lambda r: r.status_code == 302)
+        return ok
+
+    def account(self, user_index: int, slot: int = 0) -> str:
+        from generate_data import account_id_for
+        return account_id_for(user_index, slot, ACCOUNTS_PER_USER)
+
+    def run(self) -> None:
+        try:
+            if not (self.login(self.customer_client, self.customer) and self.login(self.staff_client, self.staff)):
+                raise RuntimeError("initial login failed")
+            operations, weights = zip(*self.harness.mix.items())
+            while not self.harness.should_stop():
+                getattr(self, "op_" + self.rng.choices(operations, weights)[0])()
+        except Exception as e:
+            self.error = e
+            logging.error("Load worker %s stopped: %s", self.name, e)
+
+    def op_login(self) -> None:
+        self.customer_client.get("/logout")
+        self.login(self.customer_client, self.customer)
+
+    def op_home(self) -> None:
+        self.timed("GET /home", lambda: self.customer_client.get("/home"))
+
+    def op_transfer(self) -> None:
+        other = self.rng.randrange(self.harness.users)
+        self.timed("POST /transfer", lambda: self.customer_client.post("/transfer", data={
+            'fromAccountId': self.account(self.customer, 0),
+            'toAccountId': self.account(other, 1),
+            'transferAmount': "1.00",
+        }))
+
+    def op_deposit(self) -> None:
+        amount = round(self.rng.uniform(1, 100), 2)
+        _, ok = self.timed("POST /deposit", lambda: self.staff_client.post("/deposit", data={
+            'accountId': self.account(self.rng.randrange(self.harness.users)),
+            'depositAmount': f"{amount:.2f}",
+        }), lambda r: b"Deposit successful!" in r.data)
+        if ok:
+            self.harness.recorder.moved(deposited=amount)
+
+    def op_withdraw(self) -> None:
+        amount = round(self.rng.uniform(1, 50), 2)
+        _, ok = self.timed("POST /withdraw", lambda: self.staff_client.post("/withdraw", data={
+            'accountId': self.account(self.rng.randrange(self.harness.users)),
+            'withdrawAmount': f"{amount:.2f}",
+        }), lambda r: b"Withdrawal successful!" in r.data)
+        if ok:
+            self.harness.recorder.moved(withdrawn=amount)
+
+class InProcessApp:
+    """
+    flask_main.app pointed at another database, with 2FA delivery captured.
+
+    Attributes:
+        app: The Flask application
+        database (Database): Database the app now uses
+        outbox (dict): Latest 2FA code by email address
+        last_code (threading.local): Latest 2FA code sent on the calling thread
+    """
+
+    def __init__(self, db_path: str):
+        import flask_main
+        import user_management
+        from database_handler import Database
+        from password_hashing import PasswordHasher, cost_of
+
+        self.app = flask_main.app
+        self.database = Database(db_path)
+        self.outbox = {}
+        self.last_code = threading.local()
+        self._originals = (flask_main.db_manager, user_management.db_manager,
+                           user_management.UserManager._send_verification_email, user_management.password_hasher)
+        flask_main.db_manager = self.database
+        user_management.db_manager = self.database
+
+        # Generated users are hashed at a cheap cost; keep that cost so logins
+        # during a run don't trigger background rehashing
+        row = self.database.get_connection().execute("SELECT password FROM User LIMIT 1").fetchone()
+        current = user_management.password_hasher
+        rounds = (cost_of(row[0]) if row else None) or current.rounds
+        user_management.password_hasher = PasswordHasher(rounds, current.workers, current.max_queue)
+
+        outbox, last_code = self.outbox, self.last_code
+
+        def capture_code(manager, email, code):
+            outbox[email] = code
+            last_code.value = code
+
+        user_management.UserManager._send_verification_email = capture_code
+
+    def close(self) -> None:
+        """Point the app back at its own database and email delivery."""
+        import flask_main
+        import user_management
+        hasher = user_management.password_hasher
+        (flask_main.db_manager, user_management.db_manager,
+         user_management.UserManager._send_verification_email, user_management.password_hasher) = self._originals
+        hasher.shutdown()
+        self.database.close_all_connections()
+
+class LoadHarness:
+    """
+    Runs workers against flask_main.app backed by a generated database.
+
+    Attributes:
+        db_path (str): Database the app is pointed at
+        users (int): Number of generated users (the first ``staff`` are admins)
+        outbox (dict): Captured 2FA codes by email address
+    """
+
+    def __init__(self, db_path: str, users: int, staff: int, password: str, mix: dict[str, int]):
+        self.db_path = db_path
+        self.users = users
+        self.staff = staff
+        self.password = password
+        self.mix = mix
+        self.recorder = Recorder()
+        self._deadline = None
+        self._remaining = None
+        self._count_lock = threading.Lock()
+        self._login_locks = defaultdict(threading.Lock)
+
+        self.target = InProcessApp(db_path)
+        self.app = self.target.app
+        self.outbox = self.target.outbox
+
+    def close(self) -> None:
+        self.target.close()
+
+    def login_lock(self, email: str) -> threading.Lock:
+        with self._count_lock:
+            return self._login_locks[email]
+
+    def should_stop(self) -> bool:
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            return True
+        if self._remaining is not None:
+            with self._count_lock:
+                self._remaining -= 1
+                return self._remaining < 0
+        return False
+
+    def run(self, threads: int, duration: float | None = None, requests: int | None = None,
+            seed: int = 0) -> dict:
+        """
+        Run the workload and check money conservation.
+
+        Args:
+            threads: Number of worker threads
+            duration: Seconds to run (ignored if ``requests`` is given)
+            requests: Total number of operations across all workers
+            seed: Seed for the operation mix and amounts
+
+        Returns:
+            dict: Per-route report, totals and the conservation result
+        """
+        customers = max(1, self.users - self.staff)
+        self._remaining = requests
+        self._deadline = None if requests is not None else time.monotonic() + (duration or 10)
+
+        initial = total_balance(self.db_path)
+        workers = [
+            Worker(self, i, customer=self.staff + i % customers, staff=i % self.staff, seed=seed)
+            for i in range(threads)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        final = total_balance(self.db_path)
+        expected = round(initial + self.recorder.deposited - self.recorder.withdrawn, 2)
+        routes = self.recorder.report(elapsed)
+        return {
+            'threads': threads,
+            'elapsed_s': elapsed,
+            'requests': sum(route['requests'] for route in routes.values()),
+            'throughput_rps': sum(route['requests'] for route in routes.values()) / elapsed if elapsed else 0.0,
+            'routes': routes,
+            'worker_errors': [str(w.error) for w in workers if w.error],
+            'conservation': {
+                'initial': initial,
+                'deposited': round(self.recorder.deposited, 2),
+                'withdrawn': round(self.recorder.withdrawn, 2),
+                'expected': expected,
+                'final': final,
+                'ok': abs(final - expected) < 0.01,
+            },
+        }
+
+def print_report(report: dict) -> None:
+    print(f"{'route':20} {'reqs':>7} {'errs':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for route, stats in report['routes'].items():
+        print(f"{route:20} {stats['requests']:7d} {stats['errors']:5d} {stats['throughput_rps']:8.1f} "
+              f"{stats['p50_ms']:8.1f}ms {stats['p95_ms']:8.1f}ms {stats['p99_ms']:8.1f}ms")
+    print(f"total: {report['requests']} requests in {report['elapsed_s']:.1f}s "
+          f"({report['throughput_rps']:.1f} req/s) on {report['threads']} threads")
+    money = report['conservation']
+    print(f"money: initial {money['initial']:.2f} + deposits {money['deposited']:.2f} - withdrawals "
+          f"{money['withdrawn']:.2f} = {money['expected']:.2f}; final {money['final']:.2f} -> "
+          f"{'OK' if money['ok'] else 'MISMATCH'}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="In-process load test for the banking app")
+    parser.add_argument("--db", help="Existing database from generate_data.py (default: generate a temporary one)")
+    parser.add_argument("--users", type=int, default=200, help="Users to generate (or present in --db)")
+    parser.add_argument("--staff", type=int, help="Leading users with the admin role (default: one per thread)")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="bcrypt cost for generated users")
+    parser.add_argument("--threads", type=int, default=8, help="Worker threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--requests", type=int, help="Stop after this many operations instead of --duration")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted operation mix")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--log-level", default="WARNING", help="Application log level during the run")
+    args = parser.parse_args(argv)
+    args.staff = args.staff or args.threads
+
+    from generate_data import DEFAULT_PASSWORD, generate
+
+    tmpdir = None
+    db_path = args.db
+    if db_path is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmpdir.name, "load.db")
+        generate(db_path, users=args.users, accounts_per_user=ACCOUNTS_PER_USER, admins=args.staff,
+                 bcrypt_rounds=args.bcrypt_rounds, sign_audit=False, seed=args.seed)
+
+    harness = LoadHarness(db_path, args.users, args.staff, DEFAULT_PASSWORD, parse_mix(args.mix))
+    logging.getLogger().setLevel(args.log_level.upper())
+    try:
+        report = harness.run(args.threads, duration=args.duration, requests=args.requests, seed=args.seed)
+    finally:
+        harness.close()
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if tmpdir is not None:
+        tmpdir.cleanup()
+    return 0 if report['conservation']['ok'] and not report['worker_errors'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""
+load_harness_test.py
+Short run of the in-process load harness against a generated database.
+"""
+
+import os
+import tempfile
+import unittest
+from generate_data import DEFAULT_PASSWORD, generate
+from load_harness import LoadHarness, parse_mix, percentile
+
+class TestLoadHarness(unittest.TestCase):
+    """Test cases for the load harness report and money conservation check."""
+
+    def test_percentile_and_mix(self):
+        """
+        Test nearest-rank percentiles and mix parsing.
+        """
+        samples = [i / 100 for i in range(1, 101)]
+        self.assertEqual(percentile(samples, 50), 0.5)
+        self.assertEqual(percentile(samples, 99), 0.99)
+        self.assertEqual(parse_mix("home=3,transfer"), {'home': 3, 'transfer': 1})
+        with self.assertRaises(ValueError):
+            parse_mix("home=1,teleport=2")
+
+    def test_short_run_conserves_money(self):
+        """
+        Test that a mixed workload logs in through stubbed 2FA and conserves money.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, "load.db")
+            generate(db_path, users=10, accounts_per_user=2, admins=2, bcrypt_rounds=4, sign_audit=False, workers=1)
+            harness = LoadHarness(db_path, users=10, staff=2, password=DEFAULT_PASSWORD,
+                                  mix=parse_mix("home=1,transfer=1,deposit=1,withdraw=1"))
+            try:
+                report = harness.run(threads=2, requests=12)
+            finally:
+                harness.close()
+
+        self.assertEqual(report['worker_errors'], [])
+        self.assertTrue(report['conservation']['ok'], report['conservation'])
+        self.assertEqual(report['routes']['POST /login']['errors'], 0)
+        self.assertEqual(report['routes']['POST /verify-2fa']['errors'], 0)
+        self.assertEqual(sum(stats['requests'] for route, stats in report['routes'].items()
+                             if route not in ("POST /login", "POST /verify-2fa")), 12)
+
+if __name__ == '__main__':
+    unittest.main()
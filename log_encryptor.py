@@ -6,6 +6,7 @@ import hashlib
 from cryptography.fernet import Fernet
 
 KEY_FILE = "encryption_key.key"
+CHUNK_SIZE = 1024 * 1024  # Plaintext bytes per Fernet token
 
 def derive_key(password):
     """Generate a Fernet-compatible key from a user password."""
@@ -29,24 +30,32 @@ def load_or_generate_key(password):
         return key
 
 def encrypt_log(log_file, password):
-    """Encrypt the log file using a password-derived key."""
+    """
+    Encrypt the log file using a password-derived key.
+
+    The output is one Fernet token per CHUNK_SIZE bytes of plaintext, separated
+    by newlines, so readers can decrypt it incrementally.
+    """
     key = load_or_generate_key(password)
     cipher = Fernet(key)
-    with open(log_file, "rb") as file:
-        encrypted_data = cipher.encrypt(file.read())
-    with open(log_file + ".enc", "wb") as enc_file:
-        enc_file.write(encrypted_data)
+    with open(log_file, "rb") as file, open(log_file + ".enc", "wb") as enc_file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            enc_file.write(cipher.encrypt(chunk) + b"\n")
     print(f"Log file encrypted: {log_file}.enc")
 
 def decrypt_log(encrypted_log_file, password):
-    """Decrypt the log file using a password-derived key."""
+    """Decrypt the log file using a password-derived key, one token at a time."""
     key = load_or_generate_key(password)
     cipher = Fernet(key)
-    with open(encrypted_log_file, "rb") as enc_file:
-        decrypted_data = cipher.decrypt(enc_file.read())
     decrypted_filename = encrypted_log_file.replace(".enc", "_decrypted.log")
-    with open(decrypted_filename, "wb") as dec_file:
-        dec_file.write(decrypted_data)
+    with open(encrypted_log_file, "rb") as enc_file, open(decrypted_filename, "wb") as dec_file:
+        for token in enc_file:
+            token = token.strip()
+            if token:
+                dec_file.write(cipher.decrypt(token))
 
     print(f"Log file decrypted: {decrypted_filename}")
 
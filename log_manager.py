@@ -1,8 +1,28 @@
+"""
+log_manager.py
+Configures application logging as a non-blocking pipeline.
+
+Request threads only push records onto a bounded in-memory queue through a
+QueueHandler; a single QueueListener thread does the file and stream I/O.
+When the queue is full the record is dropped and counted instead of blocking
+the request. Hot DEBUG lines can be sampled per logger.
+
+Encrypting the log file at exit is not registered on import, because
+log_encryptor asks for a password and would block every test run and tool
+that logs. Server entry points opt in with enable_encrypt_on_exit();
+``python flask_main.py`` does.
+"""
+
+import atexit
+import json
 import logging
+import logging.handlers
 import os
-import atexit
+import queue
+import random
 import subprocess
 import sys
+import threading
 
 # Ensure logs directory exists
 LOG_DIR = "logs"
@@ -10,27 +30,202 @@ os.makedirs(LOG_DIR, exist_ok=True)
 
 # Configure logging
 LOG_FILE = os.path.join(LOG_DIR, "banking_system.log")
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Fraction of DEBUG records kept per logger name (prefix match), e.g. the
+# per-call account dump in database_handler.get_user_accounts.
+DEFAULT_SAMPLE_RATES = {
+    "database_handler": 0.01,
+}
 
 # Ensure log file exists (prevents errors)
 if not os.path.exists(LOG_FILE):
     open(LOG_FILE, "w").close()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE, mode='a', encoding='utf-8'),
-        logging.StreamHandler()
-    ],
-    force=True  # Ensures old handlers don’t interfere
-)
-# Get logger instance
-logger = logging.getLogger()
+_listener = None
+_queue_handler = None
+_encrypt_registered = False
+_lock = threading.Lock()
+
+# Attributes every LogRecord has; anything else was passed through ``extra=``
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single-line JSON object."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            # Same local-time format as the text log so log_search can compare both
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of low-level records for selected loggers.
+
+    Attributes:
+        rates (dict): Logger name prefix -> fraction of records kept (0.0-1.0)
+        max_level (int): Records above this level are never sampled out
+    """
+
+    def __init__(self, rates: dict | None = None, max_level: int = logging.DEBUG):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self.max_level = max_level
+        self._cache: dict[str, float] = {}
+
+    def _rate_for(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            best = -1
+            for prefix, value in self.rates.items():
+                if (name == prefix or name.startswith(prefix + ".")) and len(prefix) > best:
+                    rate, best = value, len(prefix)
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+        rate = self._rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records are dropped when the queue is full.
+
+    Attributes:
+        dropped (int): Number of records discarded because the queue was full
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Resolve the message on the calling thread but defer all formatting."""
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks reference live frames, so render them before handing off
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _build_formatter(structured: bool) -> logging.Formatter:
+    return JsonFormatter() if structured else logging.Formatter(LOG_FORMAT)
+
+
+def setup_logging(level: int | str | None = None, structured: bool | None = None,
+                  sample_rates: dict | None = None, queue_size: int = QUEUE_SIZE) -> BoundedQueueHandler:
+    """
+    Install the queue-based pipeline on the root logger.
+
+    Args:
+        level: Root log level (defaults to LOG_LEVEL env var or INFO)
+        structured: Write JSON records instead of the plain text format
+            (defaults to LOG_FORMAT=json env var)
+        sample_rates: Per-logger sampling rates for DEBUG records
+        queue_size: Maximum number of records buffered before dropping
+
+    Returns:
+        BoundedQueueHandler: The handler attached to the root logger.
+    """
+    global _listener, _queue_handler
+
+    if level is None:
+        level = os.getenv("LOG_LEVEL", "INFO").upper()
+    if structured is None:
+        structured = os.getenv("LOG_FORMAT", "").lower() == "json"
+    if sample_rates is None:
+        sample_rates = DEFAULT_SAMPLE_RATES
+
+    with _lock:
+        stop_logging()
+
+        formatter = _build_formatter(structured)
+        file_handler = logging.FileHandler(LOG_FILE, mode='a', encoding='utf-8')
+        file_handler.setFormatter(formatter)
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        _queue_handler = BoundedQueueHandler(queue.Queue(maxsize=queue_size))
+        _queue_handler.addFilter(SamplingFilter(sample_rates))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(
+            _queue_handler.queue, file_handler, stream_handler, respect_handler_level=True
+        )
+        _listener.start()
+
+    return _queue_handler
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def get_logging_stats() -> dict:
+    """Return queue depth and drop counter for the status page."""
+    if _queue_handler is None:
+        return {'queued': 0, 'dropped': 0, 'capacity': 0}
+    return {
+        'queued': _queue_handler.queue.qsize(),
+        'dropped': _queue_handler.dropped,
+        'capacity': _queue_handler.queue.maxsize,
+    }
+
 
 def encrypt_log_on_exit():
     """Function to encrypt log file on exit."""
+    stop_logging()
     print("Encrypting log file before exiting application...")
     subprocess.run([sys.executable, "log_encryptor.py", "encrypt", LOG_FILE])
 
-# Run when Flask exits
-atexit.register(encrypt_log_on_exit)
\ No newline at end of file
+
+def enable_encrypt_on_exit() -> None:
+    """Encrypt the log file when the application exits (registered once however often it is called)."""
+    global _encrypt_registered
+    if not _encrypt_registered:
+        atexit.register(encrypt_log_on_exit)
+        _encrypt_registered = True
+
+
+# Get logger instance
+setup_logging()
+logger = logging.getLogger()
+
+# Drain the queue on interpreter shutdown
+atexit.register(stop_logging)
@@ -0,0 +1,74 @@
+"""
+log_manager_test.py
+This module contains unit tests for the queue-based logging pipeline.
+"""
+
+import json
+import logging
+import queue
+import unittest
+from unittest.mock import patch
+import log_manager
+from log_manager import BoundedQueueHandler, JsonFormatter, SamplingFilter
+
+class TestLogManager(unittest.TestCase):
+    """
+    Test cases for the logging pipeline components.
+    Tests include queue overflow, sampling and JSON formatting.
+    """
+
+    def make_record(self, name="test", level=logging.INFO, msg="hello %s", args=("world",)):
+        return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """
+        Test that records beyond the queue capacity are counted as dropped.
+        """
+        handler = BoundedQueueHandler(queue.Queue(maxsize=2))
+        for _ in range(5):
+            handler.emit(self.make_record())
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_message_resolved_before_enqueue(self):
+        """
+        Test that queued records carry the merged message and no args.
+        """
+        handler = BoundedQueueHandler(queue.Queue())
+        handler.emit(self.make_record())
+        record = handler.queue.get_nowait()
+        self.assertEqual(record.msg, "hello world")
+        self.assertIsNone(record.args)
+
+    def test_sampling_only_applies_to_debug(self):
+        """
+        Test that sampled loggers drop DEBUG records but keep higher levels.
+        """
+        sampler = SamplingFilter({"database_handler": 0.0})
+        self.assertFalse(sampler.filter(self.make_record("database_handler", logging.DEBUG)))
+        self.assertTrue(sampler.filter(self.make_record("database_handler", logging.WARNING)))
+        self.assertTrue(sampler.filter(self.make_record("flask_main", logging.DEBUG)))
+
+    def test_json_formatter_includes_extras(self):
+        """
+        Test that the JSON formatter emits one object with extra fields.
+        """
+        record = self.make_record()
+        record.route = "/home"
+        payload = json.loads(JsonFormatter().format(record))
+        self.assertEqual(payload["msg"], "hello world")
+        self.assertEqual(payload["level"], "INFO")
+        self.assertEqual(payload["route"], "/home")
+
+    def test_encrypt_on_exit_registers_once(self):
+        """
+        Test that the exit-time log encryption is registered a single time however often it is enabled.
+        """
+        with patch.object(log_manager, "_encrypt_registered", False), \
+                patch.object(log_manager.atexit, "register") as register:
+            log_manager.enable_encrypt_on_exit()
+            log_manager.enable_encrypt_on_exit()
+        register.assert_called_once_with(log_manager.encrypt_log_on_exit)
+
+if __name__ == '__main__':
+    unittest.main()
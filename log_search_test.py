@@ -0,0 +1,210 @@
+"""
+log_search_test.py
+This module contains unit tests for the streaming log search.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from cryptography.fernet import Fernet
+from logs import log_search
+
+SAMPLE_LOG = (
+    "2025-03-07 16:41:59,999 - INFO - Server started\n"
+    "2025-03-07 16:42:00,000 - WARNING - User not found\n"
+    "Traceback line that is not a record\n"
+    "2025-03-07 16:45:10,120 - ERROR - Deposit failed: ['Account not found']\n"
+    "2025-03-07 16:50:00,001 - WARNING - user not found again\n"
+)
+
+class TestLogSearch(unittest.TestCase):
+    """
+    Test cases for log_search.
+    Tests include filters, date bounds and encrypted chunked input.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmpdir.name, "banking_system.log")
+        with open(self.log_file, "w", encoding="utf-8") as f:
+            f.write(SAMPLE_LOG)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_keyword_is_case_insensitive(self):
+        results = log_search.search_logs(self.log_file, "User not found", "NONE", "NONE", "NONE")
+        self.assertEqual(len(results), 2)
+
+    def test_level_filter(self):
+        results = log_search.search_logs(self.log_file, "NONE", "ERROR", "NONE", "NONE")
+        self.assertEqual(results, ["2025-03-07 16:45:10,120 - ERROR - Deposit failed: ['Account not found']"])
+
+    def test_date_bounds_are_inclusive_to_the_second(self):
+        results = log_search.search_logs(self.log_file, None, None, "2025-03-07 16:42:00", "2025-03-07 16:50:00")
+        self.assertEqual([r[:23] for r in results], ["2025-03-07 16:42:00,000", "2025-03-07 16:45:10,120"])
+
+    def test_stats_count_scanned_lines(self):
+        stats = log_search.SearchStats()
+        log_search.search_logs(self.log_file, "NONE", "WARNING", stats=stats)
+        self.assertEqual(stats.scanned, 5)
+        self.assertEqual(stats.matched, 2)
+
+    def test_json_records_are_searchable(self):
+        query = log_search.LogQuery("login", "INFO")
+        line = '{"ts": "2025-03-07 16:42:00,000", "level": "INFO", "logger": "root", "msg": "login ok"}'
+        self.assertIsNotNone(query.matches(line))
+
+    def test_chunked_encrypted_log_matches_plaintext(self):
+        """
+        Test that tokens split mid-line decrypt into the same lines as the plain file.
+        """
+        key = Fernet.generate_key()
+        cipher = Fernet(key)
+        key_file = os.path.join(self.tmpdir.name, "key.key")
+        with open(key_file, "wb") as f:
+            f.write(key)
+        data = SAMPLE_LOG.encode()
+        with open(self.log_file + ".enc", "wb") as f:
+            for i in range(0, len(data), 37):
+                f.write(cipher.encrypt(data[i:i + 37]) + b"\n")
+
+        with patch.object(log_search, "KEY_FILE", key_file):
+            encrypted = log_search.search_logs(self.log_file + ".enc", "not found")
+        self.assertEqual(encrypted, log_search.search_logs(self.log_file, "not found"))
+
+    def test_indexed_mode_matches_scan_mode(self):
+        """
+        Test that indexed searches return exactly the scan results.
+        """
+        index_path = os.path.join(self.tmpdir.name, "index.db")
+        cases = [
+            ("not found", "NONE", "NONE", "NONE"),
+            ("NONE", "WARNING", "NONE", "NONE"),
+            ("ot", "NONE", "NONE", "NONE"),
+            ("NONE", "NONE", "2025-03-07 16:42:00", "2025-03-07 16:50:00"),
+        ]
+        for args in cases:
+            scanned = log_search.search_logs(self.log_file, *args)
+            indexed = log_search.search_logs(self.log_file, *args, indexed=True, index_path=index_path)
+            self.assertEqual(indexed, scanned, args)
+
+    def test_index_only_ingests_new_lines(self):
+        """
+        Test that re-indexing picks up appended lines and ignores partial ones.
+        """
+        index = log_search.LogIndex(os.path.join(self.tmpdir.name, "index.db"))
+        try:
+            self.assertEqual(index.ingest(self.log_file), 4)
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write("2025-03-07 17:00:00,000 - INFO - appended\n2025-03-07 17:00:01,000 - INFO - partial")
+            self.assertEqual(index.ingest(self.log_file), 1)
+            self.assertEqual(index.ingest(self.log_file), 0)
+            self.assertEqual(index.histogram()[-1], ("2025-03-07 17", 1))
+        finally:
+            index.close()
+
+    def test_parallel_search_merges_segments_by_time(self):
+        """
+        Test that matches from several segments come back in timestamp order.
+        """
+        segments = []
+        for i in range(3):
+            path = os.path.join(self.tmpdir.name, f"banking_system.log.{i}")
+            with open(path, "w", encoding="utf-8") as f:
+                for minute in range(i, 9, 3):
+                    f.write(f"2025-03-07 16:4{minute}:00,000 - INFO - segment {i}\n")
+            segments.append(path)
+
+        paths = log_search.expand_log_paths(os.path.join(self.tmpdir.name, "banking_system.log.*"))
+        self.assertEqual(paths, segments)
+        stats = log_search.SearchStats()
+        results = list(log_search.search_log_files(paths, "segment", workers=2, stats=stats))
+        self.assertEqual([line[:19] for _, line in results],
+                         [f"2025-03-07 16:4{minute}:00" for minute in range(9)])
+        self.assertEqual(results[0], (segments[0], "2025-03-07 16:40:00,000 - INFO - segment 0"))
+        self.assertEqual(stats.scanned, 9)
+
+    def test_follow_streams_new_lines_across_rotation(self):
+        """
+        Test that follow mode skips existing lines, filters new ones and survives rotation.
+        """
+        query = log_search.LogQuery("NONE", "WARNING")
+        stop = threading.Event()
+        seen = []
+
+        def collect():
+            for line in log_search.follow_log(self.log_file, query, poll_interval=0.01, stop_event=stop):
+                seen.append(line)
+
+        def wait_for(count):
+            for _ in range(500):
+                if len(seen) >= count:
+                    return
+                stop.wait(0.01)
+
+        worker = threading.Thread(target=collect)
+        worker.start()
+        try:
+            stop.wait(0.1)
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write("2025-03-07 17:00:00,000 - WARNING - first\n")
+                f.write("2025-03-07 17:00:01,000 - INFO - skipped\n")
+            wait_for(1)
+            os.rename(self.log_file, self.log_file + ".1")
+            with open(self.log_file, "w", encoding="utf-8") as f:
+                f.write("2025-03-07 17:00:02,000 - WARNING - after rotation\n")
+            wait_for(2)
+        finally:
+            stop.set()
+            worker.join()
+        self.assertEqual(seen, [
+            "2025-03-07 17:00:00,000 - WARNING - first",
+            "2025-03-07 17:00:02,000 - WARNING - after rotation",
+        ])
+
+    def test_follow_keeps_partial_lines_and_reads_new_files_whole(self):
+        """
+        Test that a file created after following starts is read from its first line and an
+        unterminated last line is still streamed when the file is rotated.
+        """
+        os.remove(self.log_file)
+        query = log_search.LogQuery("NONE", "WARNING")
+        stop = threading.Event()
+        seen = []
+
+        def collect():
+            for line in log_search.follow_log(self.log_file, query, poll_interval=0.01, stop_event=stop):
+                seen.append(line)
+
+        def wait_for(count):
+            for _ in range(500):
+                if len(seen) >= count:
+                    return
+                stop.wait(0.01)
+
+        worker = threading.Thread(target=collect)
+        worker.start()
+        try:
+            stop.wait(0.05)
+            with open(self.log_file, "w", encoding="utf-8") as f:
+                f.write("2025-03-07 17:00:00,000 - WARNING - first line of a new file\n")
+                f.write("2025-03-07 17:00:01,000 - WARNING - cut off")
+            wait_for(1)
+            os.rename(self.log_file, self.log_file + ".1")
+            with open(self.log_file, "w", encoding="utf-8") as f:
+                f.write("2025-03-07 17:00:02,000 - WARNING - after rotation\n")
+            wait_for(3)
+        finally:
+            stop.set()
+            worker.join()
+        self.assertEqual(seen, [
+            "2025-03-07 17:00:00,000 - WARNING - first line of a new file",
+            "2025-03-07 17:00:01,000 - WARNING - cut off",
+            "2025-03-07 17:00:02,000 - WARNING - after rotation",
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
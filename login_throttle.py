@@ -0,0 +1,236 @@
+"""
+login_throttle.py
+Sliding-window throttling of failed logins by username and by client IP.
+
+Each key keeps a sliding window counter: the failure counts of the current
+and previous fixed windows, with the previous one weighted by how much of it
+still overlaps the sliding window. That is three numbers per key, so memory
+is bounded by the number of keys, which is capped with LRU eviction
+(MemoryLoginThrottle) or by pruning stale and oldest rows
+(SqliteLoginThrottle, shared by every process using the same file).
+
+flask_main calls check() before any database or bcrypt work, so a blocked
+username or IP costs one dict or index lookup. The IP limit only applies when
+TRUSTED_PROXIES says where the client address comes from (0 for direct
+connections, N for N reverse proxies, via ProxyFix); otherwise flask_main
+passes ip=None and throttles by username alone.
+
+Pick a backend with LOGIN_THROTTLE=memory (default) or sqlite:path/to/file.db.
+"""
+
+import abc
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+USERNAME_LIMIT = 5      # failures per username per window
+IP_LIMIT = 20           # failures per client IP per window
+WINDOW_SECONDS = 300.0
+MAX_KEYS = 10000
+
+def username_key(username: str) -> str:
+    # Usernames are hashed so the throttle table never holds them in plain text
+    return "u:" + hashlib.sha256((username or "").lower().encode()).hexdigest()[:24]
+
+def ip_key(ip: str | None) -> str:
+    return "ip:" + (ip or "unknown")
+
+def advance(state: tuple[int, int, int], now: float, window: float) -> tuple[int, int, int]:
+    """Move a (window index, current, previous) state forward to the window containing ``now``."""
+    index = int(now // window)
+    start, current, previous = state
+    if index == start:
+        return state
+    if index == start + 1:
+        return index, 0, current
+    return index, 0, 0
+
+def estimate(state: tuple[int, int, int], now: float, window: float) -> float:
+    """Failures in the sliding window ending at ``now``."""
+    _, current, previous = advance(state, now, window)
+    overlap = 1.0 - (now % window) / window
+    return current + previous * overlap
+
+def retry_after(state: tuple[int, int, int], now: float, window: float, limit: int) -> float:
+    """Seconds until the estimate drops below ``limit`` (0 if it already is)."""
+    _, current, previous = advance(state, now, window)
+    offset = now % window
+    if current + previous * (1.0 - offset / window) < limit:
+        return 0.0
+    if current < limit:
+        # Wait until the previous window's weight has shrunk enough: current + previous * (1 - f) < limit
+        return (1.0 - (limit - current) / previous) * window - offset
+    # The current window becomes the previous one: current * (1 - f) < limit in the next window
+    return window - offset + (1.0 - limit / current) * window
+
+class LoginThrottle(abc.ABC):
+    """
+    Common limit logic; subclasses store the per-key states.
+
+    Attributes:
+        username_limit (int): Failures allowed per username per window
+        ip_limit (int): Failures allowed per client IP per window
+        window (float): Sliding window length in seconds
+        max_keys (int): Keys kept before the least recently used are dropped
+    """
+
+    def __init__(self, username_limit: int = USERNAME_LIMIT, ip_limit: int = IP_LIMIT,
+                 window: float = WINDOW_SECONDS, max_keys: int = MAX_KEYS):
+        self.username_limit = username_limit
+        self.ip_limit = ip_limit
+        self.window = window
+        self.max_keys = max_keys
+
+    @abc.abstractmethod
+    def _get(self, keys: list[str]) -> dict:
+        """States of the given keys that exist."""
+
+    @abc.abstractmethod
+    def _add(self, keys: list[str], now: float) -> dict:
+        """Count one failure for each key and return their new states."""
+
+    @abc.abstractmethod
+    def _delete(self, key: str) -> None:
+        """Forget a key's failures."""
+
+    def _limits(self, username: str, ip: str | None) -> dict:
+        limits = {username_key(username): self.username_limit}
+        if ip is not None:
+            limits[ip_key(ip)] = self.ip_limit
+        return limits
+
+    def check(self, username: str, ip: str | None, now: float | None = None) -> float:
+        """
+        Seconds the caller must wait before trying this username/IP again (0 = allowed).
+        Pass ``ip=None`` to throttle by username only.
+        """
+        now = time.time() if now is None else now
+        limits = self._limits(username, ip)
+        states = self._get(list(limits))
+        return max((retry_after(states[key], now, self.window, limit)
+                    for key, limit in limits.items() if key in states), default=0.0)
+
+    def record_failure(self, username: str, ip: str | None, now: float | None = None) -> int:
+        """Count one failed login; returns the username's failures in the current window."""
+        now = time.time() if now is None else now
+        key = username_key(username)
+        states = self._add(list(self._limits(username, ip)), now)
+        return math.ceil(estimate(states[key], now, self.window))
+
+    def reset(self, username: str) -> None:
+        """Forget a username's failures after a successful login (the IP's count stays)."""
+        self._delete(username_key(username))
+
+class MemoryLoginThrottle(LoginThrottle):
+    """Per-process throttle in an LRU-ordered dict."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def _get(self, keys: list[str]) -> dict:
+        with self._lock:
+            return {key: self._states[key] for key in keys if key in self._states}
+
+    def _add(self, keys: list[str], now: float) -> dict:
+        with self._lock:
+            for key in keys:
+                index, current, previous = advance(self._states.get(key, (int(now // self.window), 0, 0)),
+                                                   now, self.window)
+                self._states[key] = (index, current + 1, previous)
+                self._states.move_to_end(key)
+            while len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+            return {key: self._states[key] for key in keys}
+
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            self._states.pop(key, None)
+
+class SqliteLoginThrottle(LoginThrottle):
+    """Throttle state in a SQLite table shared between worker processes."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS loginThrottle (
+        key TEXT PRIMARY KEY,
+        windowIndex INTEGER NOT NULL,
+        current INTEGER NOT NULL,
+        previous INTEGER NOT NULL,
+        updatedAt REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_loginThrottle_updated ON loginThrottle (updatedAt);
+    """
+    # Prune on roughly one write in PRUNE_EVERY
+    PRUNE_EVERY = 100
+
+    def __init__(self, db_path: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.db_path = db_path
+        self.local = threading.local()
+        self._writes = 0
+        self.connection().executescript(self.SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self.connection().execute("SELECT COUNT(*) FROM loginThrottle").fetchone()[0]
+
+    def _get(self, keys: list[str]) -> dict:
+        rows = self.connection().execute(
+            f"SELECT key, windowIndex, current, previous FROM loginThrottle WHERE key IN ({','.join('?' * len(keys))})",
+            keys
+        ).fetchall()
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+    def _add(self, keys: list[str], now: float) -> dict:
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            states = self._get(keys)
+            for key in keys:
+                index, current, previous = advance(states.get(key, (int(now // self.window), 0, 0)), now, self.window)
+                states[key] = (index, current + 1, previous)
+                conn.execute(
+                    "INSERT OR REPLACE INTO loginThrottle (key, windowIndex, current, previous, updatedAt) "
+                    "VALUES (?, ?, ?, ?, ?)", (key, *states[key], now)
+                )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return states
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        # Keys idle for two windows count zero; beyond max_keys drop the least recently updated
+        conn.execute("DELETE FROM loginThrottle WHERE updatedAt < ?", (now - 2 * self.window,))
+        conn.execute(
+            "DELETE FROM loginThrottle WHERE key IN (SELECT key FROM loginThrottle "
+            "ORDER BY updatedAt DESC LIMIT -1 OFFSET ?)", (self.max_keys,)
+        )
+
+    def _delete(self, key: str) -> None:
+        self.connection().execute("DELETE FROM loginThrottle WHERE key = ?", (key,))
+
+def make_login_throttle(spec: str = "memory", **kwargs) -> LoginThrottle:
+    """Build a throttle from "memory" or "sqlite:path"; ``kwargs`` override the limits."""
+    if spec == "memory":
+        return MemoryLoginThrottle(**kwargs)
+    if spec.startswith("sqlite:"):
+        return SqliteLoginThrottle(spec[len("sqlite:"):], **kwargs)
+    raise ValueError(f"Unknown login throttle: {spec}")
@@ -0,0 +1,136 @@
+"""
+login_throttle_test.py
+Tests for the sliding-window login throttle.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import flask_main
+from login_throttle import LoginThrottle, MemoryLoginThrottle, SqliteLoginThrottle, estimate, make_login_throttle
+
+WINDOW = 100.0
+START = 1_000_000.0  # window boundary
+
+class TestLoginThrottle(unittest.TestCase):
+    """Test cases for limits, decay and bounded memory."""
+
+    def test_sliding_window_decay(self):
+        """
+        Test that failures from the previous window count in proportion to their overlap.
+        """
+        self.assertEqual(estimate((10000, 4, 0), START + 50, WINDOW), 4)
+        self.assertEqual(estimate((10000, 4, 0), START + WINDOW + 25, WINDOW), 3)
+        self.assertEqual(estimate((10000, 4, 0), START + 3 * WINDOW, WINDOW), 0)
+
+    def test_username_and_ip_limits(self):
+        """
+        Test that a username is blocked after its limit and unblocked as failures age out.
+        """
+        throttle = MemoryLoginThrottle(username_limit=3, ip_limit=5, window=WINDOW)
+        for _ in range(3):
+            self.assertEqual(throttle.check("alice", "10.0.0.1", START + 10), 0)
+            throttle.record_failure("alice", "10.0.0.1", START + 10)
+        wait = throttle.check("alice", "10.0.0.1", START + 10)
+        self.assertGreater(wait, 0)
+        self.assertEqual(throttle.check("alice", "10.0.0.1", START + 10 + wait + 0.01), 0)
+        # Another username from the same IP is fine until the IP limit is reached
+        self.assertEqual(throttle.check("bob", "10.0.0.1", START + 10), 0)
+        throttle.record_failure("bob", "10.0.0.1", START + 10)
+        throttle.record_failure("carol", "10.0.0.1", START + 10)
+        self.assertGreater(throttle.check("dave", "10.0.0.1", START + 10), 0)
+        self.assertEqual(throttle.check("dave", "10.0.0.2", START + 10), 0)
+
+        throttle.reset("alice")
+        self.assertEqual(throttle.check("alice", "10.0.0.3", START + 10), 0)
+
+    def test_memory_is_bounded(self):
+        """
+        Test that the least recently used keys are evicted past max_keys.
+        """
+        throttle = MemoryLoginThrottle(max_keys=10)
+        for i in range(100):
+            throttle.record_failure(f"user{i}", "10.0.0.1")
+        self.assertEqual(len(throttle), 10)
+
+    def test_sqlite_shared_between_instances(self):
+        """
+        Test that failures recorded by one process block the same username in another.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "throttle.db")
+            first = SqliteLoginThrottle(path, username_limit=2, window=WINDOW)
+            second = SqliteLoginThrottle(path, username_limit=2, window=WINDOW)
+            first.record_failure("alice", "10.0.0.1", START)
+            second.record_failure("alice", "10.0.0.2", START)
+            self.assertGreater(first.check("alice", "10.0.0.9", START + 1), 0)
+
+            first.max_keys = 2
+            first._prune(first.connection(), START + 1)
+            self.assertEqual(len(first), 2)
+            self.assertIsInstance(make_login_throttle(f"sqlite:{path}"), SqliteLoginThrottle)
+            first.connection().close()
+            second.connection().close()
+
+    def test_login_route_short_circuits(self):
+        """
+        Test that a throttled login returns 429 without calling UserManager.login.
+        """
+        throttle = MemoryLoginThrottle(username_limit=2)
+        client = flask_main.app.test_client()
+        with patch.object(flask_main, "login_throttle", throttle), \
+                patch.object(flask_main.user_manager, "login", return_value=None) as login:
+            for _ in range(2):
+                client.post("/login", data={'username': "mallory", 'password': "guess"})
+            response = client.post("/login", data={'username': "mallory", 'password': "guess"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+        self.assertEqual(login.call_count, 2)
+
+    def test_failures_reset_only_after_2fa(self):
+        """
+        Test that a correct password alone keeps the failure count and passing 2FA clears it.
+        """
+        throttle = MemoryLoginThrottle()
+        client = flask_main.app.test_client()
+        user = {'usrID': 1, 'usrName': "name", 'RoleID': 3}
+        with patch.object(flask_main, "login_throttle", throttle), \
+                patch.object(flask_main.user_manager, "login",
+                             return_value={'requires_2fa': True, 'email': "m@example.com", 'method': 'email'}), \
+                patch.object(flask_main.user_manager, "verify_2fa", return_value=user), \
+                patch.object(flask_main, "decrypt_string_with_file_key", return_value="mallory"):
+            throttle.record_failure("mallory", "127.0.0.1")
+            client.post("/login", data={'username': "mallory", 'password': "right"})
+            self.assertEqual(throttle.record_failure("mallory", None), 2)
+            client.post("/verify-2fa", data={'code': "123456"})
+            self.assertEqual(throttle.record_failure("mallory", None), 1)
+
+    def test_ip_limit_needs_trusted_proxies(self):
+        """
+        Test that the route only throttles by IP once TRUSTED_PROXIES says where the client address comes from.
+        """
+        client = flask_main.app.test_client()
+        for trusted, expected in ((None, 200), (0, 429)):
+            throttle = MemoryLoginThrottle(username_limit=10, ip_limit=2)
+            with patch.object(flask_main, "login_throttle", throttle), \
+                    patch.dict(flask_main.app.config, {'TRUSTED_PROXIES': trusted}), \
+                    patch.object(flask_main.user_manager, "login", return_value=None):
+                for name in ("alice", "bob"):
+                    client.post("/login", data={'username': name, 'password': "guess"})
+                response = client.post("/login", data={'username': "carol", 'password': "guess"})
+            self.assertEqual(response.status_code, expected, trusted)
+
+    def test_incomplete_backend_cannot_be_created(self):
+        """
+        Test that a throttle backend missing a storage method fails when instantiated.
+        """
+        class GetOnly(LoginThrottle):
+            def _get(self, keys):
+                return {}
+
+        with self.assertRaises(TypeError):
+            GetOnly()
+
+if __name__ == '__main__':
+    unittest.main()
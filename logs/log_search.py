@@ -1,10 +1,22 @@
 import re
 import sys
+import glob
+import json
+import time
+import heapq
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import os
 from cryptography.fernet import Fernet
 
 KEY_FILE = "encryption_key.key"
+INDEX_FILE = "log_index.db"
+INDEX_BATCH_SIZE = 5000
+FOLLOW_POLL_INTERVAL = 0.5
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+LOG_LINE_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - (\w+) - (.*)$')
 
 def load_key():
     """Load encryption key from file."""
@@ -16,15 +28,326 @@ def load_key():
         sys.exit(1)
 
 def decrypt_log(encrypted_log_file):
-    """Decrypt the encrypted log file and return its content."""
-    key = load_key()
-    cipher = Fernet(key)
+    """
+    Decrypt an encrypted log file and yield its lines one at a time.
+
+    Encrypted logs are a sequence of newline-separated Fernet tokens (see
+    log_encryptor.py), so only one chunk is held in memory at a time and no
+    plaintext is written to disk. Older single-token files are one chunk.
+    """
+    cipher = Fernet(load_key())
+    carry = b""
     with open(encrypted_log_file, "rb") as enc_file:
-        decrypted_data = cipher.decrypt(enc_file.read())
+        for token in enc_file:
+            token = token.strip()
+            if not token:
+                continue
+            chunk = carry + cipher.decrypt(token)
+            lines = chunk.split(b"\n")
+            carry = lines.pop()
+            for line in lines:
+                yield line.decode("utf-8", errors="replace")
+    if carry:
+        yield carry.decode("utf-8", errors="replace")
+
+def iter_log_lines(log_file):
+    """Yield lines from a plain or encrypted (.enc) log file without loading it whole."""
+    if log_file.endswith(".enc"):
+        yield from decrypt_log(log_file)
+        return
+    with open(log_file, 'r', encoding='utf-8', errors='replace') as file:
+        yield from file
+
+def _is_set(value):
+    return bool(value) and value.upper() != "NONE"
+
+def parse_log_line(line):
+    """
+    Split a log line into (timestamp, level, message).
+
+    Accepts the plain text format and the JSON format written by log_manager.
+    Timestamps are returned as strings; they sort chronologically as-is.
+    Returns None for lines that are not log records (e.g. traceback text).
+    """
+    if line.startswith("{"):
+        try:
+            record = json.loads(line)
+            return record["ts"], record["level"], record["msg"]
+        except (ValueError, KeyError, TypeError):
+            return None
+    match = LOG_LINE_PATTERN.match(line)
+    if not match:
+        return None
+    return match.groups()
+
+class LogQuery:
+    """
+    A compiled set of search filters.
+
+    All arguments are parsed once up front; "NONE" (any case) or empty means
+    the filter is not applied. Date bounds use TIMESTAMP_FORMAT and are
+    inclusive, matching the original per-line datetime comparison.
+    """
+
+    def __init__(self, keyword=None, log_level=None, start_date=None, end_date=None):
+        self.keyword = keyword.lower() if _is_set(keyword) else None
+        self.log_level = log_level if _is_set(log_level) else None
+        self.start = self._parse_bound(start_date)
+        self.end = self._parse_bound(end_date)
+
+    @staticmethod
+    def _parse_bound(value):
+        if not _is_set(value):
+            return None
+        # Validate once, then compare as text: "YYYY-MM-DD HH:MM:SS,fff" sorts chronologically
+        return datetime.strptime(value, TIMESTAMP_FORMAT).strftime(TIMESTAMP_FORMAT) + ",000"
+
+    def matches_record(self, log_time, level, message):
+        """Check an already parsed record against the filters."""
+        if self.log_level and level != self.log_level:
+            return False
+        if self.keyword and self.keyword not in message.lower():
+            return False
+        if self.start and log_time < self.start:
+            return False
+        if self.end and log_time > self.end:
+            return False
+        return True
+
+    def matches(self, line):
+        """Return the parsed record if the line matches, otherwise None."""
+        record = parse_log_line(line)
+        if record and self.matches_record(*record):
+            return record
+        return None
+
+class SearchStats:
+    """Counts lines scanned and matched for throughput reporting."""
+
+    def __init__(self):
+        self.scanned = 0
+        self.matched = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
 
-    return decrypted_data.decode("utf-8").splitlines()
+    @property
+    def lines_per_sec(self):
+        elapsed = self.elapsed
+        return self.scanned / elapsed if elapsed > 0 else 0.0
 
-def search_logs(log_file, keyword=None, log_level=None, start_date=None, end_date=None):
+    def summary(self):
+        return (f"Scanned {self.scanned} lines, {self.matched} matches "
+                f"in {self.elapsed:.2f}s ({self.lines_per_sec:,.0f} lines/sec)")
+
+def iter_search(lines, query, stats=None):
+    """Lazily yield stripped lines that match the query."""
+    for line in lines:
+        if stats:
+            stats.scanned += 1
+        line = line.rstrip("\r\n")
+        if query.matches(line):
+            if stats:
+                stats.matched += 1
+            yield line
+
+class LogIndex:
+    """
+    Incremental SQLite FTS5 index over log files.
+
+    Each parsed record is stored with its timestamp, level and hourly time
+    bucket; messages go into a trigram FTS5 table so keyword lookups are
+    substring matches like the scan mode. Plain files remember the byte
+    offset of the last complete line, so re-indexing only reads new lines.
+    Encrypted segments are indexed once per size/mtime.
+    """
+
+    def __init__(self, index_path=INDEX_FILE):
+        self.index_path = index_path
+        self.conn = sqlite3.connect(index_path, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS log_files (
+                path TEXT PRIMARY KEY,
+                inode INTEGER,
+                size INTEGER,
+                mtime REAL,
+                offset INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS log_entries (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                level TEXT NOT NULL,
+                message TEXT NOT NULL,
+                line TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_log_entries_ts ON log_entries (ts);
+            CREATE INDEX IF NOT EXISTS idx_log_entries_level_ts ON log_entries (level, ts);
+            CREATE INDEX IF NOT EXISTS idx_log_entries_path ON log_entries (path, id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5 (
+                message, content='log_entries', content_rowid='id', tokenize='trigram'
+            );
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def _forget(self, path):
+        """Drop every indexed entry for a file that was truncated or replaced."""
+        self.conn.execute(
+            "INSERT INTO log_fts (log_fts, rowid, message) "
+            "SELECT 'delete', id, message FROM log_entries WHERE path=?", (path,)
+        )
+        self.conn.execute("DELETE FROM log_entries WHERE path=?", (path,))
+
+    def _insert_batch(self, path, batch):
+        cursor = self.conn.cursor()
+        for line, (log_time, level, message) in batch:
+            cursor.execute(
+                "INSERT INTO log_entries (path, ts, bucket, level, message, line) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, log_time, log_time[:13], level, message, line)
+            )
+            cursor.execute("INSERT INTO log_fts (rowid, message) VALUES (?, ?)", (cursor.lastrowid, message))
+
+    def ingest(self, log_file):
+        """
+        Index any lines added to a log file since the last call.
+
+        Returns:
+            int: Number of new records indexed.
+        """
+        path = os.path.abspath(log_file)
+        st = os.stat(path)
+        row = self.conn.execute(
+            "SELECT inode, size, mtime, offset FROM log_files WHERE path=?", (path,)
+        ).fetchone()
+        encrypted = path.endswith(".enc")
+
+        offset = 0
+        if row:
+            inode, size, mtime, offset = row
+            if encrypted and (size, mtime) == (st.st_size, st.st_mtime):
+                return 0
+            if encrypted or inode != st.st_ino or st.st_size < offset:
+                offset = 0
+        added = 0
+        with self.conn:
+            if offset == 0 and row:
+                self._forget(path)
+            if encrypted:
+                lines = ((line, None) for line in iter_log_lines(path))
+            else:
+                lines = self._read_complete_lines(path, offset)
+            batch = []
+            for line, end in lines:
+                if end is not None:
+                    offset = end
+                line = line.rstrip("\r\n")
+                record = parse_log_line(line)
+                if record:
+                    batch.append((line, record))
+                if len(batch) >= INDEX_BATCH_SIZE:
+                    self._insert_batch(path, batch)
+                    added += len(batch)
+                    batch = []
+            self._insert_batch(path, batch)
+            added += len(batch)
+            if encrypted:
+                offset = st.st_size
+            self.conn.execute(
+                "INSERT OR REPLACE INTO log_files (path, inode, size, mtime, offset) VALUES (?, ?, ?, ?, ?)",
+                (path, st.st_ino, st.st_size, st.st_mtime, offset)
+            )
+        return added
+
+    @staticmethod
+    def _read_complete_lines(path, offset):
+        """Yield (line, end_offset) for each newline-terminated line after offset."""
+        with open(path, "rb") as file:
+            file.seek(offset)
+            for raw in file:
+                if not raw.endswith(b"\n"):
+                    break  # Partially written line; pick it up next time
+                offset += len(raw)
+                yield raw.decode("utf-8", errors="replace"), offset
+
+    def query(self, query, log_files=None):
+        """
+        Yield (path, line) for stored lines matching a LogQuery.
+
+        A single file comes back in file order; several files are merged in
+        timestamp order like search_log_files.
+
+        The FTS/SQL filters narrow the candidates; each row is then checked
+        with the same LogQuery used by the scan mode so results are identical.
+        """
+        clauses, params = [], []
+        if isinstance(log_files, str):
+            log_files = [log_files]
+        if log_files:
+            clauses.append(f"e.path IN ({', '.join('?' * len(log_files))})")
+            params.extend(os.path.abspath(path) for path in log_files)
+        if query.log_level:
+            clauses.append("e.level = ?")
+            params.append(query.log_level)
+        if query.start:
+            clauses.append("e.ts >= ?")
+            params.append(query.start)
+        if query.end:
+            clauses.append("e.ts <= ?")
+            params.append(query.end)
+
+        source = "log_entries e"
+        if query.keyword and len(query.keyword) >= 3:
+            # Trigram MATCH needs at least three characters to use the index.
+            # CROSS JOIN keeps SQLite from probing FTS once per log_entries row.
+            source = "log_fts CROSS JOIN log_entries e ON e.id = log_fts.rowid"
+            clauses.append("log_fts MATCH ?")
+            params.append('"' + query.keyword.replace('"', '""') + '"')
+
+        sql = f"SELECT e.path, e.ts, e.level, e.message, e.line FROM {source}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if log_files and len(log_files) == 1:
+            sql += " ORDER BY e.id"
+        else:
+            sql += " ORDER BY e.ts, e.path, e.id"
+
+        for path, log_time, level, message, line in self.conn.execute(sql, params):
+            if query.matches_record(log_time, level, message):
+                yield path, line
+
+    def histogram(self, query=None):
+        """Return [(hour_bucket, count)] for records in the optional level/date range."""
+        clauses, params = [], []
+        if query and query.log_level:
+            clauses.append("level = ?")
+            params.append(query.log_level)
+        if query and query.start:
+            clauses.append("ts >= ?")
+            params.append(query.start)
+        if query and query.end:
+            clauses.append("ts <= ?")
+            params.append(query.end)
+        sql = "SELECT bucket, COUNT(*) FROM log_entries"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " GROUP BY bucket ORDER BY bucket"
+        return self.conn.execute(sql, params).fetchall()
+
+def default_index_path(log_file):
+    return os.path.join(os.path.dirname(os.path.abspath(log_file)), INDEX_FILE)
+
+def search_logs(log_file, keyword=None, log_level=None, start_date=None, end_date=None, stats=None,
+                indexed=False, index_path=None):
     """
     Search logs based on keyword, log level, and date range.
     # Example usage:
@@ -35,54 +358,229 @@ def search_logs(log_file, keyword=None, log_level=None, start_date=None, end_dat
     # #Search by date range
     # python log_search.py banking_system.log NONE NONE "2025-03-07 16:42:00" "2025-03-07 16:50:00"
     """
-    results = []
+    query = LogQuery(keyword, log_level, start_date, end_date)
+    try:
+        if indexed:
+            return [line for _, line in indexed_search(log_file, query, index_path, stats)]
+        return list(iter_search(iter_log_lines(log_file), query, stats))
+    except Exception as e:
+        print(f"Error reading log file: {e}")
+        return []
+
+def indexed_search(log_files, query, index_path=None, stats=None):
+    """Bring the index up to date for one or more files, then yield (path, line) matches."""
+    if isinstance(log_files, str):
+        log_files = [log_files]
+    index = LogIndex(index_path or default_index_path(log_files[0]))
     try:
-        with open(log_file, 'r', encoding='utf-8') as file:
-            logs = file.readlines()
-            print(f"Total logs found: {len(logs)}")
+        for log_file in log_files:
+            added = index.ingest(log_file)
+            if stats:
+                stats.scanned += added
+        for path, line in index.query(query, log_files):
+            if stats:
+                stats.matched += 1
+            yield path, line
+    finally:
+        index.close()
 
-            for line in logs:
-                match = re.match(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - (\w+) - (.*)$', line)
-                if not match:
-                    continue
-                log_time, level, message = match.groups()
-                log_time = datetime.strptime(log_time, "%Y-%m-%d %H:%M:%S,%f")
+def expand_log_paths(spec):
+    """
+    Resolve a file, directory or glob pattern into a sorted list of log segments.
 
-                if log_level and log_level.upper() != "NONE" and level != log_level:
-                    continue
-                if keyword and keyword.upper() != "NONE" and keyword.lower() not in message.lower():
+    Directories expand to their *.log, *.log.* and *.enc files.
+    """
+    if os.path.isdir(spec):
+        paths = set()
+        for pattern in ("*.log", "*.log.*", "*.enc"):
+            paths.update(glob.glob(os.path.join(spec, pattern)))
+    elif glob.has_magic(spec):
+        paths = set(glob.glob(spec))
+    else:
+        return [spec]
+    return sorted(path for path in paths if os.path.isfile(path))
+
+def _search_segment(path, seg_index, filters, key_file):
+    """
+    Process pool worker: scan one segment and return its matches sorted by time.
+
+    Returns:
+        tuple: (lines scanned, [(timestamp, segment index, line number, line)])
+    """
+    global KEY_FILE
+    KEY_FILE = key_file
+    query = LogQuery(*filters)
+    matches = []
+    scanned = 0
+    for line_no, line in enumerate(iter_log_lines(path)):
+        scanned += 1
+        line = line.rstrip("\r\n")
+        record = query.matches(line)
+        if record:
+            matches.append((record[0], seg_index, line_no, line))
+    matches.sort()
+    return scanned, matches
+
+def search_log_files(paths, keyword=None, log_level=None, start_date=None, end_date=None,
+                     workers=None, stats=None):
+    """
+    Search many log segments in parallel, one process pool task per segment.
+
+    Yields:
+        tuple: (path, line) for every match, merged in timestamp order. Ties are
+        broken by segment order and then line number so output is stable.
+    """
+    filters = (keyword, log_level, start_date, end_date)
+    LogQuery(*filters)  # Validate the arguments before starting any workers
+    key_file = os.path.abspath(KEY_FILE)
+    if not paths:
+        return
+    with ProcessPoolExecutor(max_workers=workers or min(len(paths), os.cpu_count() or 1)) as pool:
+        futures = [pool.submit(_search_segment, path, i, filters, key_file) for i, path in enumerate(paths)]
+        segments = []
+        for future in futures:
+            scanned, matches = future.result()
+            if stats:
+                stats.scanned += scanned
+                stats.matched += len(matches)
+            segments.append(matches)
+    for _, seg_index, _, line in heapq.merge(*segments):
+        yield paths[seg_index], line
+
+def follow_log(log_file, query, poll_interval=FOLLOW_POLL_INTERVAL, from_start=False,
+               stop_event=None, yield_idle=False):
+    """
+    Tail a growing log file and yield matching lines as they are written.
+
+    Starts at the current end of the file unless from_start is set; a file
+    that doesn't exist yet is read from its first line once it appears. When
+    the file is rotated (a new inode appears at the same path) the rest of the
+    old file is drained before switching; a truncated file is re-read from the
+    top. Partial lines are held back until their newline arrives, or until the
+    file they belong to is rotated away or truncated.
+
+    Args:
+        stop_event: Optional threading.Event that ends the loop when set
+        yield_idle: Yield None after every poll with no new data, so callers
+            can send keepalives or notice disconnects
+    """
+    file = None
+    inode = None
+    pending = b""
+    draining = False
+    try:
+        while stop_event is None or not stop_event.is_set():
+            if file is None:
+                try:
+                    file = open(log_file, "rb")
+                except FileNotFoundError:
+                    from_start = True  # Everything written once it appears is new
+                    time.sleep(poll_interval)
                     continue
-                if start_date and start_date.upper() != "NONE":
-                    start_date_dt = datetime.strptime(start_date, "%Y-%m-%d %H:%M:%S")
-                    if log_time < start_date_dt:
-                        continue
-                if end_date and end_date.upper() != "NONE":
-                    end_date_dt = datetime.strptime(end_date, "%Y-%m-%d %H:%M:%S")
-                    if log_time > end_date_dt:
-                        continue
-                results.append(line.strip())
-    except Exception as e:
-        print(f"Error reading log file: {e}")
-    
-    return results
+                inode = os.fstat(file.fileno()).st_ino
+                draining = False
+                if not from_start:
+                    file.seek(0, os.SEEK_END)
+                from_start = True  # Files that appear after a rotation are read whole
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python log_search.py <log_file> <keyword> <log_level> <start_date> <end_date>")
-        sys.exit(1)
+            chunk = file.read()
+            if chunk:
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                for raw in lines:
+                    line = raw.decode("utf-8", errors="replace").rstrip("\r")
+                    if query.matches(line):
+                        yield line
+                continue
 
-    log_file = sys.argv[1]
-    keyword = sys.argv[2] if len(sys.argv) > 2 else "NONE"
-    log_level = sys.argv[3] if len(sys.argv) > 3 else "NONE"
-    start_date = sys.argv[4] if len(sys.argv) > 4 else "NONE"
-    end_date = sys.argv[5] if len(sys.argv) > 5 else "NONE"
+            try:
+                st = os.stat(log_file)
+            except FileNotFoundError:
+                st = None
+            rotated = st is None or st.st_ino != inode
+            if rotated and not draining:
+                # Rotated away: read the old handle once more before switching
+                draining = True
+                continue
+            if rotated or st.st_size < file.tell():
+                # The last line of the old contents will never get its newline
+                if pending:
+                    line = pending.decode("utf-8", errors="replace").rstrip("\r")
+                    pending = b""
+                    if query.matches(line):
+                        yield line
+                if rotated:
+                    file.close()
+                    file = None
+                else:
+                    file.seek(0)
+            else:
+                if yield_idle:
+                    yield None
+                time.sleep(poll_interval)
+    finally:
+        if file is not None:
+            file.close()
 
-    results = search_logs(log_file, keyword, log_level, start_date, end_date)
+def build_parser():
+    parser = argparse.ArgumentParser(description="Search plain or encrypted banking system logs.")
+    parser.add_argument("log_file", help="Log file, directory of segments, or glob pattern")
+    parser.add_argument("keyword", nargs="?", default="NONE")
+    parser.add_argument("log_level", nargs="?", default="NONE")
+    parser.add_argument("start_date", nargs="?", default="NONE")
+    parser.add_argument("end_date", nargs="?", default="NONE")
+    parser.add_argument("--output", default="search_results.txt",
+                        help="File that matching lines are also written to")
+    parser.add_argument("--indexed", action="store_true",
+                        help="Answer from the incremental FTS5 index instead of scanning")
+    parser.add_argument("--index-db", default=None,
+                        help=f"Index database (default: {INDEX_FILE} next to the log file)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes used when searching several segments (default: CPU count)")
+    parser.add_argument("--follow", action="store_true",
+                        help="Keep watching the log from its current end and print new matches")
+    return parser
 
-    if results:
-        print("\n".join(results))
-        with open("search_results.txt", "w", encoding="utf-8") as output_file:
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    query = LogQuery(args.keyword, args.log_level, args.start_date, args.end_date)
+    if args.follow:
+        try:
+            for line in follow_log(args.log_file, query):
+                print(line, flush=True)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    stats = SearchStats()
+    paths = expand_log_paths(args.log_file)
+    if not paths:
+        print(f"No log files match {args.log_file}")
+        return
+
+    try:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            if args.indexed:
+                matches = indexed_search(paths, query, args.index_db, stats)
+            elif len(paths) > 1:
+                matches = search_log_files(paths, args.keyword, args.log_level, args.start_date,
+                                           args.end_date, args.workers, stats)
+            else:
+                matches = ((paths[0], line) for line in iter_search(iter_log_lines(paths[0]), query, stats))
+            if len(paths) > 1:
+                # Several segments: prefix each line with its file, like grep
+                results = (f"{os.path.basename(path)}: {line}" for path, line in matches)
+            else:
+                results = (line for _, line in matches)
             for result in results:
+                print(result)
                 output_file.write(result + "\n")
-    else:
+    except Exception as e:
+        print(f"Error reading log file: {e}")
+
+    if not stats.matched:
         print("No matching logs found.")
+    print(stats.summary(), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
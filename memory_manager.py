@@ -3,65 +3,288 @@ Memory Manager Module
 
 This module provides memory management utilities for tracking and optimizing memory usage.
 It includes functionality for detecting memory leaks and managing object lifecycles.
+
+The object registry holds weak references where the object supports them, so
+tracking an object never keeps it alive. Objects that cannot be weakly
+referenced (dicts, lists) are held strongly but the registry is capped and
+evicts least recently registered entries.
+
+RSS is read by a background sampler thread instead of on every request, so the
+request path only bumps a per-route counter. Growth between samples is
+attributed to the routes served in that interval, and tracemalloc snapshot
+diffs can be taken on demand.
 """
 
 import gc
 import logging
-from typing import Dict, Any
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional
 
 import psutil
 
 class MemoryManager:
     """A class for monitoring and managing memory usage in the application.
-    
+
     Attributes:
         baseline (float): Initial memory usage in MB
-        object_registry (Dict[str, Any]): Dictionary to track registered objects
+        object_registry (OrderedDict): Registered name -> (category, weakref or object, is_weak)
+        registry_limit (int): Maximum number of registry entries before LRU eviction
+        evicted (int): Number of entries evicted because of the size cap
+        sample_interval (float): Seconds between background RSS samples (0 disables the sampler)
+        current (float): Most recent RSS sample in MB
+        samples (deque): Recent (timestamp, RSS MB) samples
+        low_water (float): Smallest RSS in ``samples``; leak checks compare against it
+        alert_interval (float): Minimum seconds between leak alerts
+        route_growth (Dict[str, float]): MB of RSS growth attributed to each route
     """
 
-    def __init__(self):
-        """Initialize the MemoryManager with baseline memory usage."""
+    def __init__(self, sample_interval: float = 0.0, history: int = 120, registry_limit: int = 256,
+                 alert_interval: float = 60.0):
+        """Initialize the MemoryManager with baseline memory usage.
+
+        Args:
+            sample_interval (float): Seconds between background RSS samples;
+                0 reads RSS synchronously whenever it is needed
+            history (int): Number of samples kept for the status page
+            registry_limit (int): Maximum number of tracked objects
+            alert_interval (float): Minimum seconds between leak alerts
+        """
+        self._process = psutil.Process()
         self.baseline = self._get_memory_usage()
-        self.object_registry: Dict[str, Any] = {}
+        self.current = self.baseline
+        self.object_registry: "OrderedDict[str, tuple]" = OrderedDict()
+        self.registry_limit = registry_limit
+        self.evicted = 0
+        self._registry_lock = threading.RLock()
+        self.sample_interval = sample_interval
+        self.samples: deque = deque([(time.time(), self.baseline)], maxlen=history)
+        self.low_water = self.baseline
+        self.alert_interval = alert_interval
+        self._last_alert = 0.0
+        self.route_growth: Dict[str, float] = {}
+        self._route_hits: Dict[str, int] = {}
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        if sample_interval > 0:
+            self.start_sampler()
 
     def _get_memory_usage(self) -> float:
         """Get current memory usage in MB.
-        
+
+        Returns:
+            float: Current memory usage in megabytes
+        """
+        return self._process.memory_info().rss / (1024 * 1024)
+
+    def start_sampler(self) -> None:
+        """Start the background RSS sampler thread."""
+        if self._sampler and self._sampler.is_alive():
+            return
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._run_sampler, name="memory-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop_sampler(self) -> None:
+        """Stop the background RSS sampler thread."""
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+            self._sampler = None
+
+    def _run_sampler(self) -> None:
+        while not self._stop.wait(self.sample_interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logging.error("Memory sampler failed: %s", e)
+
+    def sample(self) -> float:
+        """Read RSS once and attribute growth since the last sample to recent routes.
+
+        Returns:
+            float: The new RSS sample in MB
+        """
+        current = self._get_memory_usage()
+        growth = current - self.current
+        # Swap the counters under the lock so no request's hit lands in the old dict after it is read
+        with self._registry_lock:
+            hits, self._route_hits = self._route_hits, {}
+        total = sum(hits.values())
+        if growth > 0 and total:
+            for route, count in hits.items():
+                self.route_growth[route] = self.route_growth.get(route, 0.0) + growth * count / total
+        self.current = current
+        self.samples.append((time.time(), current))
+        self.low_water = min(rss for _, rss in self.samples)
+        return current
+
+    def record_request(self, route: str) -> None:
+        """Count a served request for growth attribution; cheap enough for every request.
+
+        Args:
+            route (str): Route or endpoint name that served the request
+        """
+        with self._registry_lock:
+            self._route_hits[route] = self._route_hits.get(route, 0) + 1
+
+    def current_usage(self) -> float:
+        """Return the latest RSS in MB without a syscall when the sampler is running.
+
         Returns:
             float: Current memory usage in megabytes
         """
-        return psutil.Process().memory_info().rss / (1024 * 1024)
+        if self._sampler is None:
+            self.current = self._get_memory_usage()
+        return self.current
 
     def check_for_leaks(self, threshold: float = 1.5) -> bool:
-        """Check if memory usage exceeds threshold times baseline.
-        
+        """Check if memory usage exceeds threshold times the recent low-water mark.
+
+        The reference is the smallest RSS in the sample history rather than the
+        RSS at startup, so a process that warmed up and leveled off stops
+        alerting once its early samples roll out. Alerts are rate-limited to
+        one per alert_interval.
+
         Args:
-            threshold (float): Multiplier for baseline memory usage
-            
+            threshold (float): Multiplier for the low-water memory usage
+
         Returns:
-            bool: True if memory leak is detected
+            bool: True if a memory leak is detected and due to be reported
         """
-        current = self._get_memory_usage()
-        if current > self.baseline * threshold:
-            logging.warning(
-                "Memory leak detected! Current: %.2fMB, Baseline: %.2fMB",
-                current,
-                self.baseline
-            )
-            return True
-        return False
-
-    def register_object(self, name: str, obj: Any) -> None:
+        current = self.current_usage()
+        if current <= self.low_water * threshold:
+            return False
+        now = time.monotonic()
+        if self._last_alert and now - self._last_alert < self.alert_interval:
+            return False
+        self._last_alert = now
+        logging.warning(
+            "Memory leak detected! Current: %.2fMB, Low-water: %.2fMB",
+            current,
+            self.low_water
+        )
+        return True
+
+    def top_routes(self, limit: int = 10) -> List[tuple]:
+        """Return the routes with the most attributed RSS growth.
+
+        Args:
+            limit (int): Maximum number of routes returned
+
+        Returns:
+            List[tuple]: (route, MB) pairs, largest first
+        """
+        return sorted(self.route_growth.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def snapshot_diff(self, limit: int = 10, frames: int = 1) -> List[str]:
+        """Take a tracemalloc snapshot and compare it with the previous one.
+
+        The first call starts tracemalloc and records the baseline snapshot, so
+        tracing overhead is only paid after someone asks for it.
+
+        Args:
+            limit (int): Number of allocation sites returned
+            frames (int): Traceback depth recorded when tracing starts
+
+        Returns:
+            List[str]: Top allocation differences, largest first
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self._snapshot = None
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        previous, self._snapshot = self._snapshot, snapshot
+        if previous is None:
+            return []
+        return [str(stat) for stat in snapshot.compare_to(previous, "lineno")[:limit]]
+
+    def stop_tracing(self) -> None:
+        """Stop tracemalloc and drop the stored snapshot."""
+        self._snapshot = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def register_object(self, name: str, obj: Any, category: Optional[str] = None) -> None:
         """Track objects for memory management.
-        
+
         Args:
             name (str): Identifier for the object
             obj (Any): The object to be tracked
+            category (str): Grouping used in registry_counts (defaults to the type name)
         """
-        self.object_registry[name] = obj
+        category = category or type(obj).__name__
+        try:
+            entry = (category, weakref.ref(obj, self._make_reaper(name)), True)
+        except TypeError:
+            entry = (category, obj, False)
+
+        # Dropped entries are released after the lock so weakref callbacks never run mid-update
+        dropped = []
+        with self._registry_lock:
+            dropped.append(self.object_registry.pop(name, None))
+            self.object_registry[name] = entry
+            while len(self.object_registry) > self.registry_limit:
+                dropped.append(self.object_registry.popitem(last=False))
+                self.evicted += 1
+        del dropped
 
-    def cleanup(self) -> None:
-        """Force cleanup of registered objects and run garbage collection."""
-        for name in list(self.object_registry.keys()):
-            del self.object_registry[name]
-        gc.collect()
+    def _make_reaper(self, name: str):
+        """Build a weakref callback that drops the entry once its object is collected."""
+        registry_ref = weakref.ref(self)
+
+        def reap(ref):
+            manager = registry_ref()
+            if manager is None:
+                return
+            with manager._registry_lock:
+                entry = manager.object_registry.get(name)
+                if entry is not None and entry[1] is ref:
+                    del manager.object_registry[name]
+        return reap
+
+    def get_object(self, name: str) -> Any:
+        """Return a registered object, or None if it was never registered or has been collected.
+
+        Args:
+            name (str): Identifier for the object
+        """
+        entry = self.object_registry.get(name)
+        if entry is None:
+            return None
+        _, value, is_weak = entry
+        return value() if is_weak else value
+
+    def registry_counts(self) -> Dict[str, int]:
+        """Count live registry entries per category.
+
+        Returns:
+            Dict[str, int]: Category -> number of tracked objects
+        """
+        counts: Dict[str, int] = {}
+        with self._registry_lock:
+            entries = list(self.object_registry.values())
+        for category, value, is_weak in entries:
+            if is_weak and value() is None:
+                continue
+            counts[category] = counts.get(category, 0) + 1
+        return counts
+
+    def cleanup(self, collect: bool = True) -> None:
+        """Force cleanup of registered objects and optionally run garbage collection.
+
+        Args:
+            collect (bool): Run a full gc.collect() after clearing the registry
+        """
+        with self._registry_lock:
+            released, self.object_registry = self.object_registry, OrderedDict()
+        released.clear()
+        if collect:
+            gc.collect()
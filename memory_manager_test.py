@@ -0,0 +1,137 @@
+"""
+memory_manager_test.py
+This module contains unit tests for the MemoryManager class.
+"""
+
+import gc
+import unittest
+from unittest.mock import patch
+from memory_manager import MemoryManager
+
+class TestMemoryManager(unittest.TestCase):
+    """
+    Test cases for the MemoryManager class.
+    Tests include cached sampling, route attribution and snapshot diffs.
+    """
+
+    def setUp(self):
+        self.mm = MemoryManager()
+
+    def tearDown(self):
+        self.mm.stop_tracing()
+
+    def test_growth_is_attributed_to_routes_by_hits(self):
+        """
+        Test that RSS growth between samples is split across the routes served.
+        """
+        self.mm.current = 100.0
+        self.mm.record_request("/home")
+        self.mm.record_request("/home")
+        self.mm.record_request("/transfer")
+        with patch.object(MemoryManager, "_get_memory_usage", return_value=103.0):
+            self.mm.sample()
+        self.assertAlmostEqual(self.mm.route_growth["/home"], 2.0)
+        self.assertAlmostEqual(self.mm.route_growth["/transfer"], 1.0)
+        self.assertEqual(self.mm.top_routes(1), [("/home", 2.0)])
+
+    def test_sampler_leak_check_uses_cached_value(self):
+        """
+        Test that leak checks do not read RSS while the sampler is running.
+        """
+        mm = MemoryManager(sample_interval=60)
+        try:
+            mm.current = mm.baseline * 2
+            with patch.object(MemoryManager, "_get_memory_usage") as mock_usage:
+                self.assertTrue(mm.check_for_leaks())
+                mock_usage.assert_not_called()
+        finally:
+            mm.stop_sampler()
+
+    def test_leak_alerts_are_rate_limited_and_follow_recent_samples(self):
+        """
+        Test that a leak is reported once per interval and a leveled-off process stops alerting.
+        """
+        mm = MemoryManager(history=3)
+        with patch.object(MemoryManager, "_get_memory_usage", return_value=mm.baseline * 2):
+            self.assertTrue(mm.check_for_leaks())
+            self.assertFalse(mm.check_for_leaks())
+            for _ in range(3):
+                mm.sample()
+            mm._last_alert = 0.0
+            self.assertFalse(mm.check_for_leaks())
+        self.assertAlmostEqual(mm.low_water, mm.baseline * 2)
+
+    def test_snapshot_diff_reports_new_allocations(self):
+        """
+        Test that the second snapshot reports allocations made since the first.
+        """
+        self.assertEqual(self.mm.snapshot_diff(), [])
+        blob = [bytearray(1024) for _ in range(100)]
+        diff = self.mm.snapshot_diff(limit=5)
+        self.assertTrue(any("memory_manager_test.py" in line for line in diff))
+        del blob
+
+    def test_cleanup_without_collect_clears_registry(self):
+        """
+        Test that cleanup(collect=False) empties the registry without a full garbage collection.
+        """
+        self.mm.register_object("transfer_errors", ["error"])
+        with patch("memory_manager.gc.collect") as mock_collect:
+            self.mm.cleanup(collect=False)
+            mock_collect.assert_not_called()
+        self.assertEqual(self.mm.object_registry, {})
+
+    def test_registry_does_not_keep_objects_alive(self):
+        """
+        Test that weakly referenceable objects leave the registry once collected.
+        """
+        class Handler:
+            pass
+
+        handler = Handler()
+        self.mm.register_object("transfer_instance", handler)
+        self.assertIs(self.mm.get_object("transfer_instance"), handler)
+        del handler
+        gc.collect()
+        self.assertIsNone(self.mm.get_object("transfer_instance"))
+        self.assertNotIn("transfer_instance", self.mm.object_registry)
+
+    def test_registry_is_capped_with_lru_eviction(self):
+        """
+        Test that strongly held entries are evicted oldest first past the cap.
+        """
+        mm = MemoryManager(registry_limit=3)
+        for i in range(5):
+            mm.register_object(f"locked_account_user{i}", {"attempts": i}, category="locked_account")
+        self.assertEqual(list(mm.object_registry), [f"locked_account_user{i}" for i in range(2, 5)])
+        self.assertEqual(mm.evicted, 2)
+        self.assertEqual(mm.registry_counts(), {"locked_account": 3})
+
+    def test_memory_diff_route_clamps_limit(self):
+        """
+        Test that a non-numeric limit falls back to the default and large ones are capped.
+        """
+        import flask_main
+        client = flask_main.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['role_id'] = 1
+        with patch.object(flask_main.memory_manager, "snapshot_diff", return_value=[]) as diff:
+            for query, expected in (("abc", 10), ("100000", 100), ("-5", 1), ("7", 7)):
+                self.assertEqual(client.get(f"/system/memory/diff?limit={query}").status_code, 200)
+                self.assertEqual(diff.call_args.kwargs['limit'], expected)
+
+    def test_requests_do_not_clear_the_registry(self):
+        """
+        Test that serving a request leaves earlier registrations to the LRU cap instead of clearing them.
+        """
+        import flask_main
+        flask_main.memory_manager.register_object("locked_account_test", {'attempts': 3}, category="locked_account")
+        try:
+            flask_main.app.test_client().get("/login")
+            self.assertIsNotNone(flask_main.memory_manager.get_object("locked_account_test"))
+        finally:
+            flask_main.memory_manager.cleanup(collect=False)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+"""
+metrics.py
+In-process metrics with Prometheus text exposition output.
+
+Every thread writes to its own shard, so recording a counter or histogram
+sample never takes a lock; shards are only merged when /metrics is scraped.
+Shards of finished threads are folded into a retired shard so short-lived
+request threads do not accumulate.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_LIVE_SHARDS = 64
+
+class MetricsRegistry:
+    """
+    Lock-free-on-write metric store.
+
+    Counters and gauges are floats keyed by (name, labels). Histograms are
+    lists of per-bucket counts followed by the running sum and count.
+    """
+
+    def __init__(self):
+        self._meta = {}
+        self._local = threading.local()
+        self._shards = []  # (thread, shard) pairs
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, metric_type, help_text, buckets=None):
+        """Register a metric's type, help text and (for histograms) bucket bounds."""
+        self._meta[name] = (metric_type, help_text, tuple(buckets or DEFAULT_BUCKETS))
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                if len(self._shards) >= MAX_LIVE_SHARDS:
+                    self._retire_dead_shards()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _retire_dead_shards(self):
+        """Fold shards of finished threads into the retired shard (caller holds the lock)."""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge_into(self._retired, shard)
+        self._shards = live
+
+    def _merge_into(self, target, shard):
+        for key, value in list(shard.items()):
+            if isinstance(value, list):
+                existing = target.get(key)
+                if existing is None:
+                    target[key] = list(value)
+                else:
+                    for i, item in enumerate(value):
+                        existing[i] += item
+            else:
+                target[key] = target.get(key, 0.0) + value
+
+    def inc(self, name, value=1.0, **labels):
+        """Add to a counter (or gauge, with a negative value)."""
+        shard = self._shard()
+        key = (name, tuple(sorted(labels.items())))
+        shard[key] = shard.get(key, 0.0) + value
+
+    def observe(self, name, value, **labels):
+        """Record one histogram sample."""
+        shard = self._shard()
+        key = (name, tuple(sorted(labels.items())))
+        buckets = self._meta[name][2]
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+        series[bisect_left(buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of the with-block in a histogram."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of timer()."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - started, **labels)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """Merge every shard into one {(name, labels): value} dict."""
+        merged = {}
+        with self._lock:
+            self._retire_dead_shards()
+            self._merge_into(merged, self._retired)
+            for _, shard in self._shards:
+                self._merge_into(merged, shard)
+        return merged
+
+    def value(self, name, **labels):
+        """Current merged value of one counter/gauge (0 if never recorded)."""
+        return self.snapshot().get((name, tuple(sorted(labels.items()))), 0.0)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        merged = self.snapshot()
+        by_name = {}
+        for (name, labels), value in merged.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(by_name):
+            metric_type, help_text, buckets = self._meta.get(name, ("untyped", "", DEFAULT_BUCKETS))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in sorted(by_name[name]):
+                if metric_type == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(buckets + (float("inf"),), value):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {value[-2]}")
+                    lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(val)}"' for key, val in labels) + "}"
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("http_request_duration_seconds", "histogram", "Request latency by route")
+REGISTRY.describe("http_requests_in_flight", "gauge", "Requests currently being handled")
+REGISTRY.describe("sqlite_transaction_seconds", "histogram", "Duration of Database write transactions")
+REGISTRY.describe("sqlite_lock_wait_seconds", "histogram", "Time spent waiting for the SQLite write lock")
+REGISTRY.describe("sqlite_transaction_errors_total", "counter", "Database write transactions that rolled back")
+REGISTRY.describe("crypto_operation_seconds", "histogram", "Duration of encrypt, decrypt, sign and bcrypt calls")
+REGISTRY.describe("bcrypt_queue_depth", "gauge", "bcrypt calls running or waiting in the hashing pool")
+REGISTRY.describe("bcrypt_queue_wait_seconds", "histogram", "Time bcrypt calls waited for a hashing thread")
+REGISTRY.describe("bcrypt_rejected_total", "counter", "bcrypt calls refused because the hashing queue was full")
+REGISTRY.describe("email_outbox_total", "counter", "Outbox emails by result (queued/sent/retry/failed)")
+REGISTRY.describe("email_send_seconds", "histogram", "Duration of one SMTP send")
+REGISTRY.describe("email_smtp_connections_total", "counter", "SMTP connections opened by the delivery worker")
+REGISTRY.describe("email_circuit_opened_total", "counter", "Times the email circuit breaker opened")
+REGISTRY.describe("login_failures_total", "counter", "Failed password logins")
+REGISTRY.describe("login_throttled_total", "counter", "Logins refused by the throttle before any database or bcrypt work")
+REGISTRY.describe("admission_in_flight", "gauge", "Admitted requests in progress by route class")
+REGISTRY.describe("admission_queue_depth", "gauge", "Requests waiting for a slot by route class")
+REGISTRY.describe("admission_queue_wait_seconds", "histogram", "Time queued requests waited for a slot")
+REGISTRY.describe("admission_shed_total", "counter", "Requests answered 503 because their route class was full")
+REGISTRY.describe("cache_requests_total", "counter", "Cache lookups by cache and result (hit/miss)")
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+
+def cache_hit(cache):
+    REGISTRY.inc("cache_requests_total", cache=cache, result="hit")
+
+def cache_miss(cache):
+    REGISTRY.inc("cache_requests_total", cache=cache, result="miss")
@@ -0,0 +1,140 @@
+"""
+metrics_test.py
+Tests for the sharded metrics registry and the Database transaction metrics.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+import flask_main
+import metrics
+from database_handler import Database
+from metrics import MetricsRegistry
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test cases for recording and rendering metrics."""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.describe("jobs_total", "counter", "Jobs run")
+        self.registry.describe("job_seconds", "histogram", "Job duration", buckets=(0.1, 1.0))
+
+    def test_counter_merges_thread_shards(self):
+        """
+        Test that counts recorded on finished threads survive shard retirement.
+        """
+        def work():
+            for _ in range(1000):
+                self.registry.inc("jobs_total", kind="batch")
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.registry.inc("jobs_total", kind="batch")
+
+        self.assertEqual(self.registry.value("jobs_total", kind="batch"), 8001)
+        # Dead threads were folded into the retired shard
+        self.assertEqual(len(self.registry._shards), 1)
+
+    def test_histogram_exposition(self):
+        """
+        Test that histogram buckets are cumulative and include +Inf, sum and count.
+        """
+        for value in (0.05, 0.5, 5.0):
+            self.registry.observe("job_seconds", value, kind='q"uote')
+
+        text = self.registry.render()
+        self.assertIn("# TYPE job_seconds histogram", text)
+        self.assertIn('job_seconds_bucket{kind="q\\"uote",le="0.1"} 1', text)
+        self.assertIn('job_seconds_bucket{kind="q\\"uote",le="1.0"} 2', text)
+        self.assertIn('job_seconds_bucket{kind="q\\"uote",le="+Inf"} 3', text)
+        self.assertIn('job_seconds_count{kind="q\\"uote"} 3', text)
+        self.assertIn('job_seconds_sum{kind="q\\"uote"} 5.55', text)
+
+class TestTransactionMetrics(unittest.TestCase):
+    """Test cases for the Database.transaction metrics."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmpdir.name, "metrics.db")
+        with sqlite3.connect(self.db_name) as conn:
+            conn.execute("CREATE TABLE Account (accID TEXT PRIMARY KEY, accValue TEXT, accType TEXT, usrID TEXT)")
+        self.db = Database(self.db_name)
+
+    def tearDown(self):
+        self.db.close_all_connections()
+        self.tmpdir.cleanup()
+
+    def count(self, name, op):
+        series = metrics.REGISTRY.snapshot().get((name, (("op", op),)))
+        if series is None:
+            return 0
+        return series[-1] if isinstance(series, list) else series
+
+    def test_transactions_and_crypto_are_counted(self):
+        """
+        Test that committed and rolled back transactions and encryptions are recorded.
+        """
+        commits = self.count("sqlite_transaction_seconds", "create_account")
+        waits = self.count("sqlite_lock_wait_seconds", "create_account")
+        errors = self.count("sqlite_transaction_errors_total", "create_account")
+        encrypts = self.count("crypto_operation_seconds", "encrypt")
+
+        self.assertTrue(self.db.create_account("1234567890", "1", "Checking", 10.0))
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db.create_account("1234567890", "1", "Checking", 10.0)
+
+        self.assertEqual(self.count("sqlite_transaction_seconds", "create_account"), commits + 2)
+        self.assertEqual(self.count("sqlite_lock_wait_seconds", "create_account"), waits + 2)
+        self.assertEqual(self.count("sqlite_transaction_errors_total", "create_account"), errors + 1)
+        self.assertEqual(self.count("crypto_operation_seconds", "encrypt"), encrypts + 4)
+        self.assertFalse(self.db.get_connection().in_transaction)
+
+    def test_nested_transaction_uses_a_savepoint(self):
+        """
+        Test that a nested transaction rolls back only its own work and leaves commit and metrics to the outer one.
+        """
+        waits = self.count("sqlite_lock_wait_seconds", "inner")
+        conn = self.db.get_connection()
+        with self.db.transaction("outer"):
+            conn.execute("INSERT INTO Account VALUES ('1', '10', 'Checking', '1')")
+            with self.assertRaises(ValueError):
+                with self.db.transaction("inner"):
+                    conn.execute("INSERT INTO Account VALUES ('2', '20', 'Checking', '1')")
+                    raise ValueError("inner failure")
+            self.assertTrue(conn.in_transaction)
+            with self.db.transaction("inner"):
+                conn.execute("INSERT INTO Account VALUES ('3', '30', 'Checking', '1')")
+            self.assertTrue(conn.in_transaction)
+
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(self.count("sqlite_lock_wait_seconds", "inner"), waits)
+        with sqlite3.connect(self.db_name) as other:
+            self.assertEqual([row[0] for row in other.execute("SELECT accID FROM Account ORDER BY accID")], ['1', '3'])
+
+class TestMetricsEndpoint(unittest.TestCase):
+    """Test cases for access to /metrics."""
+
+    def test_loopback_is_not_trusted(self):
+        """
+        Test that a local address alone is refused while an admin session or the scrape token is accepted.
+        """
+        client = flask_main.app.test_client()
+        with patch.dict(flask_main.app.config, METRICS_TOKEN="scrape-secret"):
+            self.assertEqual(client.get("/metrics", environ_base={'REMOTE_ADDR': "127.0.0.1"}).status_code, 403)
+            self.assertEqual(client.get("/metrics", headers={'Authorization': "Bearer wrong"}).status_code, 403)
+            self.assertEqual(client.get("/metrics", headers={'Authorization': "Bearer scrape-secret"}).status_code, 200)
+        self.assertEqual(client.get("/metrics", headers={'Authorization': "Bearer "}).status_code, 403)
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['role_id'] = 1
+        self.assertEqual(client.get("/metrics").status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
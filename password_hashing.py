@@ -0,0 +1,165 @@
+"""
+password_hashing.py
+Bounded worker pool for bcrypt hashing and checking.
+
+bcrypt releases the GIL, so a small thread pool hashes in parallel while
+request threads wait on the result. Admission is bounded: at most
+``workers + max_queue`` calls may be running or waiting; beyond that a call
+fails immediately with HasherBusy instead of piling up behind a login burst.
+
+The cost factor comes from BCRYPT_ROUNDS, or is calibrated at startup so one
+hash takes about BCRYPT_TARGET_MS on this machine. Stored hashes with a lower
+cost are reported by needs_rehash() so login can upgrade them.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+import metrics
+import tracing
+
+DEFAULT_ROUNDS = 12
+MIN_CALIBRATED_ROUNDS = 10
+MAX_ROUNDS = 16
+CALIBRATION_ROUNDS = 8
+
+class HasherBusy(RuntimeError):
+    """Raised when the hashing queue is full."""
+
+def cost_of(hashed: str | bytes) -> int | None:
+    """Cost factor of a bcrypt hash ("$2b$12$..." -> 12), or None if it is not one."""
+    if isinstance(hashed, bytes):
+        hashed = hashed.decode("ascii", "replace")
+    parts = hashed.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+def calibrate(target_ms: float, min_rounds: int = MIN_CALIBRATED_ROUNDS, max_rounds: int = MAX_ROUNDS) -> int:
+    """
+    Pick the highest cost whose hash time stays within ``target_ms``.
+
+    Each extra round doubles the work, so one measurement at a cheap cost is
+    extrapolated instead of timing every candidate.
+
+    Args:
+        target_ms: Wanted duration of one hash in milliseconds
+        min_rounds: Lowest cost returned, whatever the machine speed
+        max_rounds: Highest cost returned
+
+    Returns:
+        int: bcrypt cost factor
+    """
+    salt = bcrypt.gensalt(CALIBRATION_ROUNDS)
+    samples = []
+    for _ in range(3):
+        started = time.perf_counter()
+        bcrypt.hashpw(b"calibration-password", salt)
+        samples.append((time.perf_counter() - started) * 1000)
+    base_ms = min(samples)
+
+    rounds = CALIBRATION_ROUNDS
+    while rounds < max_rounds and base_ms * 2 ** (rounds + 1 - CALIBRATION_ROUNDS) <= target_ms:
+        rounds += 1
+    rounds = max(min_rounds, min(rounds, max_rounds))
+    logging.info("bcrypt cost %d selected for a %.0fms target (cost %d took %.1fms)",
+                 rounds, target_ms, CALIBRATION_ROUNDS, base_ms)
+    return rounds
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a bounded thread pool.
+
+    Attributes:
+        rounds (int): Cost factor for new hashes
+        workers (int): Hashing threads
+        max_queue (int): Calls allowed to wait for a free thread
+    """
+
+    def __init__(self, rounds: int = DEFAULT_ROUNDS, workers: int | None = None, max_queue: int | None = None):
+        self.rounds = rounds
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_queue = self.workers * 4 if max_queue is None else max_queue
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+
+    @classmethod
+    def from_env(cls) -> "PasswordHasher":
+        """Build a hasher from BCRYPT_ROUNDS / BCRYPT_TARGET_MS / BCRYPT_WORKERS / BCRYPT_MAX_QUEUE."""
+        if os.getenv("BCRYPT_ROUNDS"):
+            rounds = int(os.environ["BCRYPT_ROUNDS"])
+        elif os.getenv("BCRYPT_TARGET_MS"):
+            rounds = calibrate(float(os.environ["BCRYPT_TARGET_MS"]))
+        else:
+            rounds = DEFAULT_ROUNDS
+        workers = int(os.getenv("BCRYPT_WORKERS", "0")) or None
+        max_queue = int(os.environ["BCRYPT_MAX_QUEUE"]) if os.getenv("BCRYPT_MAX_QUEUE") else None
+        return cls(rounds, workers, max_queue)
+
+    def _submit(self, op: str, func, *args, wait: bool = True):
+        if not self._slots.acquire(blocking=False):
+            metrics.inc("bcrypt_rejected_total", op=op)
+            raise HasherBusy(f"Password hashing queue is full ({self.workers + self.max_queue} calls)")
+        metrics.inc("bcrypt_queue_depth")
+        queued = time.perf_counter()
+
+        def run():
+            metrics.observe("bcrypt_queue_wait_seconds", time.perf_counter() - queued)
+            try:
+                with metrics.timer("crypto_operation_seconds", op=op):
+                    return func(*args)
+            finally:
+                metrics.inc("bcrypt_queue_depth", -1)
+                self._slots.release()
+
+        try:
+            future = self._executor.submit(run)
+        except RuntimeError:
+            metrics.inc("bcrypt_queue_depth", -1)
+            self._slots.release()
+            raise
+        if not wait:
+            return future
+        with tracing.span("bcrypt"):
+            return future.result()
+
+    def hash(self, password: str) -> str:
+        """Hash a password at the configured cost."""
+        return self._submit("bcrypt_hash", bcrypt.hashpw, password.encode(), bcrypt.gensalt(self.rounds)).decode()
+
+    def check(self, password: str, hashed: str) -> bool:
+        """Check a password against a stored hash."""
+        return self._submit("bcrypt_check", bcrypt.checkpw, password.encode(), hashed.encode())
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True when a stored hash was made with a lower cost than the current one."""
+        cost = cost_of(hashed)
+        return cost is not None and cost < self.rounds
+
+    def rehash_later(self, password: str, store) -> bool:
+        """
+        Hash ``password`` in the background and pass the result to ``store``.
+
+        Skipped (returning False) when the queue is full; the hash is simply
+        upgraded on a later login.
+        """
+        try:
+            future = self._submit("bcrypt_hash", bcrypt.hashpw, password.encode(), bcrypt.gensalt(self.rounds), wait=False)
+        except HasherBusy:
+            return False
+
+        def done(result):
+            try:
+                store(result.result().decode())
+            except Exception as e:
+                logging.error("Password rehash failed: %s", e)
+
+        future.add_done_callback(done)
+        return True
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,61 @@
+"""
+password_hashing_test.py
+Tests for the bounded bcrypt pool and hash cost upgrades.
+"""
+
+import threading
+import unittest
+import bcrypt
+from password_hashing import HasherBusy, PasswordHasher, calibrate, cost_of
+
+class TestPasswordHasher(unittest.TestCase):
+    """Test cases for hashing, queue limits and rehash detection."""
+
+    def setUp(self):
+        self.hasher = PasswordHasher(rounds=5, workers=1, max_queue=0)
+
+    def tearDown(self):
+        self.hasher.shutdown()
+
+    def test_hash_check_and_rehash(self):
+        """
+        Test that hashes use the configured cost and older costs are flagged for rehashing.
+        """
+        hashed = self.hasher.hash("Password123!")
+        self.assertEqual(cost_of(hashed), 5)
+        self.assertTrue(self.hasher.check("Password123!", hashed))
+        self.assertFalse(self.hasher.check("wrong", hashed))
+
+        old = bcrypt.hashpw(b"Password123!", bcrypt.gensalt(4)).decode()
+        self.assertTrue(self.hasher.needs_rehash(old))
+        self.assertFalse(self.hasher.needs_rehash(hashed))
+        self.assertFalse(self.hasher.needs_rehash("not-a-bcrypt-hash"))
+
+        stored = []
+        done = threading.Event()
+        self.assertTrue(self.hasher.rehash_later("Password123!", lambda new: (stored.append(new), done.set())))
+        self.assertTrue(done.wait(10))
+        self.assertEqual(cost_of(stored[0]), 5)
+
+    def test_full_queue_is_rejected(self):
+        """
+        Test that calls beyond workers + max_queue fail fast with HasherBusy.
+        """
+        release = threading.Event()
+        blocked = self.hasher._submit("bcrypt_hash", release.wait, 10, wait=False)
+        with self.assertRaises(HasherBusy):
+            self.hasher.hash("Password123!")
+        self.assertFalse(self.hasher.rehash_later("Password123!", lambda new: None))
+        release.set()
+        blocked.result()
+        self.assertTrue(self.hasher.check("x", self.hasher.hash("x")))
+
+    def test_calibration_bounds(self):
+        """
+        Test that calibration stays within the requested cost range.
+        """
+        self.assertEqual(calibrate(0.001, min_rounds=10, max_rounds=14), 10)
+        self.assertEqual(calibrate(10 ** 9, min_rounds=10, max_rounds=11), 11)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+profiler.py
+On-demand cProfile capture of single requests.
+
+An admin adds the X-Profile header or ?profile=1 to any request; that request
+runs under cProfile and the stats are written to PROFILE_DIR as a .prof file
+(loadable with pstats or snakeviz) next to a small JSON summary with the
+route, duration and top functions. Only one request is profiled at a time and
+only the newest captures are kept.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+from datetime import datetime
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+KEEP_PROFILES = 50
+TOP_FUNCTIONS = 15
+
+class ProfileStore:
+    """
+    Starts captures and manages the profile directory.
+
+    Attributes:
+        directory (str): Where .prof files and their summaries are written
+        keep (int): Number of captures kept before the oldest are deleted
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, keep: int = KEEP_PROFILES):
+        self.directory = directory
+        self.keep = keep
+        self._busy = threading.Lock()
+
+    def start(self) -> cProfile.Profile | None:
+        """Start profiling the current thread, or return None if a capture is already running."""
+        if not self._busy.acquire(blocking=False):
+            logging.info("Profile capture skipped: another request is being profiled")
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) owns the hook
+            self._busy.release()
+            return None
+        return profile
+
+    def stop(self, profile: cProfile.Profile, method: str, route: str, started: float) -> str:
+        """
+        Stop a capture and write it to disk.
+
+        Args:
+            profile: The profile returned by start()
+            method: HTTP method of the request
+            route: URL rule that served the request
+            started: time.perf_counter() at the start of the request
+
+        Returns:
+            str: Name of the capture (file name without extension)
+        """
+        try:
+            profile.disable()
+            duration_ms = (time.perf_counter() - started) * 1000
+        finally:
+            self._busy.release()
+
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        name = f"{stamp}-{method}-{slug}"
+        profile.dump_stats(os.path.join(self.directory, name + ".prof"))
+
+        summary = {
+            'name': name,
+            'method': method,
+            'route': route,
+            'at': datetime.now().isoformat(timespec="seconds"),
+            'duration_ms': round(duration_ms, 2),
+            'top': top_functions(profile),
+        }
+        with open(os.path.join(self.directory, name + ".json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f)
+        self.prune()
+        logging.info("Profiled %s %s in %.1fms -> %s", method, route, duration_ms, name)
+        return name
+
+    def prune(self) -> None:
+        """Delete the oldest captures beyond ``keep``."""
+        names = self._names()
+        for name in names[self.keep:]:
+            for ext in (".prof", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, name + ext))
+                except FileNotFoundError:
+                    pass
+
+    def _names(self) -> list[str]:
+        """Capture names, newest first (names start with a sortable timestamp)."""
+        try:
+            files = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((f[:-5] for f in files if f.endswith(".json")), reverse=True)
+
+    def recent(self, limit: int = 20) -> list[dict]:
+        """Return the summaries of the newest captures."""
+        summaries = []
+        for name in self._names()[:limit]:
+            try:
+                with open(os.path.join(self.directory, name + ".json"), encoding="utf-8") as f:
+                    summaries.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logging.warning("Unreadable profile summary %s: %s", name, e)
+        return summaries
+
+def top_functions(profile: cProfile.Profile, limit: int = TOP_FUNCTIONS) -> list[dict]:
+    """Return the functions with the highest cumulative time in a profile."""
+    stats = pstats.Stats(profile, stream=io.StringIO())
+    rows = []
+    for (filename, line, func), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f"{os.path.basename(filename)}:{line}({func})",
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        })
+    rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+    return rows[:limit]
@@ -0,0 +1,55 @@
+"""
+profiler_test.py
+Tests for on-demand request profiling.
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from profiler import ProfileStore
+
+class TestProfileStore(unittest.TestCase):
+    """Test cases for capturing, listing and pruning profiles."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = ProfileStore(self.tmpdir.name, keep=2)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def capture(self, route):
+        started = time.perf_counter()
+        profile = self.store.start()
+        self.assertIsNotNone(profile)
+        sorted(range(20000), key=lambda n: -n)
+        return self.store.stop(profile, "GET", route, started)
+
+    def test_capture_and_list(self):
+        """
+        Test that a capture writes a .prof file and a summary with top functions.
+        """
+        name = self.capture("/account/<int:acc_id>")
+        self.assertIn("GET-account_int_acc_id", name)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, name + ".prof")))
+
+        [summary] = self.store.recent()
+        self.assertEqual(summary['route'], "/account/<int:acc_id>")
+        self.assertTrue(any("<lambda>" in row['function'] for row in summary['top']))
+
+    def test_one_capture_at_a_time_and_pruning(self):
+        """
+        Test that overlapping captures are refused and old captures are deleted.
+        """
+        profile = self.store.start()
+        self.assertIsNone(self.store.start())
+        self.store.stop(profile, "GET", "/first", time.perf_counter())
+
+        self.capture("/second")
+        self.capture("/third")
+        self.assertEqual([p['route'] for p in self.store.recent()], ["/third", "/second"])
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 4)
+
+if __name__ == '__main__':
+    unittest.main()
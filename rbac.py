@@ -0,0 +1,35 @@
+"""
+rbac.py
+Role-based access control decorator shared by the HTML routes and the JSON API.
+"""
+
+import logging
+from functools import wraps
+from flask import flash, jsonify, redirect, request, session
+
+# Requests under this prefix get JSON errors instead of a flash message and redirect
+API_PREFIX = "/api/"
+
+def requires_role(allowed_roles):
+    """Role-Based Access Control Decorator"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            api = request.path.startswith(API_PREFIX)
+            if 'user_id' not in session:
+                if api:
+                    return jsonify(error="authentication required"), 401
+                flash('Authentication required', 'error')
+                return redirect('/login')
+                
+            user_role = session.get('role_id')
+            if user_role not in allowed_roles:
+                logging.warning(f"Unauthorized access attempt by {session.get('username')} to {request.path}")
+                if api:
+                    return jsonify(error="insufficient privileges"), 403
+                flash('Insufficient privileges', 'error')
+                return redirect('/home')
+                
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
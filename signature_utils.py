@@ -2,6 +2,8 @@ import os
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding, rsa
 from cryptography.exceptions import InvalidSignature
+import metrics
+import tracing
 
 PRIVATE_KEY_FILE = "signature_private_key.pem"
 PUBLIC_KEY_FILE = "signature_public_key.pem"
@@ -53,6 +55,8 @@ def load_public_key():
     with open(PUBLIC_KEY_FILE, "rb") as f:
         return serialization.load_pem_public_key(f.read())
     
+@tracing.traced("sign")
+@metrics.timed("crypto_operation_seconds", op="sign")
 def sign_message(message: str) -> bytes:
     """Signs a string message using a private key"""
 
@@ -68,6 +72,8 @@ def sign_message(message: str) -> bytes:
 
     return signature
 
+@tracing.traced("verify")
+@metrics.timed("crypto_operation_seconds", op="verify")
 def verify_signature(message: str, signature: bytes) -> bool:
     """Verifies the signature of a string message using the public key"""
 
@@ -0,0 +1,219 @@
+"""
+sql_monitor.py
+Opt-in SQLite statement instrumentation for the Database class.
+
+Connections created with InstrumentedConnection time every statement
+(execute plus the fetches that follow it). Statements slower than the
+threshold are kept in a ring buffer together with their EXPLAIN QUERY PLAN
+output and the Database method that issued them. In strict mode any
+statement whose plan scans a whole table raises FullScanError, so tests can
+catch hot queries that lost their index.
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+import metrics
+
+FULL_SCAN_PATTERN = re.compile(r'^SCAN (?:TABLE )?(?!CONSTANT ROW)(\w+)(?!.*USING (?:COVERING )?INDEX)')
+PLAN_CACHE_SIZE = 512
+
+class FullScanError(AssertionError):
+    """Raised in strict mode when a statement's plan scans an entire table."""
+
+class QueryMonitor:
+    """
+    Collects slow statements from instrumented connections.
+
+    Attributes:
+        threshold_ms (float): Statements at or above this duration are recorded
+        fail_on_full_scan (bool): Raise FullScanError for full table scans
+        allow_full_scan (set): Caller names (e.g. "Database.get_audit_logs") allowed to scan
+        statements (int): Number of statements timed
+    """
+
+    def __init__(self, threshold_ms: float = 50.0, capacity: int = 100,
+                 fail_on_full_scan: bool = False, allow_full_scan: Iterable[str] = ()):
+        self.threshold_ms = threshold_ms
+        self.fail_on_full_scan = fail_on_full_scan
+        self.allow_full_scan = set(allow_full_scan)
+        self.statements = 0
+        self._slow = deque(maxlen=capacity)
+        self._plans: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+
+    def slow_queries(self) -> list[dict]:
+        """Return the recorded slow statements, newest first."""
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slow.clear()
+
+    def explain(self, conn: sqlite3.Connection, sql: str, params=()) -> list[str]:
+        """Return the EXPLAIN QUERY PLAN detail lines for a statement (cached per SQL text)."""
+        plan = self._plans.get(sql)
+        if plan is not None:
+            metrics.cache_hit("sql_plan")
+        else:
+            metrics.cache_miss("sql_plan")
+            try:
+                rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params).fetchall()
+                plan = [row[3] for row in rows]
+            except sqlite3.Error:
+                plan = []  # VACUUM, PRAGMA and friends have no query plan
+            if len(self._plans) >= PLAN_CACHE_SIZE:
+                self._plans.clear()
+            self._plans[sql] = plan
+        return plan
+
+    @staticmethod
+    def full_scans(plan: list[str]) -> list[str]:
+        """Return the tables a plan scans without an index."""
+        return [match.group(1) for match in map(FULL_SCAN_PATTERN.match, plan) if match]
+
+    def check_plan(self, conn: sqlite3.Connection, sql: str, params) -> None:
+        """Strict mode: raise if the statement scans a table and its caller is not allowed to."""
+        scanned = self.full_scans(self.explain(conn, sql, params))
+        if not scanned:
+            return
+        caller = find_caller()
+        if caller not in self.allow_full_scan:
+            raise FullScanError(f"{caller} does a full scan of {', '.join(scanned)}: {sql.strip()}")
+
+    def record(self, conn: sqlite3.Connection, sql: str, params, duration_ms: float) -> dict:
+        """Store a slow statement with its plan and calling method."""
+        entry = {
+            'sql': " ".join(sql.split()),
+            'params': len(params) if params else 0,
+            'duration_ms': duration_ms,
+            'plan': self.explain(conn, sql, params) if params is not None else [],
+            'caller': find_caller(),
+            'at': time.time(),
+        }
+        with self._lock:
+            self._slow.append(entry)
+        return entry
+
+def find_caller() -> str:
+    """Name the first function outside this module on the current stack."""
+    frame = sys._getframe(1)
+    while frame and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+    if frame is None:
+        return "<unknown>"
+    return getattr(frame.f_code, "co_qualname", frame.f_code.co_name)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports statement and fetch time to the connection's monitor."""
+
+    _sql = None
+    _params = None
+    _elapsed = 0.0
+    _entry = None
+
+    def _finish(self, elapsed: float) -> None:
+        self._elapsed += elapsed
+        monitor = self.connection.monitor
+        duration_ms = self._elapsed * 1000
+        if self._entry is not None:
+            self._entry['duration_ms'] = duration_ms
+        elif duration_ms >= monitor.threshold_ms:
+            self._entry = monitor.record(self.connection, self._sql, self._params, duration_ms)
+
+    def _start(self, sql: str, params) -> None:
+        monitor = self.connection.monitor
+        monitor.statements += 1
+        if monitor.fail_on_full_scan and params is not None:
+            monitor.check_plan(self.connection, sql, params)
+        self._sql, self._params, self._elapsed, self._entry = sql, params, 0.0, None
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._finish(time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, None)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._finish(time.perf_counter() - started)
+
+    def executescript(self, sql_script):
+        self._start(sql_script, None)
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._finish(time.perf_counter() - started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            if self._sql is not None:
+                self._finish(time.perf_counter() - started)
+
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(*args, **kwargs)
+        finally:
+            if self._sql is not None:
+                self._finish(time.perf_counter() - started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            if self._sql is not None:
+                self._finish(time.perf_counter() - started)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection factory whose cursors are timed by ``monitor``."""
+
+    monitor: QueryMonitor = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+_default_monitor = None
+_default_lock = threading.Lock()
+
+def get_default_monitor() -> Optional[QueryMonitor]:
+    """
+    Return the process-wide monitor configured by the SLOW_QUERY_MS env var.
+
+    Instrumentation is off (None) unless SLOW_QUERY_MS is set.
+    """
+    global _default_monitor
+    threshold = os.getenv("SLOW_QUERY_MS")
+    if not threshold:
+        return None
+    with _default_lock:
+        if _default_monitor is None:
+            _default_monitor = QueryMonitor(threshold_ms=float(threshold))
+    return _default_monitor
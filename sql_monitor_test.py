@@ -0,0 +1,76 @@
+"""
+sql_monitor_test.py
+Strict-mode query plan checks for the Database hot paths.
+Fails if a per-request query falls back to a full table scan.
+"""
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import unittest
+from database_handler import Database, migrate_schema
+from encryption_utils import encrypt_string_with_file_key
+from sql_monitor import FullScanError, QueryMonitor
+
+# Admin-only and legacy lookups that are expected to read whole tables
+ALLOWED_FULL_SCANS = {
+    "Database.get_user_by_username",
+    "Database.get_user_by_email",
+    "Database.get_audit_logs",
+}
+
+class TestQueryPlans(unittest.TestCase):
+    """Test cases for slow-query recording and full-scan detection."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmpdir.name, "plans.db")
+        with sqlite3.connect(self.db_name) as conn:
+            conn.executescript("""
+                CREATE TABLE User (usrID TEXT PRIMARY KEY, usrName TEXT, email TEXT, password TEXT,
+                                   RoleID INTEGER, usrNameHash TEXT, emailHash TEXT);
+                CREATE TABLE Account (accID TEXT PRIMARY KEY, accValue TEXT, accType TEXT, usrID TEXT);
+                CREATE TABLE auditLog (ID INTEGER PRIMARY KEY AUTOINCREMENT, Operation TEXT, TableName TEXT,
+                                       oldValue TEXT, newValue TEXT, ChangedAt TEXT, signature TEXT);
+            """)
+            conn.execute(
+                "INSERT INTO User VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ("123", encrypt_string_with_file_key("planuser"), encrypt_string_with_file_key("plan@example.com"),
+                 "hash", 3, hashlib.sha256(b"planuser").hexdigest(), hashlib.sha256(b"plan@example.com").hexdigest())
+            )
+            migrate_schema(conn)
+        self.monitor = QueryMonitor(threshold_ms=0, fail_on_full_scan=True, allow_full_scan=ALLOWED_FULL_SCANS)
+        self.db = Database(self.db_name, query_monitor=self.monitor)
+        self.db.create_account("1234567890", "123", "Checking", 1000.0)
+        self.db.create_account("0987654321", "123", "Savings", 500.0)
+
+    def tearDown(self):
+        self.db.close_all_connections()
+        self.tmpdir.cleanup()
+
+    def test_hot_paths_use_indexes(self):
+        """
+        Test that login, dashboard and posting queries never scan a whole table.
+        """
+        self.assertIsNotNone(self.db.get_user_encrypted_search("planuser"))
+        self.assertIsNotNone(self.db.get_user_encrypted_email_search("plan@example.com"))
+        self.assertEqual(len(self.db.get_user_accounts("123")), 2)
+        self.assertEqual(self.db.deposit_to_account("1234567890", 10.0), [])
+        self.assertEqual(self.db.withdraw_from_account("1234567890", 5.0), [])
+        self.assertEqual(self.db.transfer_funds_by_account_number("1234567890", "0987654321", 1.0), [])
+
+    def test_unlisted_full_scan_fails(self):
+        self.monitor.allow_full_scan.clear()
+        with self.assertRaises(FullScanError):
+            self.db.get_user_by_username("planuser")
+
+    def test_slow_queries_record_plan_and_caller(self):
+        self.db.get_audit_logs()
+        latest = self.monitor.slow_queries()[0]
+        self.assertEqual(latest['caller'], "Database.get_audit_logs")
+        self.assertEqual(latest['sql'], "SELECT * FROM auditLog")
+        self.assertEqual(latest['plan'], ["SCAN auditLog"])
+
+if __name__ == '__main__':
+    unittest.main()
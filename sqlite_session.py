@@ -0,0 +1,214 @@
+"""
+sqlite_session.py
+Server-side Flask sessions stored in a WAL-mode SQLite table.
+
+Each session is one row keyed by a random session ID (the only thing in the
+cookie) with its data serialized as tagged JSON and an expiry time. An index
+on expiresAt lets a background sweeper delete expired rows without scanning
+the table, and lets every process sharing the file see the same sessions.
+
+Rows are only written when the session changed, or when less than half of
+its lifetime is left (so active sessions don't expire but reads don't cost a
+write). An optional in-process LRU keeps hot sessions decoded; entries are
+trusted for ``lru_ttl`` seconds, after which the row is read again so other
+processes' changes show up.
+
+Enable with SESSION_TYPE="sqlite" (see flask_main); SESSION_SQLITE_PATH,
+SESSION_LRU_SIZE and SESSION_SWEEP_INTERVAL tune it.
+"""
+
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+import metrics
+
+SWEEP_INTERVAL = 300.0
+LRU_TTL = 2.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS session (
+    sid TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expiresAt REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_session_expires ON session (expiresAt);
+"""
+
+class SqliteSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its ID, expiry and whether it was changed."""
+
+    def __init__(self, initial=None, sid: str | None = None, expires: float = 0.0, new: bool = False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires = expires
+        self.new = new
+        self.modified = False
+
+class SqliteSessionInterface(SessionInterface):
+    """
+    Flask session interface over one SQLite file.
+
+    Attributes:
+        db_path (str): Session database file
+        lru_size (int): Decoded sessions cached in this process (0 disables the cache)
+        lru_ttl (float): Seconds a cached session is used without re-reading its row
+        sweep_interval (float): Seconds between expired-session sweeps
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, db_path: str = "Sessions.db", lru_size: int = 0, lru_ttl: float = LRU_TTL,
+                 sweep_interval: float = SWEEP_INTERVAL):
+        self.db_path = db_path
+        self.lru_size = lru_size
+        self.lru_ttl = lru_ttl
+        self.sweep_interval = sweep_interval
+        self.local = threading.local()
+        self._lru = OrderedDict()
+        self._lru_lock = threading.Lock()
+        self._sweeper = None
+        self._sweeper_lock = threading.Lock()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    # LRU of sid -> (data, expires, cached_at)
+
+    def _cache_get(self, sid: str) -> tuple[dict, float] | None:
+        if not self.lru_size:
+            return None
+        with self._lru_lock:
+            entry = self._lru.get(sid)
+            if entry is None or time.monotonic() - entry[2] > self.lru_ttl:
+                return None
+            self._lru.move_to_end(sid)
+            return entry[0], entry[1]
+
+    def _cache_put(self, sid: str, data: dict, expires: float) -> None:
+        if not self.lru_size:
+            return
+        with self._lru_lock:
+            self._lru[sid] = (dict(data), expires, time.monotonic())
+            self._lru.move_to_end(sid)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _cache_drop(self, sid: str) -> None:
+        with self._lru_lock:
+            self._lru.pop(sid, None)
+
+    def load(self, sid: str) -> tuple[dict, float] | None:
+        """Data and expiry of a live session, or None."""
+        cached = self._cache_get(sid)
+        if cached is not None:
+            metrics.cache_hit("session")
+            data, expires = cached
+            return (dict(data), expires) if expires > time.time() else None
+        metrics.cache_miss("session")
+        row = self.connection().execute(
+            "SELECT data, expiresAt FROM session WHERE sid = ? AND expiresAt > ?", (sid, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            data = self.serializer.loads(row[0])
+        except ValueError as e:
+            logging.warning("Discarding unreadable session %s...: %s", sid[:8], e)
+            return None
+        self._cache_put(sid, data, row[1])
+        return data, row[1]
+
+    def store(self, sid: str, data: dict, expires: float) -> None:
+        self.connection().execute(
+            "INSERT OR REPLACE INTO session (sid, data, expiresAt) VALUES (?, ?, ?)",
+            (sid, self.serializer.dumps(dict(data)), expires)
+        )
+        self._cache_put(sid, data, expires)
+
+    def delete(self, sid: str) -> None:
+        self.connection().execute("DELETE FROM session WHERE sid = ?", (sid,))
+        self._cache_drop(sid)
+
+    def sweep(self, now: float | None = None) -> int:
+        """Delete expired sessions using the expiresAt index."""
+        now = time.time() if now is None else now
+        removed = self.connection().execute("DELETE FROM session WHERE expiresAt <= ?", (now,)).rowcount
+        if removed:
+            with self._lru_lock:
+                for sid in [sid for sid, entry in self._lru.items() if entry[1] <= now]:
+                    del self._lru[sid]
+        return removed
+
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is not None:
+            return
+        with self._sweeper_lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="session-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    logging.info("Swept %d expired sessions", removed)
+            except sqlite3.Error as e:
+                logging.error("Session sweep failed: %s", e)
+
+    def open_session(self, app, request) -> SqliteSession:
+        self._ensure_sweeper()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            loaded = self.load(sid)
+            if loaded is not None:
+                return SqliteSession(loaded[0], sid=sid, expires=loaded[1])
+        return SqliteSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session: SqliteSession, response) -> None:
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        # Rewrite unchanged sessions only when they are past half their lifetime
+        if not session.modified and session.expires - now > lifetime / 2:
+            return
+        session.expires = now + lifetime
+        self.store(session.sid, session, session.expires)
+
+        response.vary.add("Cookie")
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
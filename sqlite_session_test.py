@@ -0,0 +1,106 @@
+"""
+sqlite_session_test.py
+Tests for the SQLite-backed Flask session interface.
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from flask import Flask, session
+from sqlite_session import SqliteSessionInterface
+
+def make_app(interface: SqliteSessionInterface) -> Flask:
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.session_interface = interface
+
+    @app.route("/set/<value>")
+    def set_value(value):
+        session['value'] = value
+        return "ok"
+
+    @app.route("/get")
+    def get_value():
+        return session.get('value', "none")
+
+    @app.route("/clear")
+    def clear():
+        session.clear()
+        return "ok"
+
+    return app
+
+class TestSqliteSession(unittest.TestCase):
+    """Test cases for storing, sharing, expiring and caching sessions."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "sessions.db")
+        self.interface = SqliteSessionInterface(self.path)
+
+    def tearDown(self):
+        self.interface.connection().close()
+        self.tmpdir.cleanup()
+
+    def rows(self):
+        return self.interface.connection().execute("SELECT sid, expiresAt FROM session").fetchall()
+
+    def test_round_trip_and_clear(self):
+        """
+        Test that only the session ID is in the cookie and clearing the session deletes its row.
+        """
+        client = make_app(self.interface).test_client()
+        client.get("/set/secret-value")
+        cookie = client.get_cookie("session")
+        self.assertNotIn("secret-value", cookie.value)
+        self.assertEqual(client.get("/get").data, b"secret-value")
+        self.assertEqual(len(self.rows()), 1)
+
+        client.get("/clear")
+        self.assertEqual(self.rows(), [])
+        self.assertEqual(client.get("/get").data, b"none")
+
+    def test_shared_between_processes_and_reads_do_not_write(self):
+        """
+        Test that another interface on the same file sees the session and plain reads skip the write.
+        """
+        client = make_app(self.interface).test_client()
+        client.get("/set/shared")
+        other = SqliteSessionInterface(self.path)
+        other_client = make_app(other).test_client()
+        other_client.set_cookie("session", client.get_cookie("session").value)
+        try:
+            before = self.rows()
+            self.assertEqual(other_client.get("/get").data, b"shared")
+            self.assertEqual(self.rows(), before)
+            self.assertEqual(client.get("/get").data, b"shared")
+        finally:
+            other.connection().close()
+
+    def test_expiry_and_sweep(self):
+        """
+        Test that expired sessions are not loaded and are removed by the sweeper.
+        """
+        client = make_app(self.interface).test_client()
+        client.get("/set/old")
+        self.interface.connection().execute("UPDATE session SET expiresAt = ?", (time.time() - 1,))
+        self.assertEqual(client.get("/get").data, b"none")
+        self.assertEqual(self.interface.sweep(), 1)
+        self.assertEqual(self.rows(), [])
+
+    def test_lru_serves_hot_sessions(self):
+        """
+        Test that cached sessions skip the database until their entry is too old.
+        """
+        interface = SqliteSessionInterface(self.path, lru_size=2, lru_ttl=60)
+        client = make_app(interface).test_client()
+        client.get("/set/cached")
+        interface.connection().execute("UPDATE session SET data = ?", ('{"value": "changed"}',))
+        self.assertEqual(client.get("/get").data, b"cached")
+        interface.lru_ttl = 0
+        self.assertEqual(client.get("/get").data, b"changed")
+        interface.connection().close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,329 @@
+"""
+stress_transfers.py
+Concurrency stress test for transfers, deposits and withdrawals.
+
+Worker processes (each running several threads, each thread with its own
+SQLite connection) hammer one shared database file with a mix of:
+
+    transfer       Database.transfer_funds_by_account_number (one transaction)
+    user_transfer  UserManager.transfer_funds_by_account_number (withdraw, deposit,
+                   compensating deposit on failure)
+    deposit        Database.deposit_to_account
+    withdraw       Database.withdraw_from_account
+
+Operations that fail with "database is locked" are retried with backoff.
+Afterwards two invariants are checked:
+
+    money  final total == initial total + successful deposits - successful withdrawals
+    audit  the auditLog rows written during the run add up to the same net change,
+           and each row moves a balance by an amount the workers actually used
+
+Usage:
+    python stress_transfers.py --users 200 --processes 2 --threads 8 --operations 2000
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+import user_management
+from database_handler import Database
+from encryption_utils import decrypt_string_with_file_key
+from generate_data import account_id_for, generate, user_id_for
+
+DEFAULT_MIX = "transfer=4,user_transfer=2,deposit=2,withdraw=2"
+ACCOUNTS_PER_USER = 2
+BALANCE_PATTERN = re.compile(r"Balance: (-?[\d.e+-]+)")
+LOCKED = "database is locked"
+
+def _lock_wait() -> tuple[float, int]:
+    """Seconds spent waiting for the write lock and transactions started, from this process's metrics."""
+    seconds, count = 0.0, 0
+    for (name, _), series in metrics.REGISTRY.snapshot().items():
+        if name == "sqlite_lock_wait_seconds":
+            seconds += series[-2]
+            count += series[-1]
+    return seconds, count
+
+def _new_stats() -> dict:
+    return {'attempts': 0, 'ok': 0, 'rejected': 0, 'locked': 0, 'retries': 0, 'errors': 0, 'seconds': 0.0}
+
+class StressWorker:
+    """Runs one share of the operations on the threads of one process."""
+
+    def __init__(self, db_path: str, users: int, mix: dict[str, int], retries: int, seed: int):
+        self.db = Database(db_path)
+        # UserManager goes through the module-level db_manager; close() puts it back
+        self._original_db_manager = user_management.db_manager
+        user_management.db_manager = self.db
+        self.user_manager = user_management.UserManager()
+        self.users = users
+        self.mix = mix
+        self.retries = retries
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.stats = defaultdict(_new_stats)
+        self.deposited = 0.0
+        self.withdrawn = 0.0
+        self.amounts = set()
+        self.lock_wait_before = _lock_wait()
+
+    def account(self, rng: random.Random, slot: int | None = None) -> tuple[int, str]:
+        user = rng.randrange(self.users)
+        slot = rng.randrange(ACCOUNTS_PER_USER) if slot is None else slot
+        return user, account_id_for(user, slot, ACCOUNTS_PER_USER)
+
+    def plan(self, operation: str, rng: random.Random) -> tuple:
+        """Pick the call, its arguments and the amount for one operation."""
+        amount = float(rng.randint(1, 2000)) / 100
+        if operation == "deposit":
+            return self.db.deposit_to_account, (self.account(rng)[1], amount), amount
+        if operation == "withdraw":
+            return self.db.withdraw_from_account, (self.account(rng)[1], amount), amount
+        user, source = self.account(rng, 0)
+        _, target = self.account(rng, 1)
+        if operation == "transfer":
+            return self.db.transfer_funds_by_account_number, (source, target, amount), amount
+        return self.user_manager.transfer_funds_by_account_number, (user_id_for(user), source, target, amount), amount
+
+    def run_one(self, operation: str, rng: random.Random) -> None:
+        func, args, amount = self.plan(operation, rng)
+        retries = locked = 0
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                errors = func(*args)
+            except Exception as e:
+                errors = [f"{type(e).__name__}: {e}"]
+            if not any(LOCKED in error for error in errors):
+                break
+            locked += 1
+            if attempt < self.retries:
+                retries += 1
+                time.sleep(min(1.0, 0.01 * 2 ** attempt) * rng.random())
+        elapsed = time.perf_counter() - started
+
+        with self.lock:
+            totals = self.stats[operation]
+            totals['attempts'] += 1
+            totals['retries'] += retries
+            totals['locked'] += locked
+            totals['seconds'] += elapsed
+            self.amounts.add(round(amount, 2))
+            if not errors:
+                totals['ok'] += 1
+                if operation == "deposit":
+                    self.deposited += amount
+                elif operation == "withdraw":
+                    self.withdrawn += amount
+            elif all(error.startswith("Error:") for error in errors):
+                totals['rejected'] += 1  # insufficient funds and other business rule refusals
+            else:
+                totals['errors'] += 1
+
+    def run(self, threads: int, operations: int) -> dict:
+        operations_list, weights = zip(*self.mix.items())
+
+        def worker(index: int, count: int) -> None:
+            rng = random.Random(self.seed * 104729 + index)
+            for _ in range(count):
+                self.run_one(rng.choices(operations_list, weights)[0], rng)
+            self.db.close_all_connections()
+
+        share, extra = divmod(operations, threads)
+        pool = [threading.Thread(target=worker, args=(i, share + (i < extra))) for i in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        return self.result()
+
+    def close(self) -> None:
+        user_management.db_manager = self._original_db_manager
+
+    def result(self) -> dict:
+        wait, transactions = (now - before for now, before in zip(_lock_wait(), self.lock_wait_before))
+        return {
+            'stats': dict(self.stats),
+            'deposited': self.deposited,
+            'withdrawn': self.withdrawn,
+            'amounts': sorted(self.amounts),
+            'lock_wait_seconds': wait,
+            'transactions': transactions,
+        }
+
+def _run_process(db_path: str, users: int, mix: dict, retries: int, seed: int, threads: int, operations: int) -> dict:
+    worker = StressWorker(db_path, users, mix, retries, seed)
+    try:
+        return worker.run(threads, operations)
+    finally:
+        worker.close()
+
+def money_total(conn: sqlite3.Connection) -> float:
+    return sum(float(decrypt_string_with_file_key(value)) for (value,) in conn.execute("SELECT accValue FROM Account"))
+
+def audit_deltas(conn: sqlite3.Connection, after_id: int) -> list[float]:
+    """Balance change recorded by each audit row with ID > after_id."""
+    deltas = []
+    for old, new in conn.execute("SELECT oldValue, newValue FROM auditLog WHERE ID > ? ORDER BY ID", (after_id,)):
+        old_balance = float(BALANCE_PATTERN.search(decrypt_string_with_file_key(old)).group(1))
+        new_balance = float(BALANCE_PATTERN.search(decrypt_string_with_file_key(new)).group(1))
+        deltas.append(round(new_balance - old_balance, 2))
+    return deltas
+
+def stress(db_path: str, users: int, processes: int = 2, threads: int = 4, operations: int = 1000,
+           mix: dict[str, int] | None = None, retries: int = 5, seed: int = 0) -> dict:
+    """
+    Run the stress mix against ``db_path`` and check the invariants.
+
+    Args:
+        db_path: Database built by generate_data with ``users`` users, two accounts each
+        users: Number of users in the database
+        processes: Worker processes (1 runs the threads in this process)
+        threads: Threads per process
+        operations: Total operations across all workers
+        mix: Operation weights (see DEFAULT_MIX)
+        retries: Retries for operations that hit "database is locked"
+        seed: Seed for accounts and amounts
+
+    Returns:
+        dict: Throughput, per-operation counts, lock statistics and invariant results
+    """
+    mix = mix or parse_mix(DEFAULT_MIX)
+    with sqlite3.connect(db_path) as conn:
+        initial = money_total(conn)
+        last_audit_id = conn.execute("SELECT COALESCE(MAX(ID), 0) FROM auditLog").fetchone()[0]
+
+    share, extra = divmod(operations, processes)
+    started = time.perf_counter()
+    if processes == 1:
+        results = [_run_process(db_path, users, mix, retries, seed, threads, operations)]
+    else:
+        with ProcessPoolExecutor(processes) as executor:
+            futures = [executor.submit(_run_process, db_path, users, mix, retries, seed * 31 + p,
+                                       threads, share + (p < extra)) for p in range(processes)]
+            results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    stats = defaultdict(_new_stats)
+    amounts = set()
+    deposited = withdrawn = lock_wait = 0.0
+    transactions = 0
+    for result in results:
+        for operation, values in result['stats'].items():
+            for key, value in values.items():
+                stats[operation][key] += value
+        amounts.update(result['amounts'])
+        deposited += result['deposited']
+        withdrawn += result['withdrawn']
+        lock_wait += result['lock_wait_seconds']
+        transactions += result['transactions']
+
+    with sqlite3.connect(db_path) as conn:
+        final = money_total(conn)
+        deltas = audit_deltas(conn, last_audit_id)
+
+    expected = initial + deposited - withdrawn
+    attempts = sum(values['attempts'] for values in stats.values())
+    unexplained = [delta for delta in deltas if abs(delta) not in amounts]
+    return {
+        'processes': processes,
+        'threads': threads,
+        'elapsed_s': elapsed,
+        'operations': attempts,
+        'throughput_ops': attempts / elapsed if elapsed else 0.0,
+        'per_operation': dict(stats),
+        'locked_rate': sum(v['locked'] for v in stats.values()) / attempts if attempts else 0.0,
+        'retries': sum(v['retries'] for v in stats.values()),
+        'lock_wait_s': lock_wait,
+        'transactions': transactions,
+        'money': {
+            'initial': round(initial, 2),
+            'deposited': round(deposited, 2),
+            'withdrawn': round(withdrawn, 2),
+            'expected': round(expected, 2),
+            'final': round(final, 2),
+            'ok': abs(final - expected) < 0.005,
+        },
+        'audit': {
+            'rows': len(deltas),
+            'net_change': round(sum(deltas), 2),
+            'balance_change': round(final - initial, 2),
+            'unexplained_rows': len(unexplained),
+            'by_delta': dict(Counter(deltas).most_common(5)),
+            'ok': not unexplained and abs(sum(deltas) - (final - initial)) < 0.005,
+        },
+    }
+
+def parse_mix(spec: str) -> dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        if part.strip():
+            name, _, weight = part.partition("=")
+            mix[name.strip()] = int(weight or 1)
+    unknown = set(mix) - {"transfer", "user_transfer", "deposit", "withdraw"}
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+def print_report(report: dict) -> None:
+    print(f"{'operation':14} {'attempts':>8} {'ok':>6} {'rejected':>8} {'errors':>6} {'locked':>6} {'retries':>7} {'avg ms':>8}")
+    for operation, values in sorted(report['per_operation'].items()):
+        average = values['seconds'] / values['attempts'] * 1000 if values['attempts'] else 0.0
+        print(f"{operation:14} {values['attempts']:8d} {values['ok']:6d} {values['rejected']:8d} {values['errors']:6d} "
+              f"{values['locked']:6d} {values['retries']:7d} {average:8.1f}")
+    print(f"{report['operations']} operations in {report['elapsed_s']:.1f}s ({report['throughput_ops']:.1f} ops/s) on "
+          f"{report['processes']}x{report['threads']} workers; locked rate {report['locked_rate']:.2%}, "
+          f"{report['retries']} retries, {report['lock_wait_s']:.2f}s waiting for the write lock "
+          f"over {report['transactions']} transactions")
+    money, audit = report['money'], report['audit']
+    print(f"money: {money['initial']:.2f} + {money['deposited']:.2f} - {money['withdrawn']:.2f} = "
+          f"{money['expected']:.2f}; final {money['final']:.2f} -> {'OK' if money['ok'] else 'MISMATCH'}")
+    print(f"audit: {audit['rows']} rows, net {audit['net_change']:.2f} vs balances {audit['balance_change']:.2f}, "
+          f"{audit['unexplained_rows']} unexplained -> {'OK' if audit['ok'] else 'MISMATCH'}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent transfer stress test with invariant checks")
+    parser.add_argument("--db", help="Database from generate_data.py (default: generate a temporary one)")
+    parser.add_argument("--users", type=int, default=100, help="Users to generate (or present in --db)")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4, help="Threads per process")
+    parser.add_argument("--operations", type=int, default=1000, help="Total operations")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted operation mix")
+    parser.add_argument("--retries", type=int, default=5, help="Retries for 'database is locked'")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    tmpdir = None
+    db_path = args.db
+    if db_path is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmpdir.name, "stress.db")
+        generate(db_path, users=args.users, accounts_per_user=ACCOUNTS_PER_USER, bcrypt_rounds=4,
+                 sign_audit=False, seed=args.seed)
+
+    report = stress(db_path, args.users, args.processes, args.threads, args.operations,
+                    parse_mix(args.mix), args.retries, args.seed)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if tmpdir is not None:
+        tmpdir.cleanup()
+    return 0 if report['money']['ok'] and report['audit']['ok'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""
+stress_transfers_test.py
+Short concurrent run of the transfer stress test with its invariant checks.
+"""
+
+import os
+import tempfile
+import unittest
+from generate_data import generate
+from stress_transfers import parse_mix, stress
+
+class TestStressTransfers(unittest.TestCase):
+    """Test cases for the transfer stress test."""
+
+    def test_mix_parsing(self):
+        """
+        Test that unknown operations are rejected.
+        """
+        self.assertEqual(parse_mix("transfer=3,deposit"), {'transfer': 3, 'deposit': 1})
+        with self.assertRaises(ValueError):
+            parse_mix("transfer=1,embezzle=1")
+
+    def test_threaded_run_keeps_invariants(self):
+        """
+        Test that concurrent transfers, deposits and withdrawals conserve money and match the audit log.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, "stress.db")
+            generate(db_path, users=6, accounts_per_user=2, admins=0, bcrypt_rounds=4, sign_audit=False, workers=1)
+            report = stress(db_path, users=6, processes=1, threads=3, operations=24)
+
+        self.assertEqual(report['operations'], 24)
+        self.assertTrue(report['money']['ok'], report['money'])
+        self.assertTrue(report['audit']['ok'], report['audit'])
+        self.assertEqual(sum(stats['errors'] for stats in report['per_operation'].values()), 0)
+        self.assertGreater(report['audit']['rows'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+totp.py
+RFC 6238 time-based one-time passwords (HMAC-SHA1, 6 digits, 30 second steps).
+
+Compatible with the common authenticator apps: the secret is shared as
+base32 (or as an otpauth:// URI), and a code is accepted if it matches any
+step within WINDOW steps of the current time to allow for clock drift.
+"""
+
+import base64
+import hashlib
+import hmac
+import secrets
+import struct
+import time
+from urllib.parse import quote, urlencode
+
+DIGITS = 6
+STEP_SECONDS = 30
+WINDOW = 1
+ISSUER = "CSC3028 Banking"
+
+def generate_secret(length: int = 20) -> str:
+    """New random secret as unpadded base32 (160 bits by default, as RFC 4226 recommends)."""
+    return base64.b32encode(secrets.token_bytes(length)).decode().rstrip("=")
+
+def _key(secret: str) -> bytes:
+    secret = secret.replace(" ", "").upper()
+    return base64.b32decode(secret + "=" * (-len(secret) % 8))
+
+def hotp(secret: str, counter: int, digits: int = DIGITS) -> str:
+    """RFC 4226 HOTP value for ``counter``."""
+    digest = hmac.new(_key(secret), struct.pack(">Q", counter), hashlib.sha1).digest()
+    offset = digest[-1] & 0x0F
+    value = struct.unpack(">I", digest[offset:offset + 4])[0] & 0x7FFFFFFF
+    return str(value % 10 ** digits).zfill(digits)
+
+def time_step(now: float | None = None) -> int:
+    return int((time.time() if now is None else now) // STEP_SECONDS)
+
+def totp(secret: str, now: float | None = None) -> str:
+    """Current code for ``secret``."""
+    return hotp(secret, time_step(now))
+
+def match_step(secret: str, code: str, now: float | None = None, window: int = WINDOW,
+               last_step: int | None = None) -> int | None:
+    """
+    Find the time step a code belongs to.
+
+    Args:
+        secret: Base32 secret
+        code: Code entered by the user
+        now: Time to verify at (defaults to the current time)
+        window: Steps accepted either side of the current one
+        last_step: Last step already used; it and older steps are refused (replay protection)
+
+    Returns:
+        int | None: The matching step, or None if the code is wrong, outside the window or replayed
+    """
+    code = (code or "").strip()
+    if len(code) != DIGITS or not code.isdigit():
+        return None
+    current = time_step(now)
+    matched = None
+    # Check every step in the window so the comparison time doesn't reveal which one matched
+    for step in range(current - window, current + window + 1):
+        if hmac.compare_digest(hotp(secret, step), code) and matched is None:
+            matched = step
+    if matched is None or (last_step is not None and matched <= last_step):
+        return None
+    return matched
+
+def provisioning_uri(secret: str, account: str, issuer: str = ISSUER) -> str:
+    """otpauth:// URI for authenticator apps (usually shown as a QR code)."""
+    query = urlencode({'secret': secret, 'issuer': issuer, 'digits': DIGITS, 'period': STEP_SECONDS})
+    return f"otpauth://totp/{quote(issuer)}:{quote(account)}?{query}"
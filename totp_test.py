@@ -0,0 +1,137 @@
+"""
+totp_test.py
+Tests for RFC 6238 codes and the TOTP login flow.
+"""
+
+import base64
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+import totp
+import user_management
+from database_handler import Database
+from generate_data import DEFAULT_PASSWORD, generate, user_id_for, username_for
+from load_harness import InProcessApp
+from user_management import UserManager
+
+# RFC 6238 appendix B SHA-1 secret
+RFC_SECRET = base64.b32encode(b"12345678901234567890").decode()
+
+class TestTotp(unittest.TestCase):
+    """Test cases for code generation, drift window and replay protection."""
+
+    def test_rfc_vectors(self):
+        """
+        Test the RFC 4226 and RFC 6238 reference values.
+        """
+        self.assertEqual(totp.hotp(RFC_SECRET, 0), "755224")
+        self.assertEqual(totp.hotp(RFC_SECRET, 9), "520489")
+        self.assertEqual(totp.hotp(RFC_SECRET, totp.time_step(59), digits=8), "94287082")
+        self.assertEqual(totp.hotp(RFC_SECRET, totp.time_step(1111111109), digits=8), "07081804")
+
+    def test_window_and_replay(self):
+        """
+        Test that one step of drift is accepted and used steps are refused.
+        """
+        now = 1_700_000_000
+        step = totp.time_step(now)
+        previous = totp.totp(RFC_SECRET, now - 30)
+        self.assertEqual(totp.match_step(RFC_SECRET, previous, now), step - 1)
+        self.assertIsNone(totp.match_step(RFC_SECRET, totp.totp(RFC_SECRET, now - 90), now))
+        self.assertIsNone(totp.match_step(RFC_SECRET, previous, now, last_step=step - 1))
+        self.assertIsNone(totp.match_step(RFC_SECRET, "12345", now))
+        self.assertTrue(totp.provisioning_uri(RFC_SECRET, "alice").startswith("otpauth://totp/"))
+
+class TestTotpLogin(unittest.TestCase):
+    """Test cases for logging in with an authenticator app instead of an emailed code."""
+
+    def setUp(self):
+        user_management.totp_throttle.reset(str(user_id_for(0)))
+
+    def test_enrolled_user_logs_in_with_totp(self):
+        """
+        Test that an enrolled user gets no email, logs in with a TOTP code, and cannot reuse it.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, "totp.db")
+            generate(db_path, users=1, accounts_per_user=1, admins=0, bcrypt_rounds=4, sign_audit=False, workers=1)
+            target = InProcessApp(db_path)
+            try:
+                manager = UserManager()
+                secret = manager.begin_totp_enrollment()
+                self.assertFalse(manager.confirm_totp_enrollment(user_id_for(0), secret, "000000"))
+                # Enroll with the previous step's code so the current one is still unused
+                self.assertTrue(manager.confirm_totp_enrollment(user_id_for(0), secret, totp.totp(secret, time.time() - 30)))
+
+                client = target.app.test_client()
+                response = client.post("/login", data={'username': username_for(0), 'password': DEFAULT_PASSWORD})
+                self.assertIn("/verify-2fa", response.headers["Location"])
+                self.assertEqual(target.outbox, {})
+
+                code = totp.totp(secret)
+                self.assertEqual(client.post("/verify-2fa", data={'code': code}).status_code, 302)
+
+                replay = target.app.test_client()
+                replay.post("/login", data={'username': username_for(0), 'password': DEFAULT_PASSWORD})
+                response = replay.post("/verify-2fa", data={'code': code})
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(b"authenticator app", response.data)
+            finally:
+                target.close()
+
+    def test_wrong_codes_lock_totp(self):
+        """
+        Test that after TOTP_MAX_FAILURES wrong codes even the right code is refused, and success resets the count.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, "totp.db")
+            generate(db_path, users=1, accounts_per_user=1, admins=0, bcrypt_rounds=4, sign_audit=False, workers=1)
+            target = InProcessApp(db_path)
+            user_id = user_id_for(0)
+            try:
+                manager = UserManager()
+                secret = manager.begin_totp_enrollment()
+                self.assertTrue(manager.confirm_totp_enrollment(user_id, secret, totp.totp(secret, time.time() - 30)))
+                encrypted_secret, _ = target.database.get_totp(user_id)
+                wrong = str((int(totp.totp(secret)) + 500000) % 1000000).zfill(6)
+
+                for _ in range(user_management.TOTP_MAX_FAILURES - 1):
+                    self.assertFalse(manager._check_totp(user_id, encrypted_secret, None, wrong))
+                self.assertTrue(manager._check_totp(user_id, encrypted_secret, None, totp.totp(secret)))
+
+                for _ in range(user_management.TOTP_MAX_FAILURES):
+                    self.assertFalse(manager._check_totp(user_id, encrypted_secret, None, wrong))
+                self.assertFalse(manager._check_totp(user_id, encrypted_secret, None, totp.totp(secret, time.time() + 30)))
+            finally:
+                target.close()
+
+class TestTotpSchemaMigration(unittest.TestCase):
+    """Test cases for adding the TOTP columns to an existing database."""
+
+    def test_columns_are_added_only_by_the_explicit_migration(self):
+        """
+        Test that opening a connection leaves the schema alone and migrate_schema adds the columns once.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = os.path.join(tmpdir, "old.db")
+            with sqlite3.connect(db_path) as conn:
+                conn.execute("CREATE TABLE User (usrID INTEGER PRIMARY KEY, usrName TEXT, email TEXT, password TEXT, "
+                             "RoleID INTEGER, usrNameHash TEXT, emailHash TEXT)")
+                conn.execute("CREATE TABLE Account (accID TEXT PRIMARY KEY, accValue TEXT, accType TEXT, usrID INTEGER)")
+            conn.close()
+            db = Database(db_path)
+            try:
+                columns = lambda: {row[1] for row in db.get_connection().execute("PRAGMA table_info(User)")}
+                self.assertNotIn("totpSecret", columns())
+                self.assertEqual(db.get_totp(1), (None, None))
+                self.assertEqual(db.migrate_schema(), ["User.totpSecret", "User.totpLastStep", "idx_user_usrNameHash",
+                                                       "idx_user_emailHash", "idx_account_usrID"])
+                self.assertEqual(db.migrate_schema(), [])
+                self.assertIn("totpLastStep", columns())
+            finally:
+                db.close_all_connections()
+
+if __name__ == '__main__':
+    unittest.main()
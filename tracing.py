@@ -0,0 +1,174 @@
+"""
+tracing.py
+Lightweight per-request span tracing.
+
+A trace is started for each request when tracing is enabled. Code wrapped
+with span() or @traced records how long each phase took (Fernet, RSA signing,
+bcrypt, Database methods, SQLite lock waits, template rendering). The
+per-phase totals are sent back in a Server-Timing header and can be appended
+to a JSONL trace file.
+
+When no trace is active, span() returns a shared no-op context manager and
+@traced calls straight through, so the disabled cost is one ContextVar lookup.
+"""
+
+import json
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+MAX_SPANS = 500
+
+_active: ContextVar = ContextVar("trace", default=None)
+
+class Trace:
+    """
+    Spans recorded while handling one request.
+
+    Attributes:
+        name (str): What was traced, e.g. "POST /transfer"
+        phases (dict): Span name -> [total seconds, call count]
+        spans (list): (name, start offset, duration, depth) for the first MAX_SPANS spans
+    """
+
+    __slots__ = ("name", "started", "finished", "phases", "spans", "depth")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.finished = None
+        self.phases = {}
+        self.spans = []
+        self.depth = 0
+
+    def add(self, name: str, started: float, duration: float, depth: int) -> None:
+        phase = self.phases.get(name)
+        if phase is None:
+            self.phases[name] = [duration, 1]
+        else:
+            phase[0] += duration
+            phase[1] += 1
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append((name, started - self.started, duration, depth))
+
+    @property
+    def duration(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def server_timing(self) -> str:
+        """Render the phase totals as a Server-Timing header value (milliseconds)."""
+        entries = [
+            f'{name};dur={total * 1000:.2f};desc="{count}x"'
+            for name, (total, count) in sorted(self.phases.items(), key=lambda item: -item[1][0])
+        ]
+        entries.append(f"total;dur={self.duration * 1000:.2f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'at': time.time(),
+            'duration_ms': round(self.duration * 1000, 3),
+            'phases': {name: {'ms': round(total * 1000, 3), 'calls': count}
+                       for name, (total, count) in self.phases.items()},
+            'spans': [{'name': name, 'start_ms': round(start * 1000, 3),
+                       'ms': round(duration * 1000, 3), 'depth': depth}
+                      for name, start, duration, depth in self.spans],
+        }
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.trace.depth += 1
+
+    def __exit__(self, *exc):
+        trace = self.trace
+        trace.depth -= 1
+        trace.add(self.name, self.started, time.perf_counter() - self.started, trace.depth)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopSpan()
+
+def span(name: str):
+    """Context manager timing a phase of the current trace (no-op without one)."""
+    trace = _active.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name)
+
+def traced_template_class(base):
+    """Subclass of a Jinja template class whose render() is recorded as a "render" span.
+
+    The span wraps the call itself, so it is closed even when the template raises.
+    """
+    class TracedTemplate(base):
+        def render(self, *args, **kwargs):
+            with span("render"):
+                return super().render(*args, **kwargs)
+    return TracedTemplate
+
+def traced(name: str):
+    """Decorator that records each call of the function as a span."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _active.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            with _Span(trace, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def start_trace(name: str):
+    """Start a trace in the current context. Returns the token for end_trace()."""
+    return _active.set(Trace(name))
+
+def end_trace(token) -> Trace | None:
+    """Finish the trace started with ``token`` and restore the previous context."""
+    trace = _active.get()
+    _active.reset(token)
+    if trace is not None:
+        trace.finished = time.perf_counter()
+    return trace
+
+def current_trace() -> Trace | None:
+    return _active.get()
+
+class TraceWriter:
+    """Appends finished traces to a JSONL file, one object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(self, trace: Trace) -> None:
+        line = json.dumps(trace.to_dict()) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
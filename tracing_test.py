@@ -0,0 +1,101 @@
+"""
+tracing_test.py
+Tests for request span tracing and the Server-Timing breakdown.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+import tracing
+from encryption_utils import decrypt_string_with_file_key, encrypt_string_with_file_key
+
+class TestTracing(unittest.TestCase):
+    """Test cases for spans, traces and the JSONL writer."""
+
+    def test_spans_are_noops_without_a_trace(self):
+        """
+        Test that traced code runs normally when no trace is active.
+        """
+        self.assertIsNone(tracing.current_trace())
+        with tracing.span("idle") as span:
+            self.assertIsNone(span)
+        self.assertEqual(decrypt_string_with_file_key(encrypt_string_with_file_key("x")), "x")
+
+    def test_phases_and_server_timing(self):
+        """
+        Test that nested spans are aggregated per phase and rendered as Server-Timing.
+        """
+        token = tracing.start_trace("GET /test")
+        with tracing.span("db.lookup"):
+            encrypted = encrypt_string_with_file_key("secret")
+            decrypt_string_with_file_key(encrypted)
+            decrypt_string_with_file_key(encrypted)
+        trace = tracing.end_trace(token)
+
+        self.assertIsNone(tracing.current_trace())
+        self.assertEqual(trace.phases["decrypt"][1], 2)
+        self.assertEqual(trace.phases["encrypt"][1], 1)
+        depths = {name: depth for name, _, _, depth in trace.spans}
+        self.assertEqual(depths, {"encrypt": 1, "decrypt": 1, "db.lookup": 0})
+
+        header = trace.server_timing()
+        self.assertIn('decrypt;dur=', header)
+        self.assertIn('desc="2x"', header)
+        self.assertTrue(header.endswith(f"total;dur={trace.duration * 1000:.2f}"))
+
+    def test_trace_writer(self):
+        """
+        Test that finished traces are appended to the JSONL file.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "traces.jsonl")
+            writer = tracing.TraceWriter(path)
+            for name in ("GET /a", "GET /b"):
+                token = tracing.start_trace(name)
+                with tracing.span("render"):
+                    pass
+                writer.write(tracing.end_trace(token))
+            writer.close()
+
+            with open(path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual([r["name"] for r in records], ["GET /a", "GET /b"])
+        self.assertEqual(records[0]["phases"]["render"]["calls"], 1)
+
+class TestRequestTracing(unittest.TestCase):
+    """Test cases for the Flask request hooks."""
+
+    def setUp(self):
+        import flask_main
+        self.app = flask_main.app
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.app.config['TRACE_REQUESTS'] = False
+
+    def test_server_timing_header(self):
+        """
+        Test that traced requests report render time and untraced ones send no header.
+        """
+        self.assertNotIn('Server-Timing', self.client.get('/login').headers)
+
+        self.app.config['TRACE_REQUESTS'] = True
+        response = self.client.get('/login')
+        self.assertIn('render;dur=', response.headers['Server-Timing'])
+        self.assertIsNone(tracing.current_trace())
+
+    def test_render_span_closes_when_template_fails(self):
+        """
+        Test that a template raising during render still closes its span.
+        """
+        template = self.app.jinja_env.from_string("{{ 1 // 0 }}")
+        token = tracing.start_trace("render failure")
+        with self.assertRaises(ZeroDivisionError):
+            template.render()
+        trace = tracing.end_trace(token)
+        self.assertEqual(trace.depth, 0)
+        self.assertEqual(trace.phases['render'][1], 1)
+
+if __name__ == '__main__':
+    unittest.main()
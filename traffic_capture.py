@@ -0,0 +1,187 @@
+"""
+traffic_capture.py
+Opt-in WSGI middleware that records sanitized request traffic for replay.
+
+Each request becomes one compact JSON line: offset from the start of the
+capture, method, path, query, form fields, a salted hash of the session
+cookie (so replay can keep sessions apart without storing the cookie), the
+session role, response status and server-side duration. Passwords, 2FA codes
+and other secrets are replaced with REDACTED before anything is written.
+Usernames, emails, user IDs and account numbers are masked the same way the
+admin pages mask them (mask_username, mask_email, mask_account_number).
+
+A masked capture still shows the shape and timing of the traffic, but its
+logins and postings cannot be replayed. To replay against a synthetic
+generate_data database, keep identifiers with TRAFFIC_CAPTURE_IDENTIFIERS=1.
+Such a file holds real usernames, emails and account numbers and must be
+treated as sensitive, so never keep identifiers against production data.
+
+Enable it in flask_main with TRAFFIC_CAPTURE=path/to/capture.jsonl.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import parse_qsl
+
+from encryption_utils import mask_account_number, mask_email, mask_username
+
+REDACTED = "***"
+# Form/query fields never written to disk (matched case-insensitively as substrings)
+SECRET_FIELDS = ("password", "code", "secret", "token", "otp")
+# Personal identifiers written masked unless identifiers are kept (first match wins, same matching)
+IDENTIFIER_FIELDS = (
+    ("email", mask_email),
+    ("user", mask_username),
+    ("usr", mask_username),
+    ("accountid", mask_account_number),
+    ("acc_id", mask_account_number),
+)
+MAX_BODY = 64 * 1024
+ENVIRON_KEY = "traffic_capture.record"
+
+def is_secret(field: str) -> bool:
+    field = field.lower()
+    return any(secret in field for secret in SECRET_FIELDS)
+
+def mask_identifier(field: str, value: str) -> str:
+    """Mask ``value`` if ``field`` holds a personal identifier; other values pass through."""
+    field = field.lower()
+    for name, mask in IDENTIFIER_FIELDS:
+        if name in field:
+            return mask(value) if value else value
+    return value
+
+def sanitize(pairs, keep_identifiers: bool = False) -> dict:
+    """Turn (name, value) pairs into a dict with secret values redacted and identifiers masked."""
+    return {
+        name: REDACTED if is_secret(name) else value if keep_identifiers else mask_identifier(name, value)
+        for name, value in pairs
+    }
+
+class CaptureMiddleware:
+    """
+    Wraps a WSGI app and appends one JSON line per request to ``path``.
+
+    The wrapped app can add fields (e.g. role and route rule) to the dict
+    stored in ``environ[ENVIRON_KEY]`` while it handles the request.
+
+    Attributes:
+        path (str): Capture file (JSON lines)
+        cookie_name (str): Session cookie hashed into the "s" field
+        keep_identifiers (bool): Write usernames, emails and account numbers unmasked (for replay)
+        captured (int): Number of requests written
+    """
+
+    def __init__(self, app, path: str, cookie_name: str = "session", keep_identifiers: bool = False):
+        self.app = app
+        self.path = path
+        self.cookie_name = cookie_name
+        self.keep_identifiers = keep_identifiers
+        self.captured = 0
+        self._salt = os.urandom(16)
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._write({'capture_start': time.time()})
+
+    def _write(self, record: dict) -> None:
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def _session_key(self, environ) -> str | None:
+        for cookie in environ.get("HTTP_COOKIE", "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == self.cookie_name and value:
+                return hashlib.sha256(self._salt + value.encode()).hexdigest()[:12]
+        return None
+
+    def _read_form(self, environ) -> dict | None:
+        if not environ.get("CONTENT_TYPE", "").startswith("application/x-www-form-urlencoded"):
+            return None
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return None
+        if not 0 < length <= MAX_BODY:
+            return None
+        body = environ["wsgi.input"].read(length)
+        # Hand the app an untouched copy of the body
+        environ["wsgi.input"] = io.BytesIO(body)
+        return sanitize(parse_qsl(body.decode("utf-8", "replace"), keep_blank_values=True), self.keep_identifiers)
+
+    def __call__(self, environ, start_response):
+        record = {
+            't': round(time.monotonic() - self._started, 4),
+            'm': environ.get("REQUEST_METHOD", "GET"),
+            'p': environ.get("PATH_INFO", "/"),
+        }
+        query = environ.get("QUERY_STRING")
+        if query:
+            record['q'] = sanitize(parse_qsl(query, keep_blank_values=True), self.keep_identifiers)
+        form = self._read_form(environ)
+        if form is not None:
+            record['f'] = form
+        session_key = self._session_key(environ)
+        if session_key:
+            record['s'] = session_key
+        environ[ENVIRON_KEY] = record
+
+        def capture_start_response(status, headers, exc_info=None):
+            record['st'] = int(status.split(" ", 1)[0])
+            for name, value in headers:
+                # A new session cookie links the first request of a session to the rest
+                if name.lower() == "set-cookie" and value.startswith(self.cookie_name + "=") and 's' not in record:
+                    record['ns'] = hashlib.sha256(
+                        self._salt + value.split(";", 1)[0].split("=", 1)[1].encode()
+                    ).hexdigest()[:12]
+            return start_response(status, headers, exc_info)
+
+        started = time.perf_counter()
+        try:
+            return self.app(environ, capture_start_response)
+        finally:
+            record['d'] = round((time.perf_counter() - started) * 1000, 2)
+            try:
+                self._write(record)
+                self.captured += 1
+            except (OSError, ValueError) as e:
+                logging.error("Traffic capture write failed: %s", e)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+def read_capture(path: str) -> list[dict]:
+    """
+    Load the request records of a capture file, oldest first.
+
+    A file can hold several captures (one per app start); their offsets are
+    rebased onto the first capture's clock so ``t`` keeps increasing.
+    """
+    records = []
+    first_start = None
+    offset = 0.0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line of a capture that is still being written
+            if 'capture_start' in record:
+                if first_start is None:
+                    first_start = record['capture_start']
+                offset = record['capture_start'] - first_start
+            elif 'p' in record:
+                record['t'] = round(record['t'] + offset, 4)
+                records.append(record)
+    records.sort(key=lambda record: record['t'])
+    return records
@@ -0,0 +1,87 @@
+"""
+traffic_capture_test.py
+Tests for sanitized traffic capture and in-process replay.
+"""
+
+import os
+import tempfile
+import unittest
+from encryption_utils import mask_account_number, mask_username
+from generate_data import DEFAULT_PASSWORD, account_id_for, generate, username_for
+from load_harness import InProcessApp
+from traffic_capture import REDACTED, CaptureMiddleware, read_capture, sanitize
+from traffic_replay import Replayer, AppClient, group_sessions
+
+class TestTrafficCapture(unittest.TestCase):
+    """Test cases for recording and replaying a customer session."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "capture.db")
+        self.capture_path = os.path.join(self.tmpdir.name, "capture.jsonl")
+        generate(self.db_path, users=3, accounts_per_user=2, admins=0, bcrypt_rounds=4, sign_audit=False, workers=1)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def record_session(self, keep_identifiers=False):
+        target = InProcessApp(self.db_path)
+        original = target.app.wsgi_app
+        middleware = target.app.wsgi_app = CaptureMiddleware(original, self.capture_path,
+                                                             keep_identifiers=keep_identifiers)
+        try:
+            client = target.app.test_client()
+            client.get("/login")
+            client.post("/login", data={'username': username_for(1), 'password': DEFAULT_PASSWORD})
+            client.post("/verify-2fa", data={'code': target.last_code.value})
+            client.get("/home")
+            client.post("/transfer", data={'fromAccountId': account_id_for(1, 0, 2),
+                                           'toAccountId': account_id_for(1, 1, 2), 'transferAmount': "5.00"})
+        finally:
+            target.app.wsgi_app = original
+            middleware.close()
+            target.close()
+
+    def test_secrets_are_redacted(self):
+        """
+        Test that passwords and codes never reach the capture file.
+        """
+        self.assertEqual(sanitize([("new_password", "x"), ("code", "123456"), ("amount", "5")]),
+                         {'new_password': REDACTED, 'code': REDACTED, 'amount': "5"})
+        self.assertEqual(sanitize([("email", "alice@example.com")]), {'email': "a***@e***.com"})
+        self.assertEqual(sanitize([("email", "alice@example.com")], keep_identifiers=True), {'email': "alice@example.com"})
+        self.record_session()
+        with open(self.capture_path, encoding="utf-8") as f:
+            raw = f.read()
+        self.assertNotIn(DEFAULT_PASSWORD, raw)
+        self.assertNotIn(username_for(1), raw)
+        self.assertNotIn(account_id_for(1, 0, 2), raw)
+
+        records = read_capture(self.capture_path)
+        self.assertEqual([r['p'] for r in records], ["/login", "/login", "/verify-2fa", "/home", "/transfer"])
+        self.assertEqual(records[1]['f']['password'], REDACTED)
+        self.assertEqual(records[1]['f']['username'], mask_username(username_for(1)))
+        self.assertEqual(records[4]['f']['fromAccountId'], mask_account_number(account_id_for(1, 0, 2)))
+        self.assertEqual(records[4]['f']['transferAmount'], "5.00")
+        self.assertEqual(records[3]['r'], 3)
+        self.assertEqual(records[3]['u'], "/home")
+        # Everything after the login POST belongs to one session
+        self.assertEqual(len(group_sessions(records)), 2)
+
+    def test_replay_matches_recording(self):
+        """
+        Test that a max-speed replay of a capture with identifiers logs in again and gets the recorded statuses.
+        """
+        self.record_session(keep_identifiers=True)
+        target = InProcessApp(self.db_path)
+        try:
+            report = Replayer(lambda: AppClient(target), speed=0, password=DEFAULT_PASSWORD).run(
+                read_capture(self.capture_path))
+        finally:
+            target.close()
+        self.assertEqual(report['requests'], 5)
+        self.assertEqual(report['status_mismatches'], 0)
+        self.assertIn("POST /transfer", report['routes'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+"""
+traffic_replay.py
+Replays a traffic_capture file against a test instance and reports latency drift.
+
+Requests keep their recorded spacing divided by --speed (1 = real time,
+10 = ten times faster, 0 = as fast as possible). Requests from one recorded
+session are replayed in order on one cookie jar; different sessions run
+concurrently. Redacted password fields are filled with --password. Logins
+only replay from captures taken with TRAFFIC_CAPTURE_IDENTIFIERS=1, since
+masked usernames and account numbers match no user.
+
+Targets:
+    --db generated.db       flask_main.app in-process (2FA codes are captured, so logins work)
+    --url http://host:port  a running server (redacted 2FA codes cannot be filled)
+
+Usage:
+    python traffic_replay.py capture.jsonl --db ScaleData.db --speed 10 --password Password123!
+"""
+
+import argparse
+import http.cookiejar
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from load_harness import InProcessApp, percentile
+from traffic_capture import REDACTED, read_capture
+
+DEFAULT_WORKERS = 32
+
+def group_sessions(records: list[dict]) -> list[list[dict]]:
+    """Split records into per-session sequences, keeping their order."""
+    sessions = defaultdict(list)
+    for index, record in enumerate(records):
+        key = record.get('s') or record.get('ns') or f"anonymous-{index}"
+        sessions[key].append(record)
+    return list(sessions.values())
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HttpClient:
+    """One cookie jar against a running server; redirects are not followed."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+
+    def request(self, method: str, path: str, query: dict | None, form: dict | None) -> int:
+        url = self.base_url + path + ("?" + urllib.parse.urlencode(query) if query else "")
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(url, data=data, method=method), timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def last_code(self) -> str:
+        return REDACTED
+
+class AppClient:
+    """One Flask test client (cookie jar) against an InProcessApp."""
+
+    def __init__(self, target: InProcessApp):
+        self.target = target
+        self.client = target.app.test_client()
+
+    def request(self, method: str, path: str, query: dict | None, form: dict | None) -> int:
+        return self.client.open(path, method=method, query_string=query, data=form).status_code
+
+    def last_code(self) -> str:
+        return getattr(self.target.last_code, 'value', REDACTED)
+
+class Replayer:
+    """
+    Re-issues captured sessions and collects recorded vs replayed timings.
+
+    Attributes:
+        speed (float): Time compression factor (0 replays as fast as possible)
+        password (str): Value for redacted password fields
+    """
+
+    def __init__(self, make_client, speed: float = 1.0, password: str | None = None,
+                 workers: int = DEFAULT_WORKERS):
+        self.make_client = make_client
+        self.speed = speed
+        self.password = password
+        self.workers = workers
+        self._lock = threading.Lock()
+        self.results = []
+
+    def _fill(self, form: dict | None, client) -> dict | None:
+        if form is None:
+            return None
+        filled = {}
+        for name, value in form.items():
+            if value == REDACTED and "password" in name.lower() and self.password is not None:
+                value = self.password
+            elif value == REDACTED and "code" in name.lower():
+                value = client.last_code()
+            filled[name] = value
+        return filled
+
+    def _replay_session(self, records: list[dict], started: float, first: float) -> None:
+        client = self.make_client()
+        for record in records:
+            due = started + ((record['t'] - first) / self.speed if self.speed else 0.0)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent = time.perf_counter()
+            try:
+                status = client.request(record['m'], record['p'], record.get('q'), self._fill(record.get('f'), client))
+            except Exception as e:
+                status = f"error: {e}"
+            elapsed = time.perf_counter() - sent
+            with self._lock:
+                self.results.append({
+                    'route': f"{record['m']} {record.get('u') or record['p']}",
+                    'recorded_ms': record.get('d'),
+                    'replayed_ms': elapsed * 1000,
+                    'lag_ms': max(0.0, sent - due) * 1000 if self.speed else 0.0,
+                    'recorded_status': record.get('st'),
+                    'status': status,
+                })
+
+    def run(self, records: list[dict]) -> dict:
+        """Replay every record and return the drift report."""
+        sessions = group_sessions(records)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for future in [executor.submit(self._replay_session, session, started, records[0]['t']) for session in sessions]:
+                future.result()
+        elapsed = time.perf_counter() - started
+        recorded_span = records[-1]['t'] - records[0]['t'] if records else 0.0
+        return drift_report(self.results, elapsed, recorded_span, self.speed)
+
+def drift_report(results: list[dict], elapsed: float, recorded_span: float, speed: float) -> dict:
+    """Per-route recorded vs replayed latency percentiles and status mismatches."""
+    by_route = defaultdict(list)
+    for result in results:
+        by_route[result['route']].append(result)
+
+    routes = {}
+    for route, items in sorted(by_route.items()):
+        recorded = sorted(item['recorded_ms'] for item in items if item['recorded_ms'] is not None)
+        replayed = sorted(item['replayed_ms'] for item in items)
+        routes[route] = {
+            'requests': len(items),
+            'recorded_p50_ms': percentile(recorded, 50),
+            'replayed_p50_ms': percentile(replayed, 50),
+            'recorded_p95_ms': percentile(recorded, 95),
+            'replayed_p95_ms': percentile(replayed, 95),
+            'drift_p50_ms': percentile(replayed, 50) - percentile(recorded, 50),
+            'drift_p95_ms': percentile(replayed, 95) - percentile(recorded, 95),
+            'status_mismatches': sum(1 for item in items if item['status'] != item['recorded_status']),
+        }
+    lags = sorted(result['lag_ms'] for result in results)
+    return {
+        'speed': speed,
+        'requests': len(results),
+        'recorded_span_s': recorded_span,
+        'elapsed_s': elapsed,
+        'schedule_lag_p95_ms': percentile(lags, 95),
+        'status_mismatches': sum(route['status_mismatches'] for route in routes.values()),
+        'routes': routes,
+    }
+
+def print_report(report: dict) -> None:
+    print(f"{'route':32} {'reqs':>5} {'rec p50':>9} {'rep p50':>9} {'drift':>9} {'rec p95':>9} {'rep p95':>9} {'drift':>9} {'status!':>7}")
+    for route, stats in report['routes'].items():
+        print(f"{route[:32]:32} {stats['requests']:5d} {stats['recorded_p50_ms']:9.1f} {stats['replayed_p50_ms']:9.1f} "
+              f"{stats['drift_p50_ms']:+9.1f} {stats['recorded_p95_ms']:9.1f} {stats['replayed_p95_ms']:9.1f} "
+              f"{stats['drift_p95_ms']:+9.1f} {stats['status_mismatches']:7d}")
+    print(f"{report['requests']} requests: recorded over {report['recorded_span_s']:.1f}s, replayed in "
+          f"{report['elapsed_s']:.1f}s at speed {report['speed'] or 'max'}; schedule lag p95 "
+          f"{report['schedule_lag_p95_ms']:.1f}ms; {report['status_mismatches']} status mismatches")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay captured traffic and report latency drift")
+    parser.add_argument("capture", help="File written by TRAFFIC_CAPTURE")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--db", help="Replay in-process against flask_main.app using this database")
+    target.add_argument("--url", help="Replay against a running server")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, 10 = 10x faster, 0 = max speed")
+    parser.add_argument("--password", help="Value for redacted password fields")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Sessions replayed concurrently")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    records = read_capture(args.capture)
+    if not records:
+        parser.error(f"no requests in {args.capture}")
+
+    in_process = InProcessApp(args.db) if args.db else None
+    try:
+        if in_process is not None:
+            replayer = Replayer(lambda: AppClient(in_process), args.speed, args.password, args.workers)
+        else:
+            replayer = Replayer(lambda: HttpClient(args.url), args.speed, args.password, args.workers)
+        report = replayer.run(records)
+    finally:
+        if in_process is not None:
+            in_process.close()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,19 +6,20 @@ Handles user authentication, registration, password management, and 2FA.
 import logging
 import random
 import sqlite3
-import time
-import smtplib
-import socket
 import hashlib
-from email.message import EmailMessage
+import threading
 from typing import Optional, Dict
 from Account import Account
 from flask import session
 
 from encryption_utils import encrypt_string_with_file_key
 
-import bcrypt
 from database_handler import Database
+from email_outbox import DeliveryWorker, EmailOutbox, SmtpSender
+from password_hashing import PasswordHasher
+from login_throttle import make_login_throttle
+import totp
+import verification_store
 from input_validator import InputValidator
 
 from encryption_utils import encrypt_string_with_file_key
@@ -32,20 +33,48 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 # Database and validation instances
 db_manager = Database("BankingData.db")
 input_validator = InputValidator()
+# Pending 2FA codes; VERIFICATION_STORE=sqlite:path shares them between worker processes
+code_store = verification_store.make_code_store(os.getenv("VERIFICATION_STORE", "memory"))
+
+# Wrong TOTP codes per user; the account refuses codes for a while after TOTP_MAX_FAILURES
+# (like emailed codes after MAX_ATTEMPTS). TOTP_THROTTLE=sqlite:path shares it between processes
+TOTP_MAX_FAILURES = 5
+totp_throttle = make_login_throttle(os.getenv("TOTP_THROTTLE", "memory"), username_limit=TOTP_MAX_FAILURES)
+
+# bcrypt runs on a bounded pool; raises HasherBusy when a burst fills the queue
+password_hasher = PasswordHasher.from_env()
 
 # Constants
 USER_ID_LENGTH = 10
 CODE_EXPIRATION = 600  # 10 minutes in seconds
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+# Set SMTP_STARTTLS=0 for a local stand-in server without TLS or login
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
 EMAIL_FROM = "csc3028.evil.banking.system"
 # EMAIL PASSWORD STORED IN TXT FILE - SEE get_gmail_password
 
+# Outbox and delivery worker, created on the first email
+_email_outbox = None
+_email_outbox_lock = threading.Lock()
+
+def get_email_outbox() -> EmailOutbox:
+    """Return the email outbox, starting its delivery worker on first use."""
+    global _email_outbox
+    with _email_outbox_lock:
+        if _email_outbox is None:
+            outbox = EmailOutbox()
+            sender = SmtpSender(SMTP_SERVER, SMTP_PORT, EMAIL_FROM,
+                                username=EMAIL_FROM if SMTP_STARTTLS else None,
+                                password=lambda: UserManager().get_gmail_password(),
+                                starttls=SMTP_STARTTLS)
+            DeliveryWorker(outbox, sender).start()
+            _email_outbox = outbox
+        return _email_outbox
+
 class UserManager:
     """Handles user authentication, registration, and 2FA."""
 
-    _verification_codes = {}
-
     def __init__(self) -> None:
         pass
 
@@ -90,7 +119,7 @@ class UserManager:
 
         encrypted_email = encrypt_string_with_file_key(email)
 
-        hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+        hashed_password = password_hasher.hash(password)
 
         db_manager.create_user(user_id, encrypted_username, encrypted_email, hashed_password, 3, username_hash, email_hash)
         logging.info("User %s registered successfully with ID %s.", username, user_id)
@@ -125,9 +154,7 @@ class UserManager:
 
         encrypted_email = encrypt_string_with_file_key(email)
 
-        hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-
-        hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+        hashed_password = password_hasher.hash(password)
 
         db_manager.create_user(user_id, encrypted_username, encrypted_email, hashed_password, 2, username_hash, email_hash)
         logging.info("User %s registered successfully.", username)
@@ -162,9 +189,7 @@ class UserManager:
 
         encrypted_email = encrypt_string_with_file_key(email)
 
-        hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-
-        hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+        hashed_password = password_hasher.hash(password)
 
         db_manager.create_user(user_id, encrypted_username, encrypted_email, hashed_password, 1, username_hash, email_hash)
         logging.info("User %s registered successfully.", username)
@@ -181,7 +206,12 @@ class UserManager:
                 return None
 
             stored_hash = user_data['password']
-            if bcrypt.checkpw(password.encode(), stored_hash.encode()):
+            if password_hasher.check(password, stored_hash):
+                if password_hasher.needs_rehash(stored_hash):
+                    # Upgrade hashes made at an older cost without delaying this login
+                    user_id = user_data['usrID']
+                    password_hasher.rehash_later(
+                        password, lambda new_hash: db_manager.update_password_hash(user_id, stored_hash, new_hash))
                 encrypted_email = user_data['email']
 
                 try:
@@ -191,10 +221,15 @@ class UserManager:
                     logging.error(f"Failed to decrypt email for 2FA: {e}")
                     return None
         
+                # Users enrolled in TOTP verify with their authenticator app; no code is sent
+                encrypted_secret, _ = db_manager.get_totp(user_data['usrID'])
+                if encrypted_secret:
+                    return {'requires_2fa': True, 'email': decrypted_email, 'method': 'totp'}
+
                 code = self._generate_verification_code(decrypted_email)
                 self._send_verification_email(decrypted_email, code)
 
-                return {'requires_2fa': True, 'email': decrypted_email}
+                return {'requires_2fa': True, 'email': decrypted_email, 'method': 'email'}
 
             logging.warning("Incorrect password.")
             return None
@@ -203,51 +238,104 @@ class UserManager:
             return None
 
     def verify_2fa(self, email: str, code: str) -> Optional[Dict]:
-        """Validates 2FA code."""
-        stored_data = self._verification_codes.get(email)
-
-        if not stored_data:
-            logging.warning("No verification attempt for %s", email)
-            return None
-
-        if time.time() > stored_data['expires']:
-            logging.warning("Expired code for %s", email)
-            del self._verification_codes[email]
-            return None
+        """Validates 2FA code (TOTP for enrolled users, otherwise the emailed code)."""
+        totp_user = db_manager.get_user_encrypted_email_search(email)
+        if totp_user:
+            encrypted_secret, last_step = db_manager.get_totp(totp_user['usrID'])
+            if encrypted_secret:
+                if not self._check_totp(totp_user['usrID'], encrypted_secret, last_step, code):
+                    logging.warning("Invalid or reused TOTP code for %s", email)
+                    return None
+                return self._start_session(totp_user)
 
-        if stored_data['code'] == code:
-            del self._verification_codes[email]
+        result = code_store.verify(email, code)
 
+        if result == verification_store.OK:
             user_data = db_manager.get_user_by_email(email)
             if not user_data:
                 logging.error("User not found during 2FA verification for %s", email)
                 return None
-            
-            try:
-                session['username'] = decrypt_string_with_file_key(user_data['usrName'])
-
-            except Exception as e:
-                logging.error("Failed to decrypt username for the session: %s", e)
-                return None
-            
-            session['user_id'] = user_data['usrID']
-            session['email'] = user_data['email']
-            session['role_id'] = user_data['RoleID']
-
-            logging.info("2FA success. User %s authenticated", session['username'])
-            return user_data
-    
+            return self._start_session(user_data)
+        elif result == verification_store.MISSING:
+            logging.warning("No verification attempt for %s", email)
+        elif result == verification_store.EXPIRED:
+            logging.warning("Expired code for %s", email)
+        elif result == verification_store.LOCKED:
+            logging.warning("Too many invalid codes for %s; code discarded", email)
         else:
             logging.warning("Invalid code for %s", email)
+        return None
+
+    def _start_session(self, user_data: dict) -> Optional[Dict]:
+        """Fill the session for a user who passed 2FA."""
+        try:
+            session['username'] = decrypt_string_with_file_key(user_data['usrName'])
+
+        except Exception as e:
+            logging.error("Failed to decrypt username for the session: %s", e)
             return None
 
+        session['user_id'] = user_data['usrID']
+        session['email'] = user_data['email']
+        session['role_id'] = user_data['RoleID']
+
+        logging.info("2FA success. User %s authenticated", session['username'])
+        return user_data
+
+    def _check_totp(self, user_id: str, encrypted_secret: str, last_step: int | None, code: str) -> bool:
+        """
+        Verify a TOTP code and mark its time step used so it cannot be replayed.
+
+        Wrong codes are counted per user; after TOTP_MAX_FAILURES every code is
+        refused until the throttle window has moved on, so the code can't be brute-forced.
+        """
+        key = str(user_id)
+        if totp_throttle.check(key, None):
+            logging.warning("TOTP locked for user %s after too many invalid codes", user_id)
+            return False
+        try:
+            secret = decrypt_string_with_file_key(encrypted_secret)
+        except Exception as e:
+            logging.error("Failed to decrypt TOTP secret for %s: %s", user_id, e)
+            return False
+        step = totp.match_step(secret, code, last_step=last_step)
+        if step is None or not db_manager.claim_totp_step(user_id, step):
+            totp_throttle.record_failure(key, None)
+            return False
+        totp_throttle.reset(key)
+        return True
+
+    def totp_enabled(self, user_id: str) -> bool:
+        return db_manager.get_totp(user_id)[0] is not None
+
+    def begin_totp_enrollment(self) -> str:
+        """New secret for the user to add to their authenticator app; not stored until confirmed."""
+        return totp.generate_secret()
+
+    def confirm_totp_enrollment(self, user_id: str, secret: str, code: str) -> bool:
+        """Store the secret (encrypted) once the user proves their app produces matching codes."""
+        step = totp.match_step(secret, code)
+        if step is None:
+            return False
+        if db_manager.set_totp_secret(user_id, encrypt_string_with_file_key(secret), step):
+            logging.info("TOTP enabled for user %s", user_id)
+            return True
+        return False
+
+    def disable_totp(self, user_id: str, code: str) -> bool:
+        """Remove TOTP after checking a current code; the user falls back to emailed codes."""
+        encrypted_secret, last_step = db_manager.get_totp(user_id)
+        if not encrypted_secret or not self._check_totp(user_id, encrypted_secret, last_step, code):
+            return False
+        if db_manager.set_totp_secret(user_id, None):
+            logging.info("TOTP disabled for user %s", user_id)
+            return True
+        return False
+
     def _generate_verification_code(self, email: str) -> str:
         """Generates 6-digit verification code."""
         code = ''.join(random.choices('0123456789', k=6))
-        self._verification_codes[email] = {
-            'code': code,
-            'expires': time.time() + CODE_EXPIRATION
-        }
+        code_store.put(email, code, CODE_EXPIRATION)
 
         env = os.getenv("FLASK_ENV", "").lower()
 
@@ -257,27 +345,16 @@ class UserManager:
         return code
 
     def _send_verification_email(self, email: str, code: str) -> None:
-        """Sends verification email via SMTP."""
-        msg = EmailMessage()
-        msg.set_content(f"Your verification code: {code}\nCode valid for 10 minutes.")
-        msg['Subject'] = 'Your Banking App Verification Code'
-        msg['From'] = EMAIL_FROM
-        msg['To'] = email
-
+        """Queues the verification email; the outbox worker delivers it."""
         try:
-            with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=60) as server:
-                server.starttls()
-                server.login(EMAIL_FROM, self.get_gmail_password())
-                server.send_message(msg)
-            logging.info("Verification email sent to %s", email)
-        except smtplib.SMTPException as e:
-            logging.error("SMTP error occurred: %s", str(e))
-        except socket.error as se:
-            logging.error("Socket error occurred: %s", str(se))
-        except OSError as oe:
-            logging.error("OS error occurred: %s", str(oe))
-        except Exception as ex:
-            logging.error("Unexpected error occurred: %s", str(ex))
+            get_email_outbox().enqueue(
+                email,
+                'Your Banking App Verification Code',
+                f"Your verification code: {code}\nCode valid for 10 minutes."
+            )
+            logging.info("Verification email queued for %s", email)
+        except sqlite3.Error as e:
+            logging.error("Could not queue verification email: %s", e)
 
     def password_reset(self, username: str, email: str,
                      new_password: str, confirm_password: str) -> str:
@@ -296,7 +373,7 @@ class UserManager:
         if user_data['email'] != email:
             return "Email does not match our records."
 
-        hashed_password = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt()).decode()
+        hashed_password = password_hasher.hash(new_password)
         try:
             if db_manager.password_reset(username, email, hashed_password):
                 logging.info("Password reset for %s", username)
@@ -1,12 +1,19 @@
 import os
 import bcrypt
 import hashlib
+import shutil
+import tempfile
+import user_management
 from encryption_utils import decrypt_string_with_file_key, encrypt_string_with_file_key
 from user_management import UserManager
 from database_handler import Database
 
-# Initialize components
-db = Database("BankingData.db")
+# Initialize components against a scratch copy so the tracked database stays untouched
+scratch_dir = tempfile.mkdtemp()
+scratch_path = os.path.join(scratch_dir, "BankingData.db")
+shutil.copyfile("BankingData.db", scratch_path)
+db = Database(scratch_path)
+original_db_manager, user_management.db_manager = user_management.db_manager, db
 user_manager = UserManager()
 
 # Test Parameters
@@ -45,3 +52,7 @@ if login_result and login_result.get('requires_2fa'):
     print(f"[PASS] Login succeeded. 2FA sent to: {login_result['email']}")
 else:
     print("[FAIL] Login or 2FA trigger failed.")
+
+user_management.db_manager = original_db_manager
+db.close_all_connections()
+shutil.rmtree(scratch_dir, ignore_errors=True)
@@ -3,8 +3,12 @@ user_management_test.py
 This module contains unit tests for the UserManager class.
 """
 
+import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import patch
+from database_handler import Database
 from user_management import UserManager
 
 class TestUserManager(unittest.TestCase):
@@ -15,8 +19,17 @@ class TestUserManager(unittest.TestCase):
 
     def setUp(self):
         """
-        Set up the UserManager instance for each test case.
-        """
+        Set up the UserManager instance for each test case, backed by a copy of BankingData.db.
+        """
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        db_path = os.path.join(tmpdir.name, "BankingData.db")
+        shutil.copyfile("BankingData.db", db_path)
+        database = Database(db_path)
+        self.addCleanup(database.close_all_connections)
+        patcher = patch('user_management.db_manager', database)
+        patcher.start()
+        self.addCleanup(patcher.stop)
         self.um = UserManager()
 
     def test_signup_success(self):
@@ -90,7 +103,7 @@ class TestUserManager(unittest.TestCase):
         self.assertIsNone(result)
 
     @patch('user_management.UserManager._generate_verification_code')
-    @patch('user_management.time.time')
+    @patch('verification_store.time.time')
     def test_verify_2fa_expired_code(self, mock_time, mock_generate_code):
         """
         Test 2FA verification with expired code.
@@ -0,0 +1,228 @@
+"""
+verification_store.py
+Stores for pending 2FA verification codes.
+
+MemoryCodeStore keeps codes in a dict (one process only). SqliteCodeStore
+keeps them in a SQLite table so /login and /verify-2fa can be served by
+different worker processes. Both look codes up by email in O(1)/one index
+probe, keep expiry ordered (a heap / an index on expiresAt) so sweeping only
+touches expired entries, and remove a code after MAX_ATTEMPTS wrong guesses.
+Only a hash of each code is kept.
+
+Pick one with VERIFICATION_STORE=memory (default) or sqlite:path/to/file.db.
+"""
+
+import abc
+import hashlib
+import heapq
+import hmac
+import logging
+import sqlite3
+import threading
+import time
+
+MAX_ATTEMPTS = 5
+SWEEP_INTERVAL = 60.0
+
+# verify() results
+OK = "ok"
+INVALID = "invalid"
+EXPIRED = "expired"
+MISSING = "missing"
+LOCKED = "locked"
+
+def _digest(email: str, code: str) -> str:
+    return hashlib.sha256(f"{email.lower()}:{code}".encode()).hexdigest()
+
+class CodeStore(abc.ABC):
+    """
+    Common sweeper handling for the code stores.
+
+    Attributes:
+        max_attempts (int): Wrong guesses allowed before a code is discarded
+        sweep_interval (float): Seconds between background sweeps
+    """
+
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS, sweep_interval: float = SWEEP_INTERVAL):
+        self.max_attempts = max_attempts
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+        self._sweeper_lock = threading.Lock()
+
+    @abc.abstractmethod
+    def put(self, email: str, code: str, ttl: float) -> None:
+        """Store a new code for ``email``, replacing any earlier one."""
+
+    @abc.abstractmethod
+    def verify(self, email: str, code: str) -> str:
+        """Check a code; returns OK, INVALID, EXPIRED, MISSING or LOCKED."""
+
+    @abc.abstractmethod
+    def discard(self, email: str) -> None:
+        """Forget any pending code for ``email``."""
+
+    @abc.abstractmethod
+    def sweep(self, now: float | None = None) -> int:
+        """Delete expired codes; returns how many were removed."""
+
+    def _ensure_sweeper(self) -> None:
+        """Start the background sweeper the first time a code is stored."""
+        if self._sweeper is not None:
+            return
+        with self._sweeper_lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="code-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    logging.debug("Swept %d expired verification codes", removed)
+            except Exception as e:
+                logging.error("Verification code sweep failed: %s", e)
+
+class MemoryCodeStore(CodeStore):
+    """Codes in a dict keyed by email, with a heap of expiry times for sweeping."""
+
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS, sweep_interval: float = SWEEP_INTERVAL):
+        super().__init__(max_attempts, sweep_interval)
+        self._codes = {}
+        self._expiry = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def put(self, email: str, code: str, ttl: float) -> None:
+        """Store a new code for ``email``, replacing any earlier one."""
+        expires = time.time() + ttl
+        with self._lock:
+            self._codes[email] = {'digest': _digest(email, code), 'expires': expires, 'attempts': 0}
+            heapq.heappush(self._expiry, (expires, email))
+        self._ensure_sweeper()
+
+    def verify(self, email: str, code: str) -> str:
+        """
+        Check a code. A correct code is consumed; a wrong one counts as an attempt.
+
+        Returns:
+            str: OK, INVALID, EXPIRED, MISSING or LOCKED (too many wrong guesses)
+        """
+        with self._lock:
+            entry = self._codes.get(email)
+            if entry is None:
+                return MISSING
+            if time.time() > entry['expires']:
+                del self._codes[email]
+                return EXPIRED
+            if hmac.compare_digest(entry['digest'], _digest(email, code or "")):
+                del self._codes[email]
+                return OK
+            entry['attempts'] += 1
+            if entry['attempts'] >= self.max_attempts:
+                del self._codes[email]
+                return LOCKED
+            return INVALID
+
+    def discard(self, email: str) -> None:
+        with self._lock:
+            self._codes.pop(email, None)
+
+    def sweep(self, now: float | None = None) -> int:
+        """Drop expired codes; only heap entries that are due are examined."""
+        now = time.time() if now is None else now
+        removed = 0
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expires, email = heapq.heappop(self._expiry)
+                entry = self._codes.get(email)
+                # A newer code for the same email has its own heap entry
+                if entry is not None and entry['expires'] == expires:
+                    del self._codes[email]
+                    removed += 1
+        return removed
+
+class SqliteCodeStore(CodeStore):
+    """Codes in a SQLite table shared by every process using the same file."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS verificationCode (
+        email TEXT PRIMARY KEY,
+        codeHash TEXT NOT NULL,
+        expiresAt REAL NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_verificationCode_expires ON verificationCode (expiresAt);
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = MAX_ATTEMPTS, sweep_interval: float = SWEEP_INTERVAL):
+        super().__init__(max_attempts, sweep_interval)
+        self.db_path = db_path
+        self.local = threading.local()
+        self.connection().executescript(self.SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        return self.connection().execute("SELECT COUNT(*) FROM verificationCode").fetchone()[0]
+
+    def put(self, email: str, code: str, ttl: float) -> None:
+        """Store a new code for ``email``, replacing any earlier one."""
+        self.connection().execute(
+            "INSERT OR REPLACE INTO verificationCode (email, codeHash, expiresAt, attempts) VALUES (?, ?, ?, 0)",
+            (email, _digest(email, code), time.time() + ttl)
+        )
+        self._ensure_sweeper()
+
+    def verify(self, email: str, code: str) -> str:
+        """Same contract as MemoryCodeStore.verify, atomic across processes."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT codeHash, expiresAt, attempts FROM verificationCode WHERE email = ?",
+                               (email,)).fetchone()
+            if row is None:
+                result = MISSING
+            elif time.time() > row[1]:
+                result = EXPIRED
+            elif hmac.compare_digest(row[0], _digest(email, code or "")):
+                result = OK
+            elif row[2] + 1 >= self.max_attempts:
+                result = LOCKED
+            else:
+                result = INVALID
+
+            if result == INVALID:
+                conn.execute("UPDATE verificationCode SET attempts = attempts + 1 WHERE email = ?", (email,))
+            elif result != MISSING:
+                conn.execute("DELETE FROM verificationCode WHERE email = ?", (email,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def discard(self, email: str) -> None:
+        self.connection().execute("DELETE FROM verificationCode WHERE email = ?", (email,))
+
+    def sweep(self, now: float | None = None) -> int:
+        """Drop expired codes using the expiresAt index."""
+        now = time.time() if now is None else now
+        return self.connection().execute("DELETE FROM verificationCode WHERE expiresAt <= ?", (now,)).rowcount
+
+def make_code_store(spec: str = "memory") -> CodeStore:
+    """Build a store from "memory" or "sqlite:path"."""
+    if spec == "memory":
+        return MemoryCodeStore()
+    if spec.startswith("sqlite:"):
+        return SqliteCodeStore(spec[len("sqlite:"):])
+    raise ValueError(f"Unknown verification store: {spec}")
@@ -0,0 +1,102 @@
+"""
+verification_store_test.py
+Tests for the in-memory and SQLite verification code stores.
+"""
+
+import os
+import tempfile
+import time
+import unittest
+import verification_store
+from verification_store import MemoryCodeStore, SqliteCodeStore, make_code_store
+
+class CodeStoreCases:
+    """Behaviour shared by every store; subclasses provide make_store()."""
+
+    def setUp(self):
+        self.store = self.make_store()
+
+    def test_code_is_single_use(self):
+        """
+        Test that a correct code verifies once and is then gone.
+        """
+        self.store.put("a@example.com", "123456", ttl=60)
+        self.assertEqual(self.store.verify("a@example.com", "123456"), verification_store.OK)
+        self.assertEqual(self.store.verify("a@example.com", "123456"), verification_store.MISSING)
+
+    def test_attempt_limit(self):
+        """
+        Test that the code is discarded after max_attempts wrong guesses.
+        """
+        self.store.put("a@example.com", "123456", ttl=60)
+        results = [self.store.verify("a@example.com", "000000") for _ in range(3)]
+        self.assertEqual(results, [verification_store.INVALID, verification_store.INVALID, verification_store.LOCKED])
+        self.assertEqual(self.store.verify("a@example.com", "123456"), verification_store.MISSING)
+
+    def test_expiry_and_sweep(self):
+        """
+        Test that expired codes are refused and swept, while newer codes survive.
+        """
+        self.store.put("old@example.com", "111111", ttl=-1)
+        self.store.put("new@example.com", "222222", ttl=60)
+        self.assertEqual(self.store.verify("old@example.com", "111111"), verification_store.EXPIRED)
+
+        self.store.put("old@example.com", "111111", ttl=-1)
+        self.assertEqual(self.store.sweep(), 1)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store.sweep(time.time() + 120), 1)
+        self.assertEqual(len(self.store), 0)
+
+    def test_new_code_replaces_old(self):
+        """
+        Test that a second login replaces the first code and its stale expiry entry is ignored.
+        """
+        self.store.put("a@example.com", "111111", ttl=1)
+        self.store.put("a@example.com", "222222", ttl=60)
+        self.assertEqual(self.store.sweep(time.time() + 5), 0)
+        self.assertEqual(self.store.verify("a@example.com", "111111"), verification_store.INVALID)
+        self.assertEqual(self.store.verify("a@example.com", "222222"), verification_store.OK)
+
+class TestMemoryCodeStore(CodeStoreCases, unittest.TestCase):
+    """Test cases for MemoryCodeStore."""
+
+    def make_store(self):
+        return MemoryCodeStore(max_attempts=3)
+
+    def test_incomplete_store_cannot_be_created(self):
+        """
+        Test that a backend missing one of the store methods fails when instantiated.
+        """
+        class PutOnly(verification_store.CodeStore):
+            def put(self, email, code, ttl):
+                pass
+
+        with self.assertRaises(TypeError):
+            PutOnly()
+
+class TestSqliteCodeStore(CodeStoreCases, unittest.TestCase):
+    """Test cases for SqliteCodeStore, including sharing between instances."""
+
+    def make_store(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, "codes.db")
+        return SqliteCodeStore(self.db_path, max_attempts=3)
+
+    def tearDown(self):
+        self.store.connection().close()
+
+    def test_shared_between_instances(self):
+        """
+        Test that a code stored by one instance (process) verifies through another.
+        """
+        self.store.put("a@example.com", "123456", ttl=60)
+        other = make_code_store(f"sqlite:{self.db_path}")
+        try:
+            self.assertEqual(other.verify("a@example.com", "123456"), verification_store.OK)
+        finally:
+            other.connection().close()
+        self.assertEqual(len(self.store), 0)
+
+if __name__ == '__main__':
+    unittest.main()